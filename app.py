@@ -1,11 +1,9 @@
 import os
-import stripe
-from flask import Flask
+from flask import Flask, jsonify
 from dotenv import load_dotenv
-from propelauth_flask import init_auth
 from flask_cors import CORS
 from flask_socketio import SocketIO
-from supabase import create_client, Client
+from utils.sdk import LazyAuth, supabase
 
 # Load environment variables
 load_dotenv()
@@ -13,22 +11,24 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 
-# Initialize Supabase client
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
 # Enable CORS
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Count and time every external call a request makes (X-Backend-* headers)
+from utils.tracing import init_tracing
+init_tracing(app)
+
+# Request, backend-call and Socket.IO metrics at /metrics
+from utils.metrics import init_metrics, register_stats
+init_metrics(app)
 
-# Initialize PropelAuth
-auth = init_auth(os.getenv("PROPELAUTH_AUTH_URL"), os.getenv("PROPELAUTH_API_KEY"))
+# Initialize SocketIO; SOCKETIO_MESSAGE_QUEUE fans rooms out across workers
+from utils.socket_hub import socketio_queue_options
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_queue_options())
 
-# Stripe API Key
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# External SDKs are set up on first use (see utils/sdk.py); `supabase` is the
+# shared client every blueprint receives
+auth = LazyAuth(os.getenv("PROPELAUTH_AUTH_URL"), os.getenv("PROPELAUTH_API_KEY"))
 
 # Route Blueprints
 from routes.user_routes import create_user_routes
@@ -37,18 +37,62 @@ from routes.note_routes import create_note_routes
 from routes.course_routes import create_course_routes
 from routes.message_routes import create_message_routes
 from routes.search_routes import create_search_routes
-from routes.payment_routes import payment_bp
+from routes.payment_routes import create_payment_routes
 
 # Register Blueprints
 app.register_blueprint(create_user_routes(auth, supabase), url_prefix="/users")
 app.register_blueprint(create_org_routes(auth), url_prefix="/orgs")
 app.register_blueprint(create_note_routes(auth, supabase), url_prefix="/notes")
 app.register_blueprint(create_course_routes(auth, supabase), url_prefix="/courses")
-app.register_blueprint(create_message_routes(auth, supabase), url_prefix="/messages")
+app.register_blueprint(create_message_routes(auth, supabase, socketio), url_prefix="/messages")
 app.register_blueprint(create_search_routes(auth, supabase), url_prefix="/search")
-app.register_blueprint(payment_bp, url_prefix="/payment")
+app.register_blueprint(create_payment_routes(supabase), url_prefix="/payment")
+
+# Component stats, read when /metrics is scraped
+from utils.user_cache import user_cache
+from utils.conversations import summary_cache
+from utils.vote_buffer import get_vote_buffer
+from utils.message_queue import get_message_queue
+from utils.upload_jobs import upload_jobs
+from utils.note_dedup import dedup_stats
+from utils.derivatives import derivatives
+from utils.search_index import search_index
+from utils.fulltext import fulltext_index
+from utils.storage import get_storage
+
+def _pool_stats():
+    from utils.db import pool_stats
+    return pool_stats()
+
+def _write_behind_stats(get_component):
+    # The buffer and queue only exist when their write-behind mode is enabled
+    def stats():
+        component = get_component(supabase)
+        return component.stats() if component else None
+    return stats
+
+register_stats("supabase_pool", _pool_stats, "Supabase connection pool")
+register_stats("user_cache", user_cache.stats, "User profile cache")
+register_stats("conversation_cache", summary_cache.stats, "Conversation summary cache")
+register_stats("vote_buffer", _write_behind_stats(get_vote_buffer), "Vote write-behind buffer")
+register_stats("message_queue", _write_behind_stats(get_message_queue), "Message write-behind queue")
+register_stats("upload_jobs", upload_jobs.stats, "Background upload jobs")
+register_stats("upload_dedup", dedup_stats.stats, "Upload deduplication")
+register_stats("derivatives", derivatives.stats, "PDF derivative extraction")
+register_stats("search_index", search_index.stats, "Title search index")
+register_stats("fulltext_index", fulltext_index.stats, "Full-text search index")
+register_stats("database_pool", lambda: get_storage(supabase).stats(), "SQL storage connection pool")
+
+@app.route("/pool_stats", methods=["GET"])
+def get_pool_stats():
+    """Supabase connection pool counters of this worker; needs the /metrics token"""
+    from utils.db import pool_stats
+    from utils.metrics import authorized
+    if not authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(pool_stats()), 200
 
-if not stripe.api_key:
+if not os.getenv("STRIPE_SECRET_KEY"):
     raise RuntimeError("Stripe secret key not set. Check your .env file!")
 
 if __name__ == "__main__":
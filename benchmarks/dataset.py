@@ -0,0 +1,398 @@
+"""Generate a synthetic dataset for scale testing, into SQLite or Postgres.
+
+``generate(connection, rows)`` spreads roughly ``rows`` rows over every table
+of models.py, in the proportions of SHARES, with the references between them
+intact. Rows are produced lazily and inserted ``batch_size`` at a time,
+parents before children. Memory grows with the number of courses, users,
+notes and posts (the samplers keep a table per entity), not with the number
+of rows. note_tag and conversation_summary are then rebuilt with the backfill
+SQL of their migrations, the same way an upgrade fills them.
+
+Activity is skewed the way real usage is, following a Zipf distribution with
+exponent ``skew`` (0 is uniform):
+
+* hot courses: a few courses get most of the notes and posts
+* prolific authors: a few users write most of the notes, posts and comments
+* viral notes and posts: a few get most of the votes, comments and reports
+* chatty pairs: a few conversations carry most of the messages
+
+Users are ``user_<n>`` (propel_user_id); ids start at 1 in every table. Every
+20th note is left pending review.
+
+Load a database created from the migrations (see benchmarks/schema.py):
+
+    python -m benchmarks.dataset --rows 1000000 --database-url sqlite:///scale.db
+    python -m benchmarks.dataset --rows 1000000 --database-url postgresql://localhost/scale --skew 1.2
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.schema import migration_module
+
+# Fraction of the rows that go to each table
+SHARES = {
+    "course": 0.001,
+    "user": 0.04,
+    "role_request": 0.002,
+    "user_report": 0.003,
+    "note": 0.15,
+    "note_comment": 0.05,
+    "note_vote": 0.12,
+    "note_report": 0.004,
+    "post": 0.08,
+    "comment": 0.14,
+    "vote": 0.12,
+    "message": 0.29,
+}
+DEFAULT_SKEW = 1.1
+TAGS = [
+    "midterm", "final", "lecture", "lab", "homework", "cheatsheet", "summary", "slides",
+    "week 1", "week 2", "week 3", "week 4", "week 5", "week 6", "week 7", "week 8",
+    "proofs", "examples", "practice", "solutions", "formulas", "diagrams", "review", "quiz",
+]
+WORDS = ("notes exam review chapter lecture summary problem set solution proof lemma graph "
+         "matrix vector integral derivative theorem example definition algorithm").split()
+ROLES = ["Moderator", "Teaching Assistant", "Instructor"]
+REPORT_STATUSES = ["pending", "pending", "resolved", "rejected"]
+# Generated rows are spread over the year before this date
+EPOCH = datetime(2025, 1, 1)
+
+
+def table_sizes(rows):
+    sizes = {table: max(1, int(rows * share)) for table, share in SHARES.items()}
+    # Two users at least, so there is someone to message
+    sizes["user"] = max(2, sizes["user"])
+    return sizes
+
+
+def user_id(number):
+    return f"user_{number}"
+
+
+class Zipf:
+    """Draws ids 1..n; the id of rank k comes up in proportion to 1 / k**skew.
+
+    Ranks are shuffled over the ids, so the hot items are spread over the id
+    range instead of being the first few rows.
+    """
+
+    def __init__(self, n, skew, rng):
+        self.rng = rng
+        self.n = n
+        self.uniform = skew == 0
+        if not self.uniform:
+            self.cumulative = list(itertools.accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+            self.ids = list(range(1, n + 1))
+            rng.shuffle(self.ids)
+
+    def __call__(self):
+        if self.uniform:
+            return self.rng.randint(1, self.n)
+        index = bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return self.ids[min(index, self.n - 1)]
+
+
+class Picks:
+    """The samplers every table draws its references from."""
+
+    def __init__(self, sizes, skew, rng):
+        self.rng = rng
+        self.sizes = sizes
+        self.course = Zipf(sizes["course"], skew, rng)
+        self.author = Zipf(sizes["user"], skew, rng)
+        self.note = Zipf(sizes["note"], skew, rng)
+        self.post = Zipf(sizes["post"], skew, rng)
+        self.pairs = self._chat_pairs(sizes["user"], skew, rng)
+        self.pair = Zipf(len(self.pairs), skew, rng)
+
+    def user(self):
+        # Readers, voters and reporters: everyone, evenly
+        return self.rng.randint(1, self.sizes["user"])
+
+    def other_user(self, number):
+        other = self.rng.randint(1, self.sizes["user"] - 1)
+        return other + (other >= number)
+
+    def _chat_pairs(self, users, skew, rng):
+        # Chatty users start more conversations; their partners are anyone
+        chatty = Zipf(users, skew, rng)
+        pairs = []
+        for _ in range(max(1, users * 2)):
+            first = chatty()
+            second = rng.randint(1, users - 1)
+            pairs.append((first, second + (second >= first)))
+        return pairs
+
+
+def _timestamps(count):
+    """``count`` increasing timestamps over the year before EPOCH, as ISO strings."""
+    step = timedelta(days=365) / count
+    start = EPOCH - timedelta(days=365)
+    for index in range(count):
+        yield (start + step * index).isoformat()
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _courses(sizes, picks):
+    for number in range(1, sizes["course"] + 1):
+        yield {"id": number, "name": f"Course {number} {_sentence(picks.rng, 2)}"}
+
+
+def _users(sizes, picks):
+    for number in range(1, sizes["user"] + 1):
+        yield {
+            "id": number, "propel_user_id": user_id(number), "name": f"Student {number}",
+            "email": f"student{number}@example.edu", "role": "General",
+            "courses_enrolled": "[]", "contributions": 0, "is_banned": number % 500 == 0,
+        }
+
+
+def _role_requests(sizes, picks):
+    for _ in range(sizes["role_request"]):
+        yield {"user_id": picks.user(), "requested_role": picks.rng.choice(ROLES),
+               "status": picks.rng.choice(REPORT_STATUSES)}
+
+
+def _user_reports(sizes, picks):
+    for created_at in _timestamps(sizes["user_report"]):
+        # Prolific users draw the reports, like they draw the attention
+        reported = picks.author()
+        yield {"reported_user_id": reported, "reporter_user_id": picks.other_user(reported),
+               "issue": _sentence(picks.rng, 10), "status": picks.rng.choice(REPORT_STATUSES),
+               "created_at": created_at}
+
+
+def _notes(sizes, picks):
+    rng = picks.rng
+    for number, created_at in enumerate(_timestamps(sizes["note"]), 1):
+        tags = rng.sample(TAGS, rng.randint(1, 3))
+        yield {
+            "id": number, "course_id": picks.course(), "user_id": picks.author(),
+            "title": f"{_sentence(rng, 3)} {number}",
+            "content": f"https://res.cloudinary.com/benchmark/raw/upload/notes/{number}.pdf",
+            "helpful_votes": 0, "unhelpful_votes": 0, "category_tags": json.dumps(tags),
+            # A few are still waiting for review
+            "status": "pending" if number % 20 == 0 else "approved",
+            "created_at": created_at,
+        }
+
+
+def _note_comments(sizes, picks):
+    for created_at in _timestamps(sizes["note_comment"]):
+        yield {"note_id": picks.note(), "user_id": user_id(picks.author()),
+               "content": _sentence(picks.rng, 12), "created_at": created_at}
+
+
+def _note_reports(sizes, picks):
+    for created_at in _timestamps(sizes["note_report"]):
+        yield {"note_id": picks.note(), "reporter_user_id": picks.user(), "reason": _sentence(picks.rng, 8),
+               "status": picks.rng.choice(REPORT_STATUSES), "created_at": created_at}
+
+
+def _posts(sizes, picks):
+    rng = picks.rng
+    for number, created_at in enumerate(_timestamps(sizes["post"]), 1):
+        yield {
+            "id": number, "course_id": picks.course(), "user_id": user_id(picks.author()),
+            "title": f"{_sentence(rng, 5)}?", "content": _sentence(rng, 40),
+            "upvotes": 0, "downvotes": 0, "created_at": created_at,
+        }
+
+
+def _comments(sizes, picks):
+    for created_at in _timestamps(sizes["comment"]):
+        yield {"post_id": picks.post(), "user_id": user_id(picks.author()),
+               "content": _sentence(picks.rng, 15), "created_at": created_at}
+
+
+def _votes(count, pick_entity, entities, users):
+    """(entity, user) pairs without repeats, as the unique constraints require."""
+    cast = {}
+    for _ in range(min(count, entities * users)):
+        entity = pick_entity()
+        # Once everyone has voted on an entity, move on to the next one that has room
+        while cast.get(entity, 0) >= users:
+            entity = entity % entities + 1
+        seen = cast[entity] = cast.get(entity, 0) + 1
+        # The n-th vote on an entity comes from a different user for every n
+        yield entity, (seen - 1 + entity * 7) % users + 1
+
+
+def _note_votes(sizes, picks):
+    pairs = _votes(sizes["note_vote"], picks.note, sizes["note"], sizes["user"])
+    for (note, voter), created_at in zip(pairs, _timestamps(sizes["note_vote"])):
+        # Stored the way cast_vote_sql writes them: propel user id, upvote/downvote
+        yield {"note_id": note, "user_id": user_id(voter), "vote_type": _vote_type(picks.rng),
+               "created_at": created_at}
+
+
+def _post_votes(sizes, picks):
+    pairs = _votes(sizes["vote"], picks.post, sizes["post"], sizes["user"])
+    for (post, voter), created_at in zip(pairs, _timestamps(sizes["vote"])):
+        yield {"post_id": post, "user_id": user_id(voter), "vote_type": _vote_type(picks.rng),
+               "created_at": created_at}
+
+
+def _vote_type(rng):
+    return "upvote" if rng.random() < 0.8 else "downvote"
+
+
+def _messages(sizes, picks):
+    rng = picks.rng
+    for created_at in _timestamps(sizes["message"]):
+        sender, receiver = picks.pairs[picks.pair() - 1]
+        if rng.random() < 0.5:
+            sender, receiver = receiver, sender
+        first, second = sorted((user_id(sender), user_id(receiver)))
+        yield {
+            "conversation_id": f"conversation_{first}_{second}",
+            "sender_id": user_id(sender), "receiver_id": user_id(receiver),
+            "content": _sentence(rng, rng.randint(3, 20)), "created_at": created_at,
+        }
+
+
+# Parents before children
+TABLES = [
+    ("course", _courses), ("user", _users), ("role_request", _role_requests), ("user_report", _user_reports),
+    ("note", _notes), ("note_comment", _note_comments), ("note_vote", _note_votes),
+    ("note_report", _note_reports), ("post", _posts), ("comment", _comments), ("vote", _post_votes),
+    ("message", _messages),
+]
+
+# Vote counters and contributions follow the rows, one grouped pass per table;
+# correlated subqueries would scan a table per row where there is no index
+COUNTERS = [
+    "UPDATE note SET helpful_votes = counts.up, unhelpful_votes = counts.down FROM ("
+    "SELECT note_id, SUM(CASE WHEN vote_type = 'upvote' THEN 1 ELSE 0 END) AS up, "
+    "SUM(CASE WHEN vote_type = 'downvote' THEN 1 ELSE 0 END) AS down FROM note_vote GROUP BY note_id"
+    ") AS counts WHERE counts.note_id = note.id",
+    "UPDATE post SET upvotes = counts.up, downvotes = counts.down FROM ("
+    "SELECT post_id, SUM(CASE WHEN vote_type = 'upvote' THEN 1 ELSE 0 END) AS up, "
+    "SUM(CASE WHEN vote_type = 'downvote' THEN 1 ELSE 0 END) AS down FROM vote GROUP BY post_id"
+    ") AS counts WHERE counts.post_id = post.id",
+    'UPDATE "user" SET contributions = counts.notes FROM ('
+    "SELECT user_id, COUNT(*) AS notes FROM note GROUP BY user_id"
+    ') AS counts WHERE counts.user_id = "user".id',
+]
+
+
+def _insert(connection, table, rows, batch_size):
+    statement = None
+    batch = []
+    inserted = 0
+    for row in rows:
+        if statement is None:
+            columns = list(row)
+            statement = text(f'INSERT INTO "{table}" ({", ".join(columns)}) '
+                             f'VALUES ({", ".join(":" + column for column in columns)})')
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(statement, batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        connection.execute(statement, batch)
+        inserted += len(batch)
+    return inserted
+
+
+def _reset_sequences(connection):
+    # Rows were inserted with explicit ids, so Postgres' serial sequences are still at 1
+    for table, _ in TABLES:
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"
+        ))
+
+
+def generate(connection, rows=10000, seed=1, batch_size=5000, skew=DEFAULT_SKEW, progress=None):
+    """Insert about ``rows`` rows through ``connection``; returns the count per table.
+
+    ``progress(table, count, seconds)`` is called after each table.
+    """
+    rng = random.Random(seed)
+    sizes = table_sizes(rows)
+    picks = Picks(sizes, skew, rng)
+    counts = {}
+    for table, make_rows in TABLES:
+        started = time.perf_counter()
+        counts[table] = _insert(connection, table, make_rows(sizes, picks), batch_size)
+        if progress:
+            progress(table, counts[table], time.perf_counter() - started)
+    for statement in COUNTERS:
+        connection.execute(text(statement))
+
+    note_tags = migration_module("f2d816b4c3e9")
+    backfill = note_tags.SQLITE_BACKFILL if connection.dialect.name == "sqlite" else note_tags.POSTGRES_BACKFILL
+    connection.execute(text(backfill))
+    connection.execute(text(migration_module("c41a9e7f2b10").BACKFILL))
+    if connection.dialect.name == "postgresql":
+        _reset_sequences(connection)
+    return counts
+
+
+def _fast_sqlite_load(dbapi_connection, record):
+    # A failed load is thrown away anyway, so skip fsync while loading
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.close()
+
+
+def main(argv=None):
+    import resource
+
+    from sqlalchemy import create_engine, event
+
+    from benchmarks.schema import apply_migrations
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="e.g. sqlite:///scale.db or postgresql://host/db")
+    parser.add_argument("--rows", type=int, default=100000, help="rows over all tables (default 100000)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skew", type=float, default=DEFAULT_SKEW,
+                        help=f"Zipf exponent; 0 spreads activity evenly (default {DEFAULT_SKEW})")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _fast_sqlite_load)
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        apply_migrations(connection)
+        if connection.execute(text('SELECT COUNT(*) FROM "user"')).scalar():
+            print("The database already has data; load into an empty one", file=sys.stderr)
+            return 1
+
+    def report(table, count, seconds):
+        print(f"{table}: {count} rows in {seconds:.1f}s", file=sys.stderr)
+
+    with engine.begin() as connection:
+        counts = generate(connection, args.rows, args.seed, args.batch_size, args.skew, progress=report)
+    engine.dispose()
+
+    print(json.dumps({
+        "rows": sum(counts.values()),
+        "tables": counts,
+        "seconds": round(time.perf_counter() - started, 1),
+        # Linux reports kilobytes
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
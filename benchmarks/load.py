@@ -0,0 +1,389 @@
+"""Load-test the app against a local Supabase stand-in.
+
+Builds a SQLite database from the migrations, seeds it with
+benchmarks/dataset.py and serves the real app on a local port. The app's
+Supabase client is SQLiteSupabase (benchmarks/supabase_shim.py), which adds
+--latency-ms (+ up to --jitter-ms) to every query to stand in for the round
+trip to Supabase. PropelAuth is replaced by a stub that takes
+``Authorization: Bearer <propel_user_id>``. Nothing leaves the machine.
+
+Each scenario runs for --duration seconds with --concurrency client threads.
+The results are compared with benchmarks/load_baseline.json:
+
+    python -m benchmarks.load                      # check against the baseline
+    python -m benchmarks.load --save-baseline      # record a new baseline
+    python -m benchmarks.load --rows 1000000 --baseline /tmp/1m.json --save-baseline
+    python -m benchmarks.load --scenarios notes_list,search --duration 5
+
+Prints one JSON document with requests, errors, throughput and p50/p95/p99
+latency per scenario. Exits with status 1 when a scenario's throughput drops
+or its p95 grows by more than --threshold against the baseline, or when it
+had errors. Seeded databases are kept next to the system temp files and
+reused while --rows, --seed and --skew match.
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from benchmarks.dataset import DEFAULT_SKEW
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "load_baseline.json")
+
+# The app refuses to start without these; nothing is contacted with them
+_PLACEHOLDER_ENV = {
+    "SUPABASE_URL": "http://127.0.0.1:1",
+    "SUPABASE_KEY": "load-benchmark",
+    "STRIPE_SECRET_KEY": "sk_test_load_benchmark",
+    "PROPELAUTH_AUTH_URL": "http://127.0.0.1:1",
+    "PROPELAUTH_API_KEY": "load-benchmark",
+    "CLOUDINARY_CLOUD_NAME": "load-benchmark",
+    "CLOUDINARY_API_KEY": "load-benchmark",
+    "CLOUDINARY_API_SECRET": "load-benchmark",
+    "BACKEND_TRACE_LOG": "WARNING",
+}
+
+
+# Database
+
+def prepare_database(path, rows, seed, skew):
+    """Create and seed the database at ``path``, unless it already holds this dataset."""
+    from sqlalchemy import create_engine
+
+    from benchmarks.dataset import generate
+    from benchmarks.schema import apply_migrations
+
+    marker = f"{path}.json"
+    wanted = {"rows": rows, "seed": seed, "skew": skew}
+    if os.path.exists(path) and os.path.exists(marker):
+        with open(marker) as source:
+            if json.load(source) == wanted:
+                return False
+    for stale in (path, marker, f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        apply_migrations(connection)
+        generate(connection, rows, seed, skew=skew)
+    engine.dispose()
+    with open(marker, "w") as out:
+        json.dump(wanted, out)
+    return True
+
+
+def load_targets(path, rows):
+    """What the scenarios pick from: table sizes and the approved (note id, course id) pairs."""
+    import sqlite3
+
+    from benchmarks.dataset import table_sizes
+    with sqlite3.connect(path) as connection:
+        notes = connection.execute("SELECT id, course_id FROM note WHERE status = 'approved'").fetchall()
+    return SimpleNamespace(sizes=table_sizes(rows), notes=notes)
+
+
+# Server
+
+class BenchAuth:
+    """Stands in for PropelAuth: the bearer token is the user's propel_user_id."""
+
+    def require_user(self, func):
+        return self._authenticate(func, required=True)
+
+    def optional_user(self, func):
+        return self._authenticate(func, required=False)
+
+    def require_org_member(self, *args, **kwargs):
+        return self.require_user
+
+    def _authenticate(self, func, required):
+        from flask import g, jsonify, request
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get("Authorization", "")
+            if header.startswith("Bearer "):
+                g.propelauth_current_user = SimpleNamespace(user_id=header[len("Bearer "):], org_id_to_org_member_info={})
+            elif required:
+                return jsonify({"error": "Unauthorized"}), 401
+            else:
+                g.propelauth_current_user = None
+            return func(*args, **kwargs)
+        return wrapper
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(db_path, latency_ms, jitter_ms, timeout=120):
+    """Serve the app on a free local port in this process; returns the base URL."""
+    for name, value in _PLACEHOLDER_ENV.items():
+        os.environ.setdefault(name, value)
+
+    import utils.db
+    from benchmarks.supabase_shim import SQLiteSupabase
+    # Must happen before the app is imported: the blueprints start background
+    # work (search index, write-behind buffers) with the shared client
+    utils.db._client = SQLiteSupabase(db_path, latency_ms=latency_ms, jitter_ms=jitter_ms)
+
+    import app as app_module
+    app_module.auth._auth = BenchAuth
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    port = _free_port()
+    server = threading.Thread(
+        target=app_module.socketio.run, args=(app_module.app,),
+        kwargs={"host": "127.0.0.1", "port": port, "allow_unsafe_werkzeug": True, "log_output": False},
+        name="load-server", daemon=True,
+    )
+    server.start()
+
+    from utils.search_index import search_index
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                pass
+            if search_index.ready:
+                break
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("The app did not come up in time")
+        time.sleep(0.1)
+    return f"http://127.0.0.1:{port}"
+
+
+# Scenarios: each returns (method, path, json body, user) for one request.
+# Ids are picked evenly, so most requests land on the long tail rather than
+# on the hot courses and notes of the dataset.
+
+def _course(rng, targets):
+    return rng.randint(1, targets.sizes["course"])
+
+
+def _user(rng, targets):
+    from benchmarks.dataset import user_id
+    return user_id(rng.randint(1, targets.sizes["user"]))
+
+
+def notes_list(rng, targets):
+    return "GET", f"/notes/{_course(rng, targets)}?limit=50", None, None
+
+
+def notes_by_tag(rng, targets):
+    from benchmarks.dataset import TAGS
+    return "GET", f"/notes/{_course(rng, targets)}?limit=50&tags={rng.choice(TAGS)}", None, None
+
+
+def note_detail(rng, targets):
+    note, course = rng.choice(targets.notes)
+    return "GET", f"/notes/{course}/{note}", None, None
+
+
+def note_vote(rng, targets):
+    note, _ = rng.choice(targets.notes)
+    body = {"vote_type": rng.choice(["upvote", "downvote"])}
+    return "POST", f"/notes/{note}/vote", body, _user(rng, targets)
+
+
+def posts_list(rng, targets):
+    return "GET", f"/courses/courses/{_course(rng, targets)}/posts?limit=50", None, None
+
+
+def post_comments(rng, targets):
+    return "GET", f"/courses/posts/{rng.randint(1, targets.sizes['post'])}/comments?limit=50", None, None
+
+
+def conversations(rng, targets):
+    return "GET", "/messages/conversations", None, _user(rng, targets)
+
+
+def message_history(rng, targets):
+    return "GET", f"/messages/history/{_user(rng, targets)}?limit=50", None, _user(rng, targets)
+
+
+def search(rng, targets):
+    from benchmarks.dataset import WORDS
+    return "GET", f"/search?query={rng.choice(WORDS)[:5]}", None, None
+
+
+HTTP_SCENARIOS = {
+    scenario.__name__: scenario
+    for scenario in (notes_list, notes_by_tag, note_detail, note_vote, posts_list,
+                     post_comments, conversations, message_history, search)
+}
+SCENARIOS = list(HTTP_SCENARIOS) + ["socket_message"]
+
+
+def _http_worker(base_url, scenario, targets, seed, deadline, latencies, errors):
+    import requests
+
+    rng = random.Random(seed)
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        method, path, body, user = scenario(rng, targets)
+        headers = {"Authorization": f"Bearer {user}"} if user else {}
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, json=body, headers=headers, timeout=30)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        latencies.append((time.perf_counter() - started) * 1000)
+        if failed:
+            errors.append(path)
+
+
+def _socket_worker(base_url, scenario, targets, seed, deadline, latencies, errors):
+    """Send messages over Socket.IO and time the round trip to receive_message."""
+    import socketio
+
+    rng = random.Random(seed)
+    sender = _user(rng, targets)
+    receiver = _user(rng, targets)
+    while receiver == sender:
+        receiver = _user(rng, targets)
+    received = threading.Event()
+    client = socketio.Client()
+    client.on("receive_message", lambda data: received.set())
+    # Polling only: it needs nothing beyond requests on the client side
+    client.connect(base_url, transports=["polling"])
+    try:
+        client.emit("join", {"sender_id": sender, "receiver_id": receiver})
+        while time.monotonic() < deadline:
+            received.clear()
+            started = time.perf_counter()
+            client.emit("send_message", {"sender_id": sender, "receiver_id": receiver,
+                                         "content": f"load test {rng.random()}"})
+            if received.wait(timeout=30):
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors.append("send_message")
+    finally:
+        client.disconnect()
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+
+def run_scenario(base_url, name, targets, duration, concurrency, seed):
+    worker = _socket_worker if name == "socket_message" else _http_worker
+    scenario = HTTP_SCENARIOS.get(name)
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=worker, args=(base_url, scenario, targets, seed * 1000 + index,
+                                              deadline, latencies, errors))
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": _percentile(ordered, 0.50),
+        "p95_ms": _percentile(ordered, 0.95),
+        "p99_ms": _percentile(ordered, 0.99),
+    }
+
+
+def compare(result, baseline, threshold):
+    """Regressions of ``result`` against ``baseline``, as messages."""
+    failures = []
+    if baseline and baseline.get("config") != result["config"]:
+        print("Warning: the baseline was recorded with different settings; numbers may not be comparable",
+              file=sys.stderr)
+    for name, measured in result["scenarios"].items():
+        if measured["errors"]:
+            failures.append(f"{name}: {measured['errors']} of {measured['requests']} requests failed")
+        expected = baseline.get("scenarios", {}).get(name)
+        if not expected:
+            continue
+        if measured["rps"] < expected["rps"] * (1 - threshold):
+            failures.append(f"{name}: {measured['rps']} req/s, baseline {expected['rps']}")
+        # A millisecond either way is scheduler noise
+        limit = max(expected["p95_ms"] * (1 + threshold), expected["p95_ms"] + 1)
+        if measured["p95_ms"] is not None and measured["p95_ms"] > limit:
+            failures.append(f"{name}: p95 {measured['p95_ms']} ms, baseline {expected['p95_ms']} ms")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="rows to seed, over all tables (default 10000)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skew", type=float, default=DEFAULT_SKEW, help="Zipf exponent of the dataset (0 is uniform)")
+    parser.add_argument("--db", help="SQLite file to use (default: one per dataset in the temp directory)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="added to every Supabase query (default 5)")
+    parser.add_argument("--jitter-ms", type=float, default=2.0, help="random extra latency, up to this much")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario (default 10)")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads per scenario (default 8)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed regression over the baseline, as a fraction (default 0.25)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    db_path = args.db or os.path.join(tempfile.gettempdir(), f"cse471_load_{args.rows}_{args.seed}_{args.skew}.db")
+    started = time.perf_counter()
+    if prepare_database(db_path, args.rows, args.seed, args.skew):
+        print(f"Seeded {args.rows} rows into {db_path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    base_url = start_server(db_path, args.latency_ms, args.jitter_ms)
+
+    targets = load_targets(db_path, args.rows)
+    result = {
+        "config": {"rows": args.rows, "seed": args.seed, "skew": args.skew, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                   "duration": args.duration, "concurrency": args.concurrency},
+        "scenarios": {},
+    }
+    for name in names:
+        result["scenarios"][name] = run_scenario(base_url, name, targets, args.duration, args.concurrency, args.seed)
+        print(f"{name}: {json.dumps(result['scenarios'][name])}", file=sys.stderr)
+    print(json.dumps(result, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as out:
+            json.dump(result, out, indent=2)
+            out.write("\n")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+    failures = compare(result, baseline, args.threshold)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
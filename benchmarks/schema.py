@@ -0,0 +1,34 @@
+"""Create a database schema by running the Alembic migrations in-process.
+
+migrations/env.py needs the Flask-Migrate app, so it cannot be used against a
+scratch database. Instead, each revision's upgrade() runs under
+Operations.context, with a MigrationContext bound to a plain SQLAlchemy
+connection. alembic_version is stamped as it goes, so `flask db upgrade` can
+take over a database created here.
+"""
+import os
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from alembic.script import ScriptDirectory
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+
+def apply_migrations(connection, target="heads"):
+    """Upgrade the database behind ``connection`` to ``target``; returns the revisions applied."""
+    script = ScriptDirectory(MIGRATIONS_DIR)
+    context = MigrationContext.configure(connection)
+    current = context.get_current_revision()
+    # iterate_revisions walks from the target down to the current revision
+    pending = list(reversed(list(script.iterate_revisions(target, current or "base"))))
+    with Operations.context(context):
+        for revision in pending:
+            revision.module.upgrade()
+            context.stamp(script, revision.revision)
+    return [revision.revision for revision in pending]
+
+
+def migration_module(revision):
+    """The module of one migration, e.g. to reuse its backfill SQL."""
+    return ScriptDirectory(MIGRATIONS_DIR).get_revision(revision).module
@@ -0,0 +1,100 @@
+"""Benchmark Socket.IO room fan-out through the message-queue adapter.
+
+Starts a SocketHub, spawns N worker processes that each run a Socket.IO server
+wired to the hub, and emits messages to a room from a separate publisher
+server. Every worker must receive every message, so this measures the
+cross-process path that SOCKETIO_MESSAGE_QUEUE enables.
+
+    python -m benchmarks.socketio_fanout --workers 1 2 4 8 --messages 2000
+
+Prints one JSON line per worker count with delivered messages per second and
+p50/p99 delivery latency in milliseconds.
+"""
+import argparse
+import json
+import multiprocessing
+import statistics
+import time
+
+import socketio
+
+from utils.socket_hub import SocketHub, LocalSocketManager
+
+EVENT = "bench_message"
+ROOM = "conversation_bench"
+
+
+class _TimingManager(LocalSocketManager):
+    def __init__(self, url, expected, results):
+        super().__init__(url, channel="bench")
+        self.expected = expected
+        self.results = results
+        self.latencies = []
+
+    def _handle_emit(self, message):
+        if message.get("event") != EVENT:
+            return
+        self.latencies.append((time.time() - message["data"][0]["sent_at"]) * 1000)
+        if len(self.latencies) == self.expected:
+            self.results.put({"latencies": self.latencies, "finished_at": time.time()})
+
+
+def _worker(url, expected, results):
+    server = socketio.Server(client_manager=_TimingManager(url, expected, results), async_mode="threading")
+    # The server starts its manager's listener on the first client connection;
+    # there are no clients here, so start it directly
+    server.manager_initialized = True
+    server.manager.initialize()
+    while True:
+        time.sleep(1)
+
+
+def run(workers, messages, timeout=120):
+    hub = SocketHub(port=0)
+    hub.start()
+    url = f"local://127.0.0.1:{hub.server_address[1]}"
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(url, messages, results), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        deadline = time.time() + timeout
+        while len(hub.subscribers) < workers:
+            if time.time() > deadline:
+                raise TimeoutError("Workers did not subscribe to the hub in time")
+            time.sleep(0.05)
+
+        publisher = socketio.Server(client_manager=LocalSocketManager(url, channel="bench", write_only=True),
+                                    async_mode="threading")
+        started = time.time()
+        for i in range(messages):
+            publisher.emit(EVENT, {"seq": i, "sent_at": time.time(), "content": "x" * 64}, room=ROOM)
+
+        reports = [results.get(timeout=max(1, deadline - time.time())) for _ in range(workers)]
+    finally:
+        for process in processes:
+            process.terminate()
+        hub.shutdown()
+        hub.server_close()
+
+    latencies = sorted(latency for report in reports for latency in report["latencies"])
+    elapsed = max(report["finished_at"] for report in reports) - started
+    return {
+        "workers": workers,
+        "messages": messages,
+        "deliveries": len(latencies),
+        "deliveries_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+    for count in args.workers:
+        print(json.dumps(run(count, args.messages)))
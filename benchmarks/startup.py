@@ -0,0 +1,153 @@
+"""Benchmark cold start: how long a fresh interpreter takes to import the app.
+
+Runs ``python -X importtime -c "import app"`` in new processes, so nothing is
+cached in memory between runs. Each run records the wall-clock time to import
+and the cumulative import time of every module `app` pulls in. The medians are
+checked against benchmarks/startup_budget.json:
+
+* ``cold_start_ms``: the whole import, wall clock
+* ``modules``: cumulative import time of selected modules, in milliseconds
+* ``lazy``: SDKs that must not be imported at startup (see utils/sdk.py)
+
+Importing the app must also not start threads: background work such as the
+search index rebuilds starts with the first request. A thread started at
+import would still be running when the import finishes, so this check (and
+``lazy``, which it keeps deterministic) does not depend on timing.
+
+    python -m benchmarks.startup                   # check against the budget
+    python -m benchmarks.startup --update-budget   # record the current numbers
+
+Prints one JSON line with the measurements. Exits with status 1 when a number
+is more than --threshold over its budget, a lazy SDK was imported or a thread
+was started.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), "startup_budget.json")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_SDKS = ["stripe", "cloudinary", "googleapiclient", "propelauth_flask", "supabase"]
+TRACKED_MODULES = [
+    "flask", "flask_socketio", "utils.sdk", "utils.socket_hub",
+    "routes.user_routes", "routes.note_routes", "routes.course_routes",
+    "routes.message_routes", "routes.search_routes", "routes.payment_routes",
+]
+
+# Imports the app, then prints the threads other than the main one
+_IMPORT_APP = (
+    "import app, json, threading; "
+    "print(json.dumps(sorted(t.name for t in threading.enumerate() if t is not threading.main_thread())))"
+)
+
+# "import time: self [us] | cumulative | imported package", indented by depth
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+# Importing the app only needs these to be set; nothing is contacted at import
+_PLACEHOLDER_ENV = {
+    "SUPABASE_URL": "http://127.0.0.1:1",
+    "SUPABASE_KEY": "startup-benchmark",
+    "STRIPE_SECRET_KEY": "sk_test_startup_benchmark",
+    "PROPELAUTH_AUTH_URL": "http://127.0.0.1:1",
+    "PROPELAUTH_API_KEY": "startup-benchmark",
+}
+
+
+def parse_importtime(output):
+    """Map each imported module to its cumulative import time in milliseconds."""
+    modules = {}
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    return modules
+
+
+def measure_once(python=sys.executable):
+    env = {**_PLACEHOLDER_ENV, **os.environ}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", _IMPORT_APP],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the app failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr), json.loads(result.stdout.splitlines()[-1])
+
+
+def run(runs=5, python=sys.executable):
+    # One untimed run first so every timed run finds .pyc files and a warm page cache
+    measure_once(python)
+    wall, samples, threads = [], [], set()
+    for _ in range(runs):
+        elapsed, modules, started = measure_once(python)
+        wall.append(elapsed)
+        samples.append(modules)
+        threads.update(started)
+    return {
+        "runs": runs,
+        "cold_start_ms": round(statistics.median(wall), 1),
+        "modules": {
+            name: round(statistics.median(sample.get(name, 0.0) for sample in samples), 1)
+            for name in TRACKED_MODULES
+        },
+        "lazy_imported": sorted(name for name in LAZY_SDKS if any(name in sample for sample in samples)),
+        "threads_started": sorted(threads),
+    }
+
+
+def check(result, budget, threshold):
+    """Budget violations of ``result``, as messages."""
+    failures = []
+    limit = budget["cold_start_ms"] * (1 + threshold)
+    if result["cold_start_ms"] > limit:
+        failures.append(f"cold start {result['cold_start_ms']} ms exceeds {limit:.1f} ms")
+    for name, allowed in budget.get("modules", {}).items():
+        spent = result["modules"].get(name, 0.0)
+        # Small modules vary by a few ms between runs; that is noise, not a regression
+        limit = max(allowed * (1 + threshold), allowed + 5)
+        if spent > limit:
+            failures.append(f"{name} takes {spent} ms to import, budget {limit:.1f} ms")
+    for name in result["lazy_imported"]:
+        if name in budget.get("lazy", []):
+            failures.append(f"{name} is imported at startup; it should load on first use")
+    for name in result.get("threads_started", []):
+        failures.append(f"thread {name} is started at import; start it on first use")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed regression over the budget, as a fraction (default 0.25)")
+    parser.add_argument("--budget", default=BUDGET_PATH)
+    parser.add_argument("--update-budget", action="store_true", help="write the measurements as the new budget")
+    args = parser.parse_args(argv)
+
+    result = run(args.runs)
+    print(json.dumps(result))
+
+    if args.update_budget:
+        with open(args.budget, "w") as out:
+            json.dump({"cold_start_ms": result["cold_start_ms"], "modules": result["modules"], "lazy": LAZY_SDKS},
+                      out, indent=2)
+            out.write("\n")
+        return 0
+
+    with open(args.budget) as source:
+        budget = json.load(source)
+    failures = check(result, budget, args.threshold)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,513 @@
+"""A SQLite stand-in for the Supabase client, for benchmarks and local runs.
+
+SQLiteSupabase implements the part of the supabase-py surface the app uses:
+
+* table(...) with select, insert, upsert, update and delete
+* filters eq, neq, gt, gte, lt, lte, like, ilike, in_, is_ and or_, where or_
+  takes PostgREST logic trees such as ``and(a.eq.1,or(b.gt."x",c.lt.2))``
+* order and limit
+* one-to-many and many-to-one embeds such as ``select("*, note_tag(tag)")``
+* the RPCs the migrations create as Postgres functions
+
+The vote RPCs reuse cast_vote_sql and set_vote_sql from utils.voting. Each
+execute() first sleeps for ``latency_ms`` plus up to ``jitter_ms``, standing in
+for the HTTP round trip to PostgREST, and is recorded like a real Supabase call
+(X-Backend-* headers, /metrics).
+
+The schema comes from the Alembic migrations (see benchmarks/schema.py).
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+
+from utils.tracing import record_call
+from utils.voting import VOTE_ENTITIES, cast_vote_sql, set_vote_sql
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# [alias:]table[!hint](columns)
+_EMBED = re.compile(r"^(?:(\w+):)?(\w+)(?:!\w+)?\((.*)\)$", re.S)
+_COMPARISONS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE", "ilike": "LIKE"}
+# SQLite allows 32766 bound parameters per statement
+_MAX_PARAMS = 30000
+
+
+class Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _quote(identifier):
+    identifier = identifier.strip()
+    if not _IDENTIFIER.match(identifier):
+        raise ValueError(f"Unsupported identifier: {identifier!r}")
+    return f'"{identifier}"'
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def _split(text):
+    """Split on commas that are outside parentheses and quotes."""
+    parts, current, depth, quoted, escaped = [], [], 0, False, False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif quoted and char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def _literal(value):
+    # Strings are double-quoted, with backslashes and quotes escaped (see _unquote)
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return str(value)
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _logic_tree(expression, joiner="OR"):
+    """SQL for a PostgREST logic tree (the argument of or_)."""
+    clauses, params = [], []
+    for part in _split(expression):
+        negate = part.startswith("not.")
+        if negate:
+            part = part[4:]
+        for group, group_joiner in (("and(", "AND"), ("or(", "OR")):
+            if part.startswith(group) and part.endswith(")"):
+                sql, group_params = _logic_tree(part[len(group):-1], group_joiner)
+                break
+        else:
+            column, _, rest = part.partition(".")
+            operator, _, value = rest.partition(".")
+            if operator == "not":
+                negate = not negate
+                operator, _, value = value.partition(".")
+            sql, group_params = _condition(column, operator, value)
+        clauses.append(f"NOT {sql}" if negate else sql)
+        params += group_params
+    return "(" + f" {joiner} ".join(clauses) + ")", params
+
+
+def _condition(column, operator, value):
+    column = _quote(column)
+    if operator in _COMPARISONS:
+        value = _unquote(value)
+        if operator in ("like", "ilike"):
+            value = value.replace("*", "%")
+        return f"{column} {_COMPARISONS[operator]} ?", [value]
+    if operator == "is":
+        keyword = {"null": "NULL", "true": "1", "false": "0"}[value.lower()]
+        return (f"{column} IS NULL", []) if keyword == "NULL" else (f"{column} = {keyword}", [])
+    if operator == "in":
+        values = [_unquote(item) for item in _split(value.strip("()"))]
+        return f"{column} IN ({', '.join('?' * len(values))})", values
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+class QueryBuilder:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.count = None
+        self.where = []
+        self.params = []
+        self.orders = []
+        self.row_limit = None
+
+    def select(self, *columns, count=None, **kwargs):
+        self.action = "select"
+        self.columns = ",".join(columns) or "*"
+        self.count = count
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="", ignore_duplicates=False, **kwargs):
+        self.action, self.payload = "upsert", payload
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload, **kwargs):
+        self.action, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.action = "delete"
+        return self
+
+    def _filter(self, sql, params):
+        self.where.append(sql)
+        self.params += params
+        return self
+
+    def eq(self, column, value):
+        return self._filter(*_condition(column, "eq", _literal(value)))
+
+    def neq(self, column, value):
+        return self._filter(*_condition(column, "neq", _literal(value)))
+
+    def gt(self, column, value):
+        return self._filter(f"{_quote(column)} > ?", [value])
+
+    def gte(self, column, value):
+        return self._filter(f"{_quote(column)} >= ?", [value])
+
+    def lt(self, column, value):
+        return self._filter(f"{_quote(column)} < ?", [value])
+
+    def lte(self, column, value):
+        return self._filter(f"{_quote(column)} <= ?", [value])
+
+    def like(self, column, pattern):
+        return self._filter(f"{_quote(column)} LIKE ?", [pattern])
+
+    def ilike(self, column, pattern):
+        # LIKE is case-insensitive for ASCII in SQLite
+        return self._filter(f"{_quote(column)} LIKE ?", [pattern])
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            return self._filter("0", [])
+        return self._filter(f"{_quote(column)} IN ({', '.join('?' * len(values))})", values)
+
+    def is_(self, column, value):
+        return self._filter(*_condition(column, "is", str(value)))
+
+    def or_(self, filters, reference_table=None):
+        return self._filter(*_logic_tree(filters))
+
+    def order(self, column, desc=False, nullsfirst=None, **kwargs):
+        self.orders.append(f"{_quote(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, size, **kwargs):
+        self.row_limit = int(size)
+        return self
+
+    def execute(self):
+        self.client.wait()
+        started = time.perf_counter()
+        error = None
+        data = []
+        try:
+            with self.client.engine.begin() as connection:
+                data = getattr(self, f"_{self.action}")(connection)
+            return Result(data, len(data) if self.count else None)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000 + self.client.last_delay_ms()
+            record_call("supabase", self.table, self.action, elapsed, len(data), error)
+
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ""
+
+    def _select(self, connection):
+        plain, embeds = [], []
+        for item in _split(self.columns):
+            match = _EMBED.match(item)
+            if match:
+                embeds.append(match.groups())
+            else:
+                plain.append(item)
+        # Embeds need the key columns, so those fetch every column and trim afterwards
+        every = "*" in plain or not plain
+        columns = "*" if every or embeds else ", ".join(_quote(column) for column in plain)
+        sql = f"SELECT {columns} FROM {_quote(self.table)}{self._where_sql()}"
+        if self.orders:
+            sql += f" ORDER BY {', '.join(self.orders)}"
+        if self.row_limit is not None:
+            sql += f" LIMIT {self.row_limit}"
+        rows = self.client.rows(self.table, connection.exec_driver_sql(sql, tuple(self.params)))
+        for alias, child, child_columns in embeds:
+            self.client.embed(connection, self.table, rows, alias or child, child, child_columns)
+        if embeds and not every:
+            keep = plain + [alias or child for alias, child, _ in embeds]
+            rows = [{column: row[column] for column in keep} for row in rows]
+        return rows
+
+    def _insert(self, connection):
+        return self._write_rows(connection, "")
+
+    def _upsert(self, connection):
+        conflict = [column.strip() for column in (self.on_conflict or "").split(",") if column.strip()]
+        conflict = conflict or self.client.primary_key(self.table)
+        target = ", ".join(_quote(column) for column in conflict)
+        if self.ignore_duplicates:
+            return self._write_rows(connection, f" ON CONFLICT ({target}) DO NOTHING")
+        return self._write_rows(connection, f" ON CONFLICT ({target}) DO UPDATE SET {{updates}}")
+
+    def _write_rows(self, connection, conflict):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        if not rows:
+            return []
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        has_created_at = "created_at" in self.client.columns(self.table)
+        if has_created_at and "created_at" not in columns:
+            # Supabase tables default created_at to now()
+            columns.append("created_at")
+        conflict = conflict.replace("{updates}", ", ".join(
+            f"{_quote(column)} = excluded.{_quote(column)}" for column in columns))
+
+        saved = []
+        chunk_size = max(1, _MAX_PARAMS // len(columns))
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            values = []
+            for row in chunk:
+                for column in columns:
+                    value = row.get(column)
+                    if column == "created_at" and (value is None or value == "NOW()"):
+                        value = _now()
+                    values.append(json.dumps(value) if isinstance(value, (dict, list)) else value)
+            placeholders = ", ".join(["(" + ", ".join("?" * len(columns)) + ")"] * len(chunk))
+            sql = (f"INSERT INTO {_quote(self.table)} ({', '.join(_quote(column) for column in columns)}) "
+                   f"VALUES {placeholders}{conflict} RETURNING *")
+            saved += self.client.rows(self.table, connection.exec_driver_sql(sql, tuple(values)))
+        return saved
+
+    def _update(self, connection):
+        assignments = ", ".join(f"{_quote(column)} = ?" for column in self.payload)
+        values = [json.dumps(value) if isinstance(value, (dict, list)) else value for value in self.payload.values()]
+        sql = f"UPDATE {_quote(self.table)} SET {assignments}{self._where_sql()} RETURNING *"
+        return self.client.rows(self.table, connection.exec_driver_sql(sql, tuple(values + self.params)))
+
+    def _delete(self, connection):
+        sql = f"DELETE FROM {_quote(self.table)}{self._where_sql()} RETURNING *"
+        return self.client.rows(self.table, connection.exec_driver_sql(sql, tuple(self.params)))
+
+
+class RpcCall:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        self.client.wait()
+        started = time.perf_counter()
+        error = None
+        try:
+            return Result(self.client.call_function(self.name, self.params))
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000 + self.client.last_delay_ms()
+            record_call("supabase", self.name, "rpc", elapsed, None, error)
+
+
+class SQLiteSupabase:
+    """Supabase client look-alike over a SQLite file; see the module docstring."""
+
+    def __init__(self, path, latency_ms=0.0, jitter_ms=0.0, pool_size=16):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.engine = create_engine(
+            f"sqlite:///{path}", pool_size=pool_size, max_overflow=pool_size,
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(self.engine, "connect", _configure_connection)
+        self._columns = {}
+        self._foreign_keys = {}
+        self._local = threading.local()
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    from_ = table
+
+    def rpc(self, name, params=None):
+        return RpcCall(self, name, params)
+
+    def wait(self):
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        self._local.delay_ms = delay
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def last_delay_ms(self):
+        return getattr(self._local, "delay_ms", 0.0)
+
+    # Schema lookups, cached per table
+
+    def columns(self, table):
+        if table not in self._columns:
+            with self.engine.connect() as connection:
+                info = connection.exec_driver_sql(f"PRAGMA table_info({_quote(table)})").all()
+            self._columns[table] = {row[1]: {"type": (row[2] or "").upper(), "pk": row[5]} for row in info}
+        return self._columns[table]
+
+    def primary_key(self, table):
+        columns = self.columns(table)
+        return sorted((name for name, column in columns.items() if column["pk"]), key=lambda name: columns[name]["pk"])
+
+    def foreign_keys(self, table):
+        """[(column, referred table, referred column), ...] of ``table``."""
+        if table not in self._foreign_keys:
+            with self.engine.connect() as connection:
+                rows = connection.exec_driver_sql(f"PRAGMA foreign_key_list({_quote(table)})").all()
+            self._foreign_keys[table] = [(row[3], row[2], row[4] or "id") for row in rows]
+        return self._foreign_keys[table]
+
+    def rows(self, table, result):
+        booleans = [name for name, column in self.columns(table).items() if column["type"] == "BOOLEAN"]
+        rows = [dict(row._mapping) for row in result]
+        for row in rows:
+            for name in booleans:
+                if row.get(name) is not None:
+                    row[name] = bool(row[name])
+        return rows
+
+    def embed(self, connection, parent, rows, alias, child, child_columns):
+        """Attach ``child`` rows to ``rows`` the way PostgREST resource embedding does."""
+        if not rows:
+            return
+        wanted = [column.strip() for column in _split(child_columns)]
+        for column, referred, referred_column in self.foreign_keys(child):
+            if referred == parent:
+                # One-to-many: a list of child rows per parent
+                keys = list({row[referred_column] for row in rows})
+                grouped = {}
+                for start in range(0, len(keys), _MAX_PARAMS):
+                    chunk = keys[start:start + _MAX_PARAMS]
+                    sql = (f"SELECT * FROM {_quote(child)} WHERE {_quote(column)} "
+                           f"IN ({', '.join('?' * len(chunk))})")
+                    for found in self.rows(child, connection.exec_driver_sql(sql, tuple(chunk))):
+                        grouped.setdefault(found[column], []).append(_pick(found, wanted))
+                for row in rows:
+                    row[alias] = grouped.get(row[referred_column], [])
+                return
+        for column, referred, referred_column in self.foreign_keys(parent):
+            if referred == child:
+                # Many-to-one: the referenced row, or None
+                keys = list({row[column] for row in rows if row.get(column) is not None})
+                found = {}
+                if keys:
+                    sql = (f"SELECT * FROM {_quote(child)} WHERE {_quote(referred_column)} "
+                           f"IN ({', '.join('?' * len(keys))})")
+                    found = {item[referred_column]: _pick(item, wanted)
+                             for item in self.rows(child, connection.exec_driver_sql(sql, tuple(keys)))}
+                for row in rows:
+                    row[alias] = found.get(row.get(column))
+                return
+        raise ValueError(f"No relationship between {parent} and {child}")
+
+    # RPCs: the Postgres functions from the migrations
+
+    def call_function(self, name, params):
+        match = re.fullmatch(r"cast_(\w+)_vote", name)
+        if match and match.group(1) in VOTE_ENTITIES:
+            with self.engine.begin() as connection:
+                result = cast_vote_sql(connection, match.group(1), int(params["p_entity_id"]),
+                                       params["p_user_id"], params["p_vote_type"])
+            return [result] if result else []
+        match = re.fullmatch(r"apply_(\w+)_votes", name)
+        if match and match.group(1) in VOTE_ENTITIES:
+            votes = params["p_votes"]
+            votes = json.loads(votes) if isinstance(votes, str) else votes
+            applied = 0
+            with self.engine.begin() as connection:
+                for vote in sorted(votes, key=lambda vote: int(vote["entity_id"])):
+                    applied += set_vote_sql(connection, match.group(1), int(vote["entity_id"]),
+                                            vote["user_id"], vote["vote_type"])
+            return applied
+        if name == "record_conversation_message":
+            return self._record_conversation_message(params)
+        if name == "course_notes_by_tags":
+            return self._course_notes_by_tags(params)
+        if name == "increment_user_contributions":
+            with self.engine.begin() as connection:
+                return self.rows("user", connection.exec_driver_sql(
+                    'UPDATE "user" SET contributions = COALESCE(contributions, 0) + 1 WHERE id = ? RETURNING *',
+                    (params["p_user_id"],)))
+        raise ValueError(f"Unknown function {name}")
+
+    def _record_conversation_message(self, params):
+        sent_at = params["p_sent_at"] if params["p_sent_at"] != "NOW()" else _now()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO conversation_summary (user_id, partner_id, last_message, last_message_at, unread_count) "
+                "VALUES (?, ?, ?, ?, 0), (?, ?, ?, ?, 1) "
+                "ON CONFLICT (user_id, partner_id) DO UPDATE SET last_message = excluded.last_message, "
+                "last_message_at = excluded.last_message_at, "
+                "unread_count = conversation_summary.unread_count + excluded.unread_count",
+                (params["p_sender_id"], params["p_receiver_id"], params["p_preview"], sent_at,
+                 params["p_receiver_id"], params["p_sender_id"], params["p_preview"], sent_at),
+            )
+        return None
+
+    def _course_notes_by_tags(self, params):
+        tags = list(params["p_tags"])
+        placeholders = ", ".join("?" * len(tags))
+        having = f" HAVING COUNT(*) = {len(tags)}" if params["p_match_all"] else ""
+        matched = (f"SELECT note.id, note.created_at FROM note_tag JOIN note ON note.id = note_tag.note_id "
+                   f"WHERE note_tag.course_id = ? AND note_tag.tag IN ({placeholders}) AND note.status = 'approved' "
+                   f"GROUP BY note.id, note.created_at{having}")
+        matched_params = (params["p_course_id"], *tags)
+
+        page_sql = f"SELECT note.* FROM note JOIN ({matched}) AS matched ON matched.id = note.id"
+        page_params = list(matched_params)
+        if params.get("p_after_id") is not None:
+            page_sql += " WHERE (note.created_at, note.id) > (?, ?)"
+            page_params += [params["p_after_created_at"], params["p_after_id"]]
+        page_sql += " ORDER BY note.created_at, note.id"
+        if params.get("p_limit") is not None:
+            page_sql += f" LIMIT {int(params['p_limit'])}"
+
+        with self.engine.connect() as connection:
+            notes = self.rows("note", connection.exec_driver_sql(page_sql, tuple(page_params)))
+            self.embed(connection, "note", notes, "note_tag", "note_tag", "tag")
+            facets = dict(connection.exec_driver_sql(
+                f"SELECT note_tag.tag, COUNT(*) FROM note_tag JOIN ({matched}) AS matched "
+                f"ON matched.id = note_tag.note_id GROUP BY note_tag.tag", matched_params).all())
+        return {"notes": notes, "facets": facets}
+
+
+def _pick(row, columns):
+    if "*" in columns:
+        return row
+    return {column: row.get(column) for column in columns}
+
+
+def _configure_connection(connection, record):
+    cursor = connection.cursor()
+    # WAL lets readers run while a writer commits, like the real database
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
@@ -1,45 +1,170 @@
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-import io
+# The Google client libraries are slow to import, so they are imported where
+# they are first needed rather than when this module loads
+from urllib.parse import urlparse, urlunparse
+import os
+import random
+import threading
+import time
+
+from utils.tracing import traced
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
-SERVICE_ACCOUNT_FILE = "./gothic-doodad-456615-d8-5e334deccd14.json"
+SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE", "./gothic-doodad-456615-d8-5e334deccd14.json")
+# Points the client at another Drive-compatible server (e.g. a local fake
+# for tests), such as http://127.0.0.1:9000/drive/v3/. Requests to it are sent
+# without credentials.
+API_ROOT = os.getenv("GOOGLE_DRIVE_API_ROOT")
+# Files are sent in resumable chunks of this size instead of being read into memory
+CHUNK_SIZE = 8 * 1024 * 1024
+# Attempts per chunk before a transient (5xx or connection) error is raised
+CHUNK_RETRIES = 3
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
 
-def upload_to_drive(file_storage, course_id):
-    try:
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        service = build('drive', 'v3', credentials=creds)
-        
-        # Create or find course folder
+
+def _request_builder(api_root):
+    # googleapiclient moves media upload URLs to the overridden host but keeps
+    # https; follow the API root's scheme too so plain-http fakes work
+    from googleapiclient.http import HttpRequest
+    root = urlparse(api_root)
+
+    def build_request(http, postproc, uri, **kwargs):
+        parsed = urlparse(uri)
+        if parsed.netloc == root.netloc:
+            uri = urlunparse(parsed._replace(scheme=root.scheme))
+        return HttpRequest(http, postproc, uri, **kwargs)
+    return build_request
+
+
+class DriveClient:
+    """Long-lived Google Drive client.
+
+    The service account is loaded once and its token refreshed shortly before
+    it expires. The discovery client is built once per thread, since its httplib2
+    connection is not thread-safe, and course folder ids are cached after the
+    first lookup.
+    """
+
+    def __init__(self, service_account_file=SERVICE_ACCOUNT_FILE, api_root=API_ROOT):
+        self.service_account_file = service_account_file
+        self.api_root = api_root
+        self._credentials = None
+        self._folders = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def credentials(self):
+        from google.auth.credentials import AnonymousCredentials
+        from google.auth.transport.requests import Request
+        from google.oauth2 import service_account
+        with self._lock:
+            if self._credentials is None:
+                if self.api_root:
+                    self._credentials = AnonymousCredentials()
+                else:
+                    self._credentials = service_account.Credentials.from_service_account_file(
+                        self.service_account_file, scopes=SCOPES)
+            # Refresh once here rather than letting every thread's client race to do it
+            if not self._credentials.valid:
+                self._credentials.refresh(Request())
+            return self._credentials
+
+    def service(self):
+        from googleapiclient.discovery import build
+        credentials = self.credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            options = {"cache_discovery": False}
+            if self.api_root:
+                options["client_options"] = {"api_endpoint": self.api_root}
+                options["requestBuilder"] = _request_builder(self.api_root)
+            service = self._local.service = build('drive', 'v3', credentials=credentials, **options)
+        return service
+
+    def folder_id(self, course_id):
+        """Id of the course's folder, creating it on first use."""
+        course_id = str(course_id)
+        folder_id = self._folders.get(course_id)
+        if folder_id:
+            return folder_id
+
+        service = self.service()
         folder_name = f"Course_{course_id}"
-        folder_query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder'"
-        folders = service.files().list(q=folder_query).execute().get('files', [])
-        
-        if not folders:
-            folder_metadata = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder'}
-            folder = service.files().create(body=folder_metadata, fields='id').execute()
-            folder_id = folder['id']
-        else:
+        folder_query = f"name='{folder_name}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false"
+        folders = service.files().list(q=folder_query, fields='files(id)', pageSize=1).execute().get('files', [])
+        if folders:
             folder_id = folders[0]['id']
-        
-        # Upload file
-        file_metadata = {'name': file_storage.filename, 'parents': [folder_id]}
-        file_content = file_storage.read()
-        media = MediaIoBaseUpload(io.BytesIO(file_content), mimetype=file_storage.mimetype)
-        
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id,webViewLink'
-        ).execute()
-        
+        else:
+            folder_metadata = {'name': folder_name, 'mimeType': FOLDER_MIME_TYPE}
+            folder_id = service.files().create(body=folder_metadata, fields='id').execute()['id']
+
+        with self._lock:
+            # Another thread may have resolved it meanwhile; keep the first answer
+            return self._folders.setdefault(course_id, folder_id)
+
+    def forget_folder(self, course_id):
+        with self._lock:
+            self._folders.pop(str(course_id), None)
+
+    def upload(self, file_storage, course_id):
+        """Upload a FileStorage, or the path of a spooled upload, and return its view link."""
+        from googleapiclient.errors import HttpError
+        try:
+            folder_id = self.folder_id(course_id)
+            file = self._upload(file_storage, folder_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # The cached folder was deleted on Drive; look it up again once
+            self.forget_folder(course_id)
+            if not isinstance(file_storage, str):
+                file_storage.stream.seek(0)
+            file = self._upload(file_storage, self.folder_id(course_id))
+
         # Set public permissions
         permission = {'type': 'anyone', 'role': 'reader'}
-        service.permissions().create(fileId=file['id'], body=permission).execute()
-        
+        self.service().permissions().create(fileId=file['id'], body=permission).execute()
+
         return file.get('webViewLink')
+
+    def _upload(self, file_storage, folder_id):
+        from googleapiclient.errors import HttpError
+        from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+        if isinstance(file_storage, str):
+            file_metadata = {'name': os.path.basename(file_storage), 'parents': [folder_id]}
+            media = MediaFileUpload(file_storage, mimetype='application/pdf', chunksize=CHUNK_SIZE, resumable=True)
+        else:
+            file_metadata = {'name': file_storage.filename, 'parents': [folder_id]}
+            media = MediaIoBaseUpload(file_storage.stream, mimetype=file_storage.mimetype, chunksize=CHUNK_SIZE, resumable=True)
+
+        upload = self.service().files().create(body=file_metadata, media_body=media, fields='id,webViewLink')
+        # Send one chunk at a time. next_chunk's own num_retries would re-send a
+        # stream slice that the failed attempt already consumed, so retry here:
+        # after an error, next_chunk asks Drive how much it has and resumes from there
+        response = None
+        failures = 0
+        while response is None:
+            try:
+                _, response = upload.next_chunk()
+                failures = 0
+            except (HttpError, OSError) as e:
+                if isinstance(e, HttpError) and e.resp.status < 500:
+                    raise
+                failures += 1
+                if failures > CHUNK_RETRIES:
+                    raise
+                time.sleep(random.random() * 2 ** failures)
+        return response
+
+
+drive_client = DriveClient()
+
+
+def upload_to_drive(file_storage, course_id):
+    """Upload a FileStorage, or the path of a spooled upload, to the course folder."""
+    try:
+        # A constant target: the course folder would give every course its own metric series
+        with traced("drive", "upload", target="files"):
+            return drive_client.upload(file_storage, course_id)
     except Exception as e:
         print(f"Google Drive upload error: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,89 @@
+"""Atomic vote functions
+
+Revision ID: 3b8e1c0d9a47
+Revises: 6614334070ca
+Create Date: 2026-10-17 09:12:40.518233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e1c0d9a47'
+down_revision = '6614334070ca'
+branch_labels = None
+depends_on = None
+
+
+# cast_<entity>_vote toggles one user's vote and applies the matching counter
+# delta in a single transaction. The entity row is locked first, so concurrent
+# votes on the same note or post serialize instead of losing updates.
+# The routes store the PropelAuth id in <vote table>.user_id, hence the text
+# parameter and the ::text comparison.
+VOTE_FUNCTION = """
+CREATE OR REPLACE FUNCTION cast_{entity}_vote(p_entity_id integer, p_user_id text, p_vote_type text)
+RETURNS TABLE(action text, {up_column} integer, {down_column} integer)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_vote_id integer;
+    v_vote_type text;
+    v_up integer := 0;
+    v_down integer := 0;
+    v_action text;
+BEGIN
+    PERFORM 1 FROM {entity} WHERE id = p_entity_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT id, vote_type INTO v_vote_id, v_vote_type
+    FROM {vote_table}
+    WHERE {entity}_id = p_entity_id AND user_id::text = p_user_id
+    FOR UPDATE;
+
+    IF v_vote_id IS NULL THEN
+        INSERT INTO {vote_table} ({entity}_id, user_id, vote_type, created_at)
+        VALUES (p_entity_id, p_user_id, p_vote_type, now());
+        v_action := 'added';
+        IF p_vote_type = 'upvote' THEN v_up := 1; ELSE v_down := 1; END IF;
+    ELSIF v_vote_type = p_vote_type THEN
+        DELETE FROM {vote_table} WHERE id = v_vote_id;
+        v_action := 'canceled';
+        IF p_vote_type = 'upvote' THEN v_up := -1; ELSE v_down := -1; END IF;
+    ELSE
+        UPDATE {vote_table} SET vote_type = p_vote_type WHERE id = v_vote_id;
+        v_action := 'changed';
+        IF p_vote_type = 'upvote' THEN v_up := 1; v_down := -1; ELSE v_up := -1; v_down := 1; END IF;
+    END IF;
+
+    RETURN QUERY
+    UPDATE {entity}
+    SET {up_column} = GREATEST(0, COALESCE({entity}.{up_column}, 0) + v_up),
+        {down_column} = GREATEST(0, COALESCE({entity}.{down_column}, 0) + v_down)
+    WHERE {entity}.id = p_entity_id
+    RETURNING v_action, {entity}.{up_column}, {entity}.{down_column};
+END;
+$$;
+"""
+
+VOTE_ENTITIES = [
+    {"entity": "note", "vote_table": "note_vote", "up_column": "helpful_votes", "down_column": "unhelpful_votes"},
+    {"entity": "post", "vote_table": "vote", "up_column": "upvotes", "down_column": "downvotes"},
+]
+
+
+def upgrade():
+    # Stored procedures only exist on Postgres; local SQLite databases apply
+    # votes in Python instead.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for entity in VOTE_ENTITIES:
+        op.execute(VOTE_FUNCTION.format(**entity))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for entity in VOTE_ENTITIES:
+        op.execute(f"DROP FUNCTION IF EXISTS cast_{entity['entity']}_vote(integer, text, text)")
@@ -0,0 +1,97 @@
+"""Batched vote functions for the write-behind vote buffer
+
+Revision ID: 8d2f47a1c6e5
+Revises: 3b8e1c0d9a47
+Create Date: 2026-10-17 11:40:03.207915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f47a1c6e5'
+down_revision = '3b8e1c0d9a47'
+branch_labels = None
+depends_on = None
+
+
+# apply_<entity>_votes takes a JSON array of {entity_id, user_id, vote_type}
+# and moves each user's vote to vote_type (null removes it), adjusting the
+# counters by the difference from what is stored. Setting a target state is
+# idempotent, so a retried flush cannot double count. Rows are visited in
+# entity id order so concurrent flushes from several workers lock in the same
+# order.
+APPLY_VOTES_FUNCTION = """
+CREATE OR REPLACE FUNCTION apply_{entity}_votes(p_votes jsonb)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_item jsonb;
+    v_entity_id integer;
+    v_user_id text;
+    v_target text;
+    v_vote_id integer;
+    v_current text;
+    v_applied integer := 0;
+BEGIN
+    FOR v_item IN
+        SELECT value FROM jsonb_array_elements(p_votes) ORDER BY (value->>'entity_id')::integer
+    LOOP
+        v_entity_id := (v_item->>'entity_id')::integer;
+        v_user_id := v_item->>'user_id';
+        v_target := v_item->>'vote_type';
+
+        PERFORM 1 FROM {entity} WHERE id = v_entity_id FOR UPDATE;
+        CONTINUE WHEN NOT FOUND;
+
+        v_vote_id := NULL;
+        v_current := NULL;
+        SELECT id, vote_type INTO v_vote_id, v_current
+        FROM {vote_table}
+        WHERE {entity}_id = v_entity_id AND user_id::text = v_user_id
+        FOR UPDATE;
+        CONTINUE WHEN v_current IS NOT DISTINCT FROM v_target;
+
+        IF v_target IS NULL THEN
+            DELETE FROM {vote_table} WHERE id = v_vote_id;
+        ELSIF v_vote_id IS NULL THEN
+            INSERT INTO {vote_table} ({entity}_id, user_id, vote_type, created_at)
+            VALUES (v_entity_id, v_user_id, v_target, now());
+        ELSE
+            UPDATE {vote_table} SET vote_type = v_target WHERE id = v_vote_id;
+        END IF;
+
+        UPDATE {entity}
+        SET {up_column} = GREATEST(0, COALESCE({up_column}, 0)
+                + (CASE WHEN v_target = 'upvote' THEN 1 ELSE 0 END)
+                - (CASE WHEN v_current = 'upvote' THEN 1 ELSE 0 END)),
+            {down_column} = GREATEST(0, COALESCE({down_column}, 0)
+                + (CASE WHEN v_target = 'downvote' THEN 1 ELSE 0 END)
+                - (CASE WHEN v_current = 'downvote' THEN 1 ELSE 0 END))
+        WHERE id = v_entity_id;
+        v_applied := v_applied + 1;
+    END LOOP;
+    RETURN v_applied;
+END;
+$$;
+"""
+
+VOTE_ENTITIES = [
+    {"entity": "note", "vote_table": "note_vote", "up_column": "helpful_votes", "down_column": "unhelpful_votes"},
+    {"entity": "post", "vote_table": "vote", "up_column": "upvotes", "down_column": "downvotes"},
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for entity in VOTE_ENTITIES:
+        op.execute(APPLY_VOTES_FUNCTION.format(**entity))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for entity in VOTE_ENTITIES:
+        op.execute(f"DROP FUNCTION IF EXISTS apply_{entity['entity']}_votes(jsonb)")
@@ -0,0 +1,33 @@
+"""Content hash and duplicate_of on note
+
+Revision ID: a5c93e2d7f18
+Revises: e7b3d5f81a26
+Create Date: 2026-10-17 16:48:02.317425
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5c93e2d7f18'
+down_revision = 'e7b3d5f81a26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        # SHA-256 of the uploaded file, hex encoded
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('duplicate_of', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_note_duplicate_of', 'note', ['duplicate_of'], ['id'], ondelete='SET NULL')
+    op.create_index('ix_note_content_hash', 'note', ['content_hash'])
+
+
+def downgrade():
+    op.drop_index('ix_note_content_hash', table_name='note')
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_note_duplicate_of', type_='foreignkey')
+        batch_op.drop_column('duplicate_of')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,39 @@
+"""Atomic contributions increment
+
+Revision ID: b9e4c2a7d315
+Revises: f2d816b4c3e9
+Create Date: 2026-10-17 21:12:08.417356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4c2a7d315'
+down_revision = 'f2d816b4c3e9'
+branch_labels = None
+depends_on = None
+
+
+# Increments in the UPDATE itself, so concurrent uploads by the same user
+# can't overwrite each other's count; returns the updated row.
+INCREMENT_CONTRIBUTIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION increment_user_contributions(p_user_id integer)
+RETURNS SETOF "user"
+LANGUAGE sql AS $$
+    UPDATE "user" SET contributions = COALESCE(contributions, 0) + 1
+    WHERE id = p_user_id
+    RETURNING *;
+$$;
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(INCREMENT_CONTRIBUTIONS_FUNCTION)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS increment_user_contributions(integer)")
@@ -0,0 +1,74 @@
+"""Conversation summary table
+
+Revision ID: c41a9e7f2b10
+Revises: 8d2f47a1c6e5
+Create Date: 2026-10-17 14:05:51.630492
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a9e7f2b10'
+down_revision = '8d2f47a1c6e5'
+branch_labels = None
+depends_on = None
+
+
+# One row per (user, partner) pair with the latest message preview, so the
+# conversation list is an indexed read instead of a scan of every message.
+BACKFILL = """
+INSERT INTO conversation_summary (user_id, partner_id, last_message, last_message_at, unread_count)
+SELECT user_id, partner_id, SUBSTR(content, 1, 200), created_at, 0
+FROM (
+    SELECT user_id, partner_id, content, created_at,
+           ROW_NUMBER() OVER (PARTITION BY user_id, partner_id ORDER BY created_at DESC, id DESC) AS position
+    FROM (
+        SELECT sender_id AS user_id, receiver_id AS partner_id, content, created_at, id FROM message
+        UNION ALL
+        SELECT receiver_id AS user_id, sender_id AS partner_id, content, created_at, id FROM message
+    ) AS sides
+) AS ranked
+WHERE position = 1
+"""
+
+RECORD_MESSAGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_conversation_message(
+    p_sender_id text, p_receiver_id text, p_preview text, p_sent_at timestamp
+)
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO conversation_summary (user_id, partner_id, last_message, last_message_at, unread_count)
+    VALUES (p_sender_id, p_receiver_id, p_preview, p_sent_at, 0),
+           (p_receiver_id, p_sender_id, p_preview, p_sent_at, 1)
+    ON CONFLICT (user_id, partner_id) DO UPDATE
+    SET last_message = EXCLUDED.last_message,
+        last_message_at = EXCLUDED.last_message_at,
+        unread_count = conversation_summary.unread_count + EXCLUDED.unread_count;
+$$;
+"""
+
+
+def upgrade():
+    op.create_table('conversation_summary',
+    sa.Column('user_id', sa.String(length=255), nullable=False),
+    sa.Column('partner_id', sa.String(length=255), nullable=False),
+    sa.Column('last_message', sa.Text(), nullable=True),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True),
+    sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.propel_user_id'], ),
+    sa.ForeignKeyConstraint(['partner_id'], ['user.propel_user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'partner_id')
+    )
+    op.create_index('ix_conversation_summary_user_recent', 'conversation_summary', ['user_id', 'last_message_at'])
+    op.execute(BACKFILL)
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(RECORD_MESSAGE_FUNCTION)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS record_conversation_message(text, text, text, timestamp)")
+    op.drop_index('ix_conversation_summary_user_recent', table_name='conversation_summary')
+    op.drop_table('conversation_summary')
@@ -0,0 +1,29 @@
+"""Unique upload id on note
+
+Revision ID: c7f0a9d2e418
+Revises: d58a3f1b6e04
+Create Date: 2026-10-17 23:05:42.318560
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f0a9d2e418'
+down_revision = 'd58a3f1b6e04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        # Cloudinary public id of a direct upload; unique, so each ticket finalizes once
+        batch_op.add_column(sa.Column('upload_id', sa.String(length=255), nullable=True))
+    op.create_index('ix_note_upload_id', 'note', ['upload_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_note_upload_id', table_name='note')
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('upload_id')
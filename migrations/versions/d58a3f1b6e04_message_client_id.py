@@ -0,0 +1,29 @@
+"""Client-visible message id
+
+Revision ID: d58a3f1b6e04
+Revises: b9e4c2a7d315
+Create Date: 2026-10-17 21:40:17.662083
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58a3f1b6e04'
+down_revision = 'b9e4c2a7d315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        # Stamped when the message is sent, before the row exists, and emitted with it
+        batch_op.add_column(sa.Column('client_message_id', sa.String(length=32), nullable=True))
+    op.create_index('ix_message_client_message_id', 'message', ['client_message_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_message_client_message_id', table_name='message')
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_column('client_message_id')
@@ -0,0 +1,47 @@
+"""Canonical conversation_id on message
+
+Revision ID: e7b3d5f81a26
+Revises: c41a9e7f2b10
+Create Date: 2026-10-17 15:31:18.044719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3d5f81a26'
+down_revision = 'c41a9e7f2b10'
+branch_labels = None
+depends_on = None
+
+
+# Matches utils.conversations.conversation_key: the two user ids sorted and
+# joined with "_", which is also the Socket.IO room name. Python sorts by code
+# point, so Postgres compares under the "C" collation rather than the
+# database's locale; SQLite's default BINARY collation already does.
+BACKFILL = """
+UPDATE message
+SET conversation_id = 'conversation_' ||
+    CASE WHEN sender_id{collate} < receiver_id{collate}
+         THEN sender_id || '_' || receiver_id
+         ELSE receiver_id || '_' || sender_id
+    END
+WHERE conversation_id IS NULL
+"""
+
+POSTGRES_BACKFILL = BACKFILL.format(collate=' COLLATE "C"')
+SQLITE_BACKFILL = BACKFILL.format(collate="")
+
+
+def upgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('conversation_id', sa.String(length=520), nullable=True))
+    op.execute(POSTGRES_BACKFILL if op.get_bind().dialect.name == "postgresql" else SQLITE_BACKFILL)
+    op.create_index('ix_message_conversation_created', 'message', ['conversation_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_message_conversation_created', table_name='message')
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_column('conversation_id')
@@ -0,0 +1,103 @@
+"""note_tag inverted index
+
+Revision ID: f2d816b4c3e9
+Revises: a5c93e2d7f18
+Create Date: 2026-10-17 18:22:40.905113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d816b4c3e9'
+down_revision = 'a5c93e2d7f18'
+branch_labels = None
+depends_on = None
+
+
+# Tags are normalized like utils.tags.normalize_tags: trimmed and lower-cased
+# (whitespace runs are collapsed only for new writes).
+POSTGRES_BACKFILL = """
+INSERT INTO note_tag (note_id, course_id, tag)
+SELECT DISTINCT note.id, note.course_id, LEFT(LOWER(TRIM(tag.value)), 100)
+FROM note, json_array_elements_text(COALESCE(NULLIF(note.category_tags, ''), '[]')::json) AS tag(value)
+WHERE TRIM(tag.value) <> ''
+"""
+
+SQLITE_BACKFILL = """
+INSERT OR IGNORE INTO note_tag (note_id, course_id, tag)
+SELECT note.id, note.course_id, SUBSTR(LOWER(TRIM(tag.value)), 1, 100)
+FROM note, json_each(COALESCE(NULLIF(note.category_tags, ''), '[]')) AS tag
+WHERE TRIM(tag.value) <> ''
+"""
+
+# One round trip for a tag-filtered listing: the keyset page of matching
+# approved notes and the tag counts over all matches.
+NOTES_BY_TAGS_FUNCTION = """
+CREATE OR REPLACE FUNCTION course_notes_by_tags(
+    p_course_id integer, p_tags text[], p_match_all boolean,
+    p_limit integer, p_after_created_at timestamp, p_after_id integer
+)
+RETURNS jsonb
+LANGUAGE sql STABLE AS $$
+    WITH matched AS (
+        SELECT note.id, note.created_at
+        FROM note_tag
+        JOIN note ON note.id = note_tag.note_id
+        WHERE note_tag.course_id = p_course_id
+          AND note_tag.tag = ANY(p_tags)
+          AND note.status = 'approved'
+        GROUP BY note.id, note.created_at
+        HAVING NOT p_match_all OR COUNT(*) = cardinality(p_tags)
+    ),
+    page AS (
+        SELECT note.*
+        FROM note
+        JOIN matched ON matched.id = note.id
+        WHERE p_after_id IS NULL OR (note.created_at, note.id) > (p_after_created_at, p_after_id)
+        ORDER BY note.created_at, note.id
+        LIMIT p_limit
+    ),
+    facets AS (
+        SELECT note_tag.tag, COUNT(*) AS notes
+        FROM note_tag
+        JOIN matched ON matched.id = note_tag.note_id
+        GROUP BY note_tag.tag
+    )
+    SELECT jsonb_build_object(
+        -- Rows have the same shape as select=*,note_tag(tag) through PostgREST
+        'notes', COALESCE((
+            SELECT jsonb_agg(to_jsonb(page) || jsonb_build_object('note_tag', (
+                SELECT COALESCE(jsonb_agg(jsonb_build_object('tag', note_tag.tag)), '[]'::jsonb)
+                FROM note_tag WHERE note_tag.note_id = page.id
+            )) ORDER BY page.created_at, page.id)
+            FROM page
+        ), '[]'::jsonb),
+        'facets', COALESCE((SELECT jsonb_object_agg(facets.tag, facets.notes) FROM facets), '{}'::jsonb)
+    );
+$$;
+"""
+
+
+def upgrade():
+    op.create_table('note_tag',
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('tag', sa.String(length=100), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['note.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('note_id', 'tag')
+    )
+    op.create_index('ix_note_tag_course_tag', 'note_tag', ['course_id', 'tag', 'note_id'])
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute(POSTGRES_BACKFILL)
+        op.execute(NOTES_BY_TAGS_FUNCTION)
+    else:
+        op.execute(SQLITE_BACKFILL)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP FUNCTION IF EXISTS course_notes_by_tags(integer, text[], boolean, integer, timestamp, integer)")
+    op.drop_index('ix_note_tag_course_tag', table_name='note_tag')
+    op.drop_table('note_tag')
@@ -38,9 +38,19 @@ class Note(db.Model):
     unhelpful_votes = db.Column(db.Integer, default=0)
     category_tags = db.Column(db.Text)  # JSON string
     status = db.Column(db.String(20), default="pending")  # pending, approved, rejected
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the uploaded file
+    duplicate_of = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='SET NULL'))
+    upload_id = db.Column(db.String(255), unique=True, index=True)  # Cloudinary public id of a direct upload
     created_at = db.Column(db.DateTime, default=db.func.now())
     user = db.relationship('User', backref='notes')
 
+class NoteTag(db.Model):
+    # Normalized copy of note.category_tags, one row per tag, for tag filtering
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    course_id = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.Index('ix_note_tag_course_tag', 'course_id', 'tag', 'note_id'),)
+
 class NoteVote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
@@ -97,14 +107,25 @@ class Vote(db.Model):
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(520))  # "conversation_<sorted user ids>", same as the Socket.IO room
     sender_id = db.Column(db.String(255), db.ForeignKey('user.propel_user_id'), nullable=False)
     receiver_id = db.Column(db.String(255), db.ForeignKey('user.propel_user_id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    client_message_id = db.Column(db.String(32), unique=True, index=True)  # uuid4 hex emitted on send
 
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+    __table_args__ = (db.Index('ix_message_conversation_created', 'conversation_id', 'created_at', 'id'),)
+
 
+class ConversationSummary(db.Model):
+    user_id = db.Column(db.String(255), db.ForeignKey('user.propel_user_id'), primary_key=True)
+    partner_id = db.Column(db.String(255), db.ForeignKey('user.propel_user_id'), primary_key=True)
+    last_message = db.Column(db.Text)  # Preview of the latest message
+    last_message_at = db.Column(db.DateTime)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_conversation_summary_user_recent', 'user_id', 'last_message_at'),)
 
 #TESTING FOR PAYMENT - DO NOT DELETE
     # 4242 4242 4242 4242
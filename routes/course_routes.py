@@ -1,9 +1,19 @@
 from flask import Blueprint, request, jsonify
-from propelauth_flask import current_user
+from utils.sdk import current_user
 from datetime import datetime
+from utils.concurrency import server_timing
+from utils.search_index import search_index
+from utils.storage import author_of, get_storage
+from utils.voting import vote_message
+from utils.vote_buffer import get_vote_buffer
+from utils.pagination import InvalidCursor, get_page_args, split_page, page_body
 
 def create_course_routes(auth, supabase):
     bp = Blueprint("course_routes", __name__)
+    # Set when VOTE_WRITE_BEHIND is on; votes are then buffered and flushed in batches
+    vote_buffer = get_vote_buffer(supabase)
+    # Reads with authors and votes (STORAGE_BACKEND)
+    storage = get_storage(supabase)
 
     #add course
     @bp.route("add_course", methods=["POST"])
@@ -21,7 +31,9 @@ def create_course_routes(auth, supabase):
                 return jsonify({"error": "Course already exists"}), 400
 
             # Add the course
-            supabase.table("course").insert({"name": name}).execute()
+            inserted = supabase.table("course").insert({"name": name}).execute().data
+            if inserted:
+                search_index.add_course(inserted[0])
             return jsonify({"message": "Course added successfully!"}), 201
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -41,24 +53,22 @@ def create_course_routes(auth, supabase):
     @bp.route("/courses/<int:course_id>/posts", methods=["GET"])
     def get_posts(course_id):
         try:
-            # Fetch the course name
-            course = supabase.table("course").select("name").eq("id", course_id).execute().data
-            if not course:
+            # Fetch the course name and the posts for the course with their authors
+            page = get_page_args()
+            course_name, rows, timings = storage.course_posts(course_id, page)
+            if course_name is None:
                 return jsonify({"error": "Course not found"}), 404
-            course_name = course[0]["name"]
+            posts, next_cursor = split_page(rows, page)
+            if vote_buffer:
+                vote_buffer.overlay("post", posts)
 
-            # Fetch posts for the course
-            posts = supabase.table("post").select("*").eq("course_id", course_id).execute().data
             post_list = []
             for post in posts:
-                user = supabase.table("user").select("name").eq("propel_user_id", post["user_id"]).execute().data
-                author_name = user[0]["name"] if user else "Unknown User"
-
                 post_list.append({
                     "id": post["id"],
                     "title": post["title"],
                     "content": post["content"],
-                    "author": author_name,
+                    "author": author_of(post, default="Unknown User"),
                     "user_id": post["user_id"],
                     "upvotes": post["upvotes"],
                     "downvotes": post["downvotes"],
@@ -66,7 +76,9 @@ def create_course_routes(auth, supabase):
                     "course_name": course_name,
                 })
 
-            return jsonify(post_list), 200
+            return jsonify(page_body(post_list, page, next_cursor)), 200, server_timing(timings)
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -110,71 +122,26 @@ def create_course_routes(auth, supabase):
             if vote_type not in ["upvote", "downvote"]:
                 return jsonify({"error": "Invalid vote type"}), 400
 
-            # Check if the user has already voted on this post
-            existing_vote = supabase.table("vote").select("*").eq("post_id", post_id).eq("user_id", user_id).execute().data
-
-            if existing_vote:
-                if existing_vote[0]["vote_type"] == vote_type:
-                    # Cancel the vote
-                    supabase.table("vote").delete().eq("id", existing_vote[0]["id"]).execute()
-
-                    # Fetch the current post
-                    post = supabase.table("post").select("*").eq("id", post_id).execute().data
-                    if not post:
-                        return jsonify({"error": "Post not found"}), 404
-
-                    # Update the upvotes or downvotes count
-                    if vote_type == "upvote":
-                        new_upvotes = max(0, post[0]["upvotes"] - 1)
-                        supabase.table("post").update({"upvotes": new_upvotes}).eq("id", post_id).execute()
-                    elif vote_type == "downvote":
-                        new_downvotes = max(0, post[0]["downvotes"] - 1)
-                        supabase.table("post").update({"downvotes": new_downvotes}).eq("id", post_id).execute()
-
-                    return jsonify({"message": f"{vote_type.capitalize()} canceled"}), 200
-                else:
-                    # Change the vote type
-                    supabase.table("vote").update({"vote_type": vote_type}).eq("id", existing_vote[0]["id"]).execute()
-
-                    # Fetch the current post
-                    post = supabase.table("post").select("*").eq("id", post_id).execute().data
-                    if not post:
-                        return jsonify({"error": "Post not found"}), 404
-
-                    # Update the upvotes and downvotes count
-                    if vote_type == "upvote":
-                        new_upvotes = post[0]["upvotes"] + 1
-                        new_downvotes = max(0, post[0]["downvotes"] - 1)
-                        supabase.table("post").update({"upvotes": new_upvotes, "downvotes": new_downvotes}).eq("id", post_id).execute()
-                    elif vote_type == "downvote":
-                        new_downvotes = post[0]["downvotes"] + 1
-                        new_upvotes = max(0, post[0]["upvotes"] - 1)
-                        supabase.table("post").update({"downvotes": new_downvotes, "upvotes": new_upvotes}).eq("id", post_id).execute()
-
-                    return jsonify({"message": f"Vote changed to {vote_type}"}), 200
-
-            # Add a new vote
-            supabase.table("vote").insert({
-                "post_id": post_id,
-                "user_id": user_id,
-                "vote_type": vote_type,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
-
-            # Fetch the current post
-            post = supabase.table("post").select("*").eq("id", post_id).execute().data
-            if not post:
+            if vote_buffer:
+                # Nothing checks the post at flush time, so make sure it exists before buffering
+                if not storage.exists("post", post_id):
+                    return jsonify({"error": "Post not found"}), 404
+                # Record the intent now; the counters are written on the next flush
+                action, _ = vote_buffer.record("post", post_id, user_id, vote_type)
+                message, _ = vote_message("Post", vote_type, {"action": action})
+                return jsonify({"message": message, "pending": True}), 202
+
+            # Toggle the vote and update the counters in one atomic round trip
+            result = storage.cast_vote("post", post_id, user_id, vote_type)
+            if result is None:
                 return jsonify({"error": "Post not found"}), 404
 
-            # Update the upvotes or downvotes count
-            if vote_type == "upvote":
-                new_upvotes = post[0]["upvotes"] + 1
-                supabase.table("post").update({"upvotes": new_upvotes}).eq("id", post_id).execute()
-            elif vote_type == "downvote":
-                new_downvotes = post[0]["downvotes"] + 1
-                supabase.table("post").update({"downvotes": new_downvotes}).eq("id", post_id).execute()
-
-            return jsonify({"message": f"Post {vote_type}d successfully"}), 201
+            message, status = vote_message("Post", vote_type, result)
+            return jsonify({
+                "message": message,
+                "upvotes": result["upvotes"],
+                "downvotes": result["downvotes"]
+            }), status
         except Exception as e:
             print(f"Error in vote_post: {e}")
             return jsonify({"error": str(e)}), 500
@@ -260,27 +227,26 @@ def create_course_routes(auth, supabase):
     @bp.route("/posts/<int:post_id>/comments", methods=["GET"])
     def get_comments(post_id):
         try:
-            # Fetch all comments for the post, ordered by created_at in ascending order
-            comments = supabase.table("comment").select("*").eq("post_id", post_id).order("created_at", desc=False).execute().data
+            # Fetch the comments for the post, ordered by (created_at, id) in ascending order
+            page = get_page_args()
+            comments, next_cursor = split_page(storage.post_comments(post_id, page), page)
 
             # if not comments:
             #     return jsonify({"error": "No comments found"}), 404
 
-            # Fetch user details for each comment
             comments_data = []
             for comment in comments:
-                user = supabase.table("user").select("name").eq("propel_user_id", comment["user_id"]).execute().data
-                author_name = user[0]["name"] if user else "Unknown User"
-
                 comments_data.append({
                     "id": comment["id"],
                     "user_id": comment["user_id"],
-                    "author": author_name,
+                    "author": author_of(comment, default="Unknown User"),
                     "content": comment["content"],
                     "created_at": comment["created_at"]
                 })
 
-            return jsonify(comments_data), 200
+            return jsonify(page_body(comments_data, page, next_cursor)), 200
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
         except Exception as e:
             print(f"Error in get_comments: {e}")
             return jsonify({"error": str(e)}), 500
@@ -1,62 +1,104 @@
 from flask_socketio import emit, join_room
-from app import socketio
 import os
+import uuid
+from datetime import datetime
 # from models import Message, db, User
-from propelauth_flask import current_user
+from utils.sdk import current_user
 from flask import Blueprint, request, jsonify
-from supabase import create_client, Client
-
-
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
-@socketio.on('join')
-def handle_join(data):
-    sender_id = data['sender_id']
-    receiver_id = data['receiver_id']
-
-    # Standardize the room name by sorting sender_id and receiver_id alphabetically
-    room = f"conversation_{'_'.join(sorted([sender_id, receiver_id]))}"
-    print(f"User joined room: {room}")  # Debugging: Log the room being joined
-
-    join_room(room)
-    emit('status', {'message': f'User has joined room {room}'}, room=room)
-
-@socketio.on('send_message')
-def handle_send_message(data):
-    sender_id = data['sender_id']
-    receiver_id = data['receiver_id']
-    content = data['content']
-
-    room = f"conversation_{'_'.join(sorted([sender_id, receiver_id]))}"
-
-    # Save the message to the database
-    result = supabase.table("message").insert({
-        "sender_id": sender_id,
-        "receiver_id": receiver_id,
-        "content": content,
-        "created_at": "NOW()" 
-    }).execute()
-
-
-    # Extract the saved message
-    saved_message = result.data[0]  # Get the first inserted row
-
+from utils.conversations import DEFAULT_LIMIT, MAX_LIMIT, conversation_key, list_conversations, mark_conversation_read, record_message
+from utils.message_queue import get_message_queue
+from utils.metrics import socketio_emits, socketio_events
+from utils.concurrency import fan_out, server_timing
+from utils.pagination import InvalidCursor, get_page_args, paginate, split_page, page_body
+
+
+# Socket.IO events, bound to the app's server and the shared client
+def register_socket_handlers(socketio, supabase):
+    @socketio.on('join')
+    def handle_join(data):
+        socketio_events.inc('join')
+        sender_id = data['sender_id']
+        receiver_id = data['receiver_id']
+
+        # Standardize the room name by sorting sender_id and receiver_id alphabetically
+        room = conversation_key(sender_id, receiver_id)
+        print(f"User joined room: {room}")  # Debugging: Log the room being joined
+
+        join_room(room)
+        emit('status', {'message': f'User has joined room {room}'}, room=room)
+        socketio_emits.inc('status')
+
+    @socketio.on('send_message')
+    def handle_send_message(data):
+        socketio_events.inc('send_message')
+        sender_id = data['sender_id']
+        receiver_id = data['receiver_id']
+        content = data['content']
+
+        room = conversation_key(sender_id, receiver_id)
+
+        # Known before the row is written and stored with it, so clients can match
+        # a received message against history
+        client_message_id = uuid.uuid4().hex
+
+        message_queue = get_message_queue(supabase)
+        if message_queue:
+            # Delivery first: stamp the message here, emit it, and persist it in the background
+            created_at = datetime.utcnow().isoformat()
+            socketio_emits.inc('receive_message')
+            emit('receive_message', {
+                'client_message_id': client_message_id,
+                'sender_id': sender_id,
+                'receiver_id': receiver_id,
+                'content': content,
+                'created_at': created_at
+            }, room=room)
+            message_queue.submit({
+                "conversation_id": room,
+                "sender_id": sender_id,
+                "receiver_id": receiver_id,
+                "content": content,
+                "created_at": created_at,
+                "client_message_id": client_message_id
+            })
+            return
+
+        # Save the message to the database; the room name doubles as conversation_id
+        result = supabase.table("message").insert({
+            "conversation_id": room,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "created_at": "NOW()",
+            "client_message_id": client_message_id
+        }).execute()
+
+
+        # Extract the saved message
+        saved_message = result.data[0]  # Get the first inserted row
+
+        # Keep both participants' conversation lists current
+        try:
+            record_message(supabase, saved_message)
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
 
-    # Emit the message to the room
-    emit('receive_message', {
-        'sender_id': saved_message["sender_id"],
-        'receiver_id': saved_message["receiver_id"],
-        'content': saved_message["content"],
-        'created_at': saved_message["created_at"]
-    }, room=room)
-    print(f"Message emitted to room {room}")  # Debugging: Log the emission
+        # Emit the message to the room
+        socketio_emits.inc('receive_message')
+        emit('receive_message', {
+            'client_message_id': saved_message["client_message_id"],
+            'sender_id': saved_message["sender_id"],
+            'receiver_id': saved_message["receiver_id"],
+            'content': saved_message["content"],
+            'created_at': saved_message["created_at"]
+        }, room=room)
+        print(f"Message emitted to room {room}")  # Debugging: Log the emission
 
 
 # HTTP Routes
-def create_message_routes(auth, supabase):
+def create_message_routes(auth, supabase, socketio):
     bp = Blueprint('messages', __name__)
+    register_socket_handlers(socketio, supabase)
 
     @bp.route('/conversations', methods=['GET'])
     @auth.require_user
@@ -64,35 +106,15 @@ def create_message_routes(auth, supabase):
         try:
             user_id = current_user.user_id  # Get the current user's ID
 
-            # Query for conversations where the user is either the sender or receiver
-            messages = supabase.table("message").select("*").or_(
-                f"sender_id.eq.{user_id},receiver_id.eq.{user_id}"
-            ).execute().data
-
-            if not messages:
-                return jsonify({"conversations": {}}), 200
-
-            # Extract unique conversation partner IDs
-            conversation_partners = {}
-            for message in messages:
-                other_user_id = (
-                    message["receiver_id"] if message["sender_id"] == user_id else message["sender_id"]
-                )
-                if other_user_id not in conversation_partners:
-                    conversation_partners[other_user_id] = message["created_at"]
-
-            # Fetch user details for the conversation partners
-            user_ids = list(conversation_partners.keys())
-            users = supabase.table("user").select("propel_user_id, name").in_("propel_user_id", user_ids).execute().data
-            user_map = {user["propel_user_id"]: user["name"] for user in users}
-
-            # Build the response
-            response = {
-                other_user_id: user_map.get(other_user_id, "Unknown User")
-                for other_user_id in conversation_partners
-            }
-
-            return jsonify({"conversations": response}), 200
+            limit = max(1, min(request.args.get("limit", DEFAULT_LIMIT, type=int), MAX_LIMIT))
+
+            # Read the maintained summaries instead of scanning every message
+            summaries = list_conversations(supabase, user_id, limit=limit)
+
+            # Build the response; "conversations" keeps the partner -> name mapping
+            response = {summary["partner_id"]: summary["name"] for summary in summaries}
+
+            return jsonify({"conversations": response, "summaries": summaries}), 200
         except Exception as e:
             print(f"Error in get_conversations: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
@@ -106,31 +128,61 @@ def create_message_routes(auth, supabase):
         if not sender_id or not receiver_id:
             return jsonify({"error": "Both sender_id and receiver_id are required"}), 400
         
-        sender_name = supabase.table("user").select("name").eq("propel_user_id", sender_id).execute().data
-
-        # Query messages sent by the sender to the receiver
-        sent_messages = supabase.table("message").select("*").eq("sender_id", sender_id).eq("receiver_id", receiver_id).execute().data
-
-
-        # Query messages sent by the receiver to the sender
-        received_messages = supabase.table("message").select("*").eq("sender_id", receiver_id).eq("receiver_id", sender_id).execute().data
-
-        # Merge the two lists
-        all_messages = sent_messages + received_messages
-
-        # Sort the merged list by created_at
-        all_messages.sort(key=lambda x: x["created_at"])
-        print(all_messages)
+        try:
+            page = get_page_args()
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        # Both directions share one conversation_id, so the history is a single
+        # ordered range on (conversation_id, created_at, id), fetched alongside
+        # the sender's name
+        query = supabase.table("message").select("*").eq("conversation_id", conversation_key(sender_id, receiver_id))
+        query = paginate(query, page)
+        found, timings = fan_out(
+            sender_name=lambda: supabase.table("user").select("name").eq("propel_user_id", sender_id).execute().data,
+            messages=lambda: query.execute().data,
+        )
+        sender_name = found["sender_name"]
+
+        # Opening a conversation clears the viewer's unread count for it
+        viewer_id = current_user.user_id
+        if viewer_id in (sender_id, receiver_id):
+            other_id = receiver_id if viewer_id == sender_id else sender_id
+            mark_conversation_read(supabase, viewer_id, other_id)
+        all_messages, next_cursor = split_page(found["messages"], page)
 
         # Return the sorted messages
-        return jsonify([{
+        return jsonify(page_body([{
             "id": message["id"],
+            "client_message_id": message["client_message_id"],
             "sender_id": message["sender_id"],
             "receiver_id": message["receiver_id"],
             "content": message["content"],
             "created_at": message["created_at"],
             "sender_name": sender_name[0]["name"] if sender_name else "Unknown User"
-        } for message in all_messages]), 200
-    
+        } for message in all_messages], page, next_cursor)), 200, server_timing(timings)
+
+    @bp.route('/history/<string:partner_id>', methods=['GET'])
+    @auth.require_user
+    def get_history(partner_id):
+        """The current user's conversation with partner_id, newest message first.
+
+        Always paginated: follow next_cursor to walk further back in time.
+        """
+        try:
+            page = get_page_args(allow_all=False)
+            query = supabase.table("message").select(
+                "id, client_message_id, sender_id, receiver_id, content, created_at"
+            ).eq(
+                "conversation_id", conversation_key(current_user.user_id, partner_id)
+            )
+            messages, next_cursor = split_page(paginate(query, page, desc=True).execute().data, page)
+            return jsonify(page_body(messages, page, next_cursor)), 200
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+        except Exception as e:
+            print(f"Error in get_history: {e}")
+            return jsonify({"error": "Internal Server Error"}), 500
+
 
     return bp
\ No newline at end of file
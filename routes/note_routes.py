@@ -1,19 +1,23 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_cors import CORS
 from datetime import datetime
-from propelauth_flask import current_user
+from utils.sdk import current_user, get_cloudinary
 import os
 from werkzeug.utils import secure_filename
 import json
-import cloudinary
-import cloudinary.uploader
-
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+from utils.user_cache import user_cache
+from utils.search_index import search_index
+from utils.fulltext import fulltext_index
+from utils.voting import vote_message
+from utils.storage import author_of, get_storage
+from utils.vote_buffer import get_vote_buffer
+from utils.pagination import InvalidCursor, get_page_args, split_page, page_body
+from utils.derivatives import derivatives
+from utils.note_dedup import find_duplicate, blob_public_id, dedup_stats
+from utils.tracing import traced
+from utils.tags import InvalidTagFilter, get_tag_filter, store_note_tags
+from utils.upload_tickets import InvalidTicket, issue_ticket, verify_upload
+from utils.upload_jobs import CHUNK_SIZE, UploadQueueFull, spool_upload, upload_jobs
 
 UPLOAD_FOLDER = 'uploads/notes'
 ALLOWED_EXTENSIONS = {'pdf'}
@@ -28,6 +32,10 @@ def create_note_routes(auth, supabase):
     bp = Blueprint("note_routes", __name__)
     # Enable CORS for this blueprint
     CORS(bp, supports_credentials=True)
+    # Set when VOTE_WRITE_BEHIND is on; votes are then buffered and flushed in batches
+    vote_buffer = get_vote_buffer(supabase)
+    # Reads with authors, votes and note deletion (STORAGE_BACKEND)
+    storage = get_storage(supabase)
 
     @bp.route("/upload", methods=["POST"])
     @auth.require_user
@@ -46,69 +54,240 @@ def create_note_routes(auth, supabase):
                 return jsonify({"error": "Only PDF files are allowed"}), 400
 
             # Check if the user exists
-            user = supabase.table("user").select("*").eq("propel_user_id", current_user.user_id).execute().data
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
             if not user:
                 return jsonify({"error": "User not found"}), 404
-            user = user[0]
             if user.get("is_banned"):
                 return jsonify({"error": "Banned users cannot upload notes"}), 403
 
-            # Upload the file to Cloudinary
-            upload_result = cloudinary.uploader.upload(file, resource_type="raw", folder=f"courses/{course_id}")
-            file_url = upload_result.get("secure_url")
-
-            # Insert the note into Supabase
-            note_data = {
-                "course_id": course_id,
-                "user_id": user["id"],
-                "title": title,
-                "content": file_url,
-                "category_tags": json.dumps(tags),
-                "status": "pending",
-                "helpful_votes": 0,
-                "unhelpful_votes": 0,
-                "created_at": datetime.utcnow().isoformat()
-            }
-            supabase.table("note").insert(note_data).execute()
+            # Spool the file to disk, hashing it on the way; the upload itself runs on the worker pool
+            path, content_hash = spool_upload(file)
+
+            # A file that was uploaded before reuses its blob and skips the upload
+            original = find_duplicate(supabase, content_hash)
+            if original:
+                dedup_stats.record(True, os.path.getsize(path))
+                # Normally a no-op that deletes the file; extracts it if the original predates derivatives
+                derivatives.submit(path, content_hash, remove_source=True)
+                duplicate_of = original["duplicate_of"] or original["id"]
+                note = insert_note(user, course_id, title, tags, original["content"], content_hash, duplicate_of)
+                return jsonify({
+                    "message": "Note uploaded successfully and pending review",
+                    "note_id": note["id"] if note else None,
+                    "file_url": original["content"],
+                    "duplicate_of": duplicate_of
+                }), 201
+
+            try:
+                job_id = upload_jobs.submit(current_user.user_id, store_note, path, user, course_id, title, tags, content_hash)
+            except UploadQueueFull:
+                os.remove(path)
+                return jsonify({"error": "Too many uploads in progress, try again shortly"}), 503
+
+            return jsonify({
+                "message": "Upload accepted and processing",
+                "job_id": job_id,
+                "status_url": f"/notes/upload/jobs/{job_id}"
+            }), 202
+        except Exception as e:
+            print(f"Error uploading note: {e}")
+            return jsonify({"error": "Internal Server Error"}), 500
+
+    @bp.route("/upload/ticket", methods=["POST"])
+    @auth.require_user
+    def create_upload_ticket():
+        """Step one of a direct upload: signed parameters for posting the PDF to Cloudinary."""
+        try:
+            data = request.get_json() or {}
+            course_id = data.get("course_id")
+            if not course_id:
+                return jsonify({"error": "Course ID is required"}), 400
+            if data.get("filename") and not allowed_file(data["filename"]):
+                return jsonify({"error": "Only PDF files are allowed"}), 400
+
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
+            if not user:
+                return jsonify({"error": "User not found"}), 404
+            if user.get("is_banned"):
+                return jsonify({"error": "Banned users cannot upload notes"}), 403
+
+            return jsonify(issue_ticket(current_user.user_id, course_id)), 201
+        except Exception as e:
+            print(f"Error issuing upload ticket: {e}")
+            return jsonify({"error": "Internal Server Error"}), 500
 
-            # Update the user's contributions
-            contributions = user.get("contributions", 0) + 1
-            supabase.table("user").update({"contributions": contributions}).eq("id", user["id"]).execute()
+    @bp.route("/upload/finalize", methods=["POST"])
+    @auth.require_user
+    def finalize_upload():
+        """Step two: record the note once Cloudinary's signed response checks out."""
+        try:
+            data = request.get_json() or {}
+            title = data.get("title")
+            tags = data.get("tags", "")
+            if not all([data.get("ticket"), data.get("upload"), title]):
+                return jsonify({"error": "Ticket, upload, and title are required"}), 400
+            # JSON clients may send a list; the form upload sends a comma-separated string
+            if isinstance(tags, str):
+                tags = tags.split(",")
+            elif not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                return jsonify({"error": "Tags must be a list or a comma-separated string"}), 400
+
+            try:
+                course_id, file_url = verify_upload(data["ticket"], current_user.user_id, data["upload"])
+            except InvalidTicket as e:
+                return jsonify({"error": str(e)}), 403
+
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
+            if not user:
+                return jsonify({"error": "User not found"}), 404
+            if user.get("is_banned"):
+                return jsonify({"error": "Banned users cannot upload notes"}), 403
 
+            # A ticket finalizes once: the unique upload_id turns a second insert into a no-op
+            note = insert_note(user, course_id, title, tags, file_url, None, upload_id=blob_public_id(file_url))
+            if not note:
+                return jsonify({"error": "Upload already finalized"}), 409
+            dedup_stats.record(False)
+
+            # The bytes never passed through us; fetch them once to hash and extract
+            def store_hash(meta, note_id=note["id"]):
+                supabase.table("note").update({"content_hash": meta["content_hash"]}).eq("id", note_id).execute()
+
+            # The name says .pdf but the client chose the bytes; drop the note if they are not a PDF
+            def discard(note=note):
+                storage.delete_note(note["id"])
+                search_index.remove("note", note["id"])
+                release_blob(note)
+            derivatives.submit_url(file_url, store_hash, not_a_pdf=discard)
             return jsonify({
                 "message": "Note uploaded successfully and pending review",
+                "note_id": note["id"],
                 "file_url": file_url
             }), 201
         except Exception as e:
-            print(f"Error uploading note: {e}")
+            print(f"Error finalizing upload: {e}")
+            return jsonify({"error": "Internal Server Error"}), 500
+
+    def store_note(path, user, course_id, title, tags, content_hash):
+        """Upload job: stream the spooled file to Cloudinary and insert the note."""
+        dedup_stats.record(False)
+        try:
+            # upload_large sends the file in CHUNK_SIZE pieces instead of reading it whole
+            with traced("cloudinary", "upload_large"):
+                upload_result = get_cloudinary().uploader.upload_large(
+                    path, resource_type="raw", folder=f"courses/{course_id}", chunk_size=CHUNK_SIZE
+                )
+        except Exception:
+            os.remove(path)
+            raise
+        # The derivative pipeline reads the spooled copy and removes it when done
+        derivatives.submit(path, content_hash, remove_source=True)
+        file_url = upload_result.get("secure_url")
+        note = insert_note(user, course_id, title, tags, file_url, content_hash)
+        return {"note_id": note["id"] if note else None, "file_url": file_url}
+
+    def insert_note(user, course_id, title, tags, file_url, content_hash, duplicate_of=None, upload_id=None):
+        """Insert a pending note and credit the uploader; returns the inserted row.
+
+        Returns None, crediting nothing, if a note with ``upload_id`` already exists.
+        """
+        note_data = {
+            "course_id": course_id,
+            "user_id": user["id"],
+            "title": title,
+            "content": file_url,
+            "category_tags": json.dumps(tags),
+            "status": "pending",
+            "helpful_votes": 0,
+            "unhelpful_votes": 0,
+            "content_hash": content_hash,
+            "duplicate_of": duplicate_of,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        if upload_id:
+            note_data["upload_id"] = upload_id
+            query = supabase.table("note").upsert(note_data, on_conflict="upload_id", ignore_duplicates=True)
+        else:
+            query = supabase.table("note").insert(note_data)
+        inserted = query.execute().data
+        if not inserted:
+            return None
+        search_index.add_note(inserted[0])
+        store_note_tags(supabase, inserted[0])
+
+        # Increment the user's contributions in the database; concurrent uploads each count
+        updated = supabase.rpc("increment_user_contributions", {"p_user_id": user["id"]}).execute().data
+        # Cache the row the database returned, never a count derived from a cached row
+        if updated:
+            user_cache.put(updated[0])
+        else:
+            user_cache.invalidate(propel_user_id=user["propel_user_id"])
+
+        return inserted[0]
+
+    @bp.route("/upload/jobs/<job_id>", methods=["GET"])
+    @auth.require_user
+    def get_upload_job(job_id):
+        try:
+            job = upload_jobs.get(job_id)
+            if not job or job["owner"] != current_user.user_id:
+                return jsonify({"error": "Upload job not found"}), 404
+
+            body = {"job_id": job["id"], "status": job["status"]}
+            if job["status"] == "done":
+                body.update(job["result"])
+                body["message"] = "Note uploaded successfully and pending review"
+            elif job["status"] == "failed":
+                body["error"] = "Upload failed"
+            return jsonify(body), 200
+        except Exception as e:
+            print(f"Error fetching upload job: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
 
+    @bp.route("/upload/stats", methods=["GET"])
+    @auth.require_user
+    def get_upload_stats():
+        """Upload pool and deduplication counters of this process"""
+        return jsonify({"jobs": upload_jobs.stats(), "dedup": dedup_stats.stats(), "derivatives": derivatives.stats()}), 200
+
     @bp.route("/<int:course_id>", methods=["GET"])
     def fetch_notes(course_id):
         try:
-            # Fetch all approved notes for the course
-            notes = supabase.table("note").select("*").eq("course_id", course_id).eq("status", "approved").execute().data
+            # Fetch the approved notes for the course, one keyset page at a time if requested
+            page = get_page_args()
+            tags, match_all = get_tag_filter()
+            facets = None
+            if tags:
+                # Filtered through the note_tag index, with facet counts, in one query
+                rows, facets = storage.course_notes_by_tags(course_id, tags, match_all, page)
+            else:
+                rows = storage.course_notes(course_id, page)
+            notes, next_cursor = split_page(rows, page)
+            if vote_buffer:
+                vote_buffer.overlay("note", notes)
 
             note_list = []
             for note in notes:
-                user = supabase.table("user").select("name", "propel_user_id").eq("id", note["user_id"]).execute().data
-                author_name = user[0]["name"] if user else "Unknown"
-                propel_user_id = user[0]["propel_user_id"] if user else "Unknown"
-                
-
                 note_list.append({
                     "id": note["id"],
                     "title": note["title"],
                     "file_url": note["content"],
-                    "author": author_name,
+                    "author": author_of(note),
                     "tags": json.loads(note["category_tags"] or "[]"),
                     "created_at": note["created_at"],
-                    "user_id": propel_user_id,
+                    "user_id": author_of(note, "propel_user_id"),
                     "helpful_votes": note["helpful_votes"],
-                    "unhelpful_votes": note["unhelpful_votes"]
+                    "unhelpful_votes": note["unhelpful_votes"],
+                    "preview": derivatives.preview(note.get("content_hash"))
                 })
 
-            return jsonify(note_list), 200
+            if tags:
+                return jsonify({"items": note_list, "next_cursor": next_cursor, "facets": facets}), 200
+            return jsonify(page_body(note_list, page, next_cursor)), 200
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+        except InvalidTagFilter as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             print(f"Error fetching notes: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
@@ -116,32 +295,52 @@ def create_note_routes(auth, supabase):
     @bp.route("/<int:course_id>/<int:note_id>", methods=["GET"])
     def fetch_note(course_id, note_id):
         try:
-            # Fetch the note
-            note = supabase.table("note").select("*").eq("course_id", course_id).eq("id", note_id).eq("status", "approved").execute().data
+            # Fetch the note and its author
+            note = storage.note(note_id, course_id=course_id, approved_only=True)
             if not note:
                 return jsonify({"error": "Note not found"}), 404
-            note = note[0]
-
-            # Fetch the author's name
-            user = supabase.table("user").select("name").eq("id", note["user_id"]).execute().data
-            author_name = user[0]["name"] if user else "Unknown"
-            
+            if vote_buffer:
+                vote_buffer.overlay("note", [note])
 
             return jsonify({
                 "id": note["id"],
                 "title": note["title"],
                 "file_url": note["content"],
-                "author": author_name,
+                "author": author_of(note),
                 "tags": json.loads(note["category_tags"] or "[]"),
                 "created_at": note["created_at"],
                 "user_id": note["user_id"],
                 "helpful_votes": note["helpful_votes"],
-                "unhelpful_votes": note["unhelpful_votes"]
+                "unhelpful_votes": note["unhelpful_votes"],
+                "preview": derivatives.preview(note.get("content_hash"), excerpt=True)
             }), 200
         except Exception as e:
             print(f"Error fetching note: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
 
+    @bp.route("/<int:course_id>/<int:note_id>/text", methods=["GET"])
+    def fetch_note_text(course_id, note_id):
+        try:
+            note = supabase.table("note").select("content_hash").eq("course_id", course_id).eq("id", note_id).eq("status", "approved").execute().data
+            if not note:
+                return jsonify({"error": "Note not found"}), 404
+
+            text = derivatives.text(note[0].get("content_hash"))
+            if text is None:
+                return jsonify({"error": "Text not available yet"}), 404
+            return jsonify({"id": note_id, "pages": text.split("\f")[:-1]}), 200
+        except Exception as e:
+            print(f"Error fetching note text: {e}")
+            return jsonify({"error": "Internal Server Error"}), 500
+
+    @bp.route("/previews/<content_hash>/thumbnail.png", methods=["GET"])
+    def fetch_thumbnail(content_hash):
+        path = derivatives.thumbnail_path(content_hash)
+        if not path:
+            return jsonify({"error": "Thumbnail not found"}), 404
+        # Content-addressed, so the image for a hash never changes
+        return send_file(os.path.abspath(path), mimetype="image/png", max_age=31536000)
+
     @bp.route("/<int:note_id>/vote", methods=["POST"])
     @auth.require_user
     def vote_note(note_id):
@@ -153,56 +352,26 @@ def create_note_routes(auth, supabase):
             if vote_type not in ["upvote", "downvote"]:
                 return jsonify({"error": "Invalid vote type."}), 400
 
-            # Fetch the note
-            note = supabase.table("note").select("*").eq("id", note_id).execute().data
-            if not note:
+            if vote_buffer:
+                # Nothing checks the note at flush time, so make sure it exists before buffering
+                if not storage.exists("note", note_id):
+                    return jsonify({"error": "Note not found"}), 404
+                # Record the intent now; the counters are written on the next flush
+                action, _ = vote_buffer.record("note", note_id, voter_id, vote_type)
+                message, _ = vote_message("Note", vote_type, {"action": action})
+                return jsonify({"message": message, "pending": True}), 202
+
+            # Toggle the vote and update the counters in one atomic round trip
+            result = storage.cast_vote("note", note_id, voter_id, vote_type)
+            if result is None:
                 return jsonify({"error": "Note not found"}), 404
-            note = note[0]
-
-            # Check if the user has already voted
-            existing_vote = supabase.table("note_vote").select("*").eq("note_id", note_id).eq("user_id", voter_id).execute().data
-            if existing_vote:
-                existing_vote = existing_vote[0]
-                if existing_vote["vote_type"] == vote_type:
-                    # Cancel the vote
-                    supabase.table("note_vote").delete().eq("id", existing_vote["id"]).execute()
-                    if vote_type == "upvote":
-                        new_helpful_votes = max(0, note["helpful_votes"] - 1)
-                        supabase.table("note").update({"helpful_votes": new_helpful_votes}).eq("id", note_id).execute()
-                    else:
-                        new_unhelpful_votes = max(0, note["unhelpful_votes"] - 1)
-                        supabase.table("note").update({"unhelpful_votes": new_unhelpful_votes}).eq("id", note_id).execute()
-                    return jsonify({"message": f"{vote_type.capitalize()} canceled"}), 200
-                else:
-                    # Change the vote type
-                    supabase.table("note_vote").update({"vote_type": vote_type}).eq("id", existing_vote["id"]).execute()
-                    if vote_type == "upvote":
-                        new_helpful_votes = note["helpful_votes"] + 1
-                        new_unhelpful_votes = max(0, note["unhelpful_votes"] - 1)
-                        supabase.table("note").update({"helpful_votes": new_helpful_votes, "unhelpful_votes": new_unhelpful_votes}).eq("id", note_id).execute()
-                    else:
-                        new_unhelpful_votes = note["unhelpful_votes"] + 1
-                        new_helpful_votes = max(0, note["helpful_votes"] - 1)
-                        supabase.table("note").update({"unhelpful_votes": new_unhelpful_votes, "helpful_votes": new_helpful_votes}).eq("id", note_id).execute()
-                    return jsonify({"message": f"Vote changed to {vote_type}"}), 200
-
-            # Add a new vote
-            supabase.table("note_vote").insert({
-                "note_id": note_id,
-                "user_id": voter_id,
-                "vote_type": vote_type,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
-
-            # Update the vote counts
-            if vote_type == "upvote":
-                new_helpful_votes = note["helpful_votes"] + 1
-                supabase.table("note").update({"helpful_votes": new_helpful_votes}).eq("id", note_id).execute()
-            else:
-                new_unhelpful_votes = note["unhelpful_votes"] + 1
-                supabase.table("note").update({"unhelpful_votes": new_unhelpful_votes}).eq("id", note_id).execute()
 
-            return jsonify({"message": f"Note {vote_type}d successfully"}), 201
+            message, status = vote_message("Note", vote_type, result)
+            return jsonify({
+                "message": message,
+                "helpful_votes": result["helpful_votes"],
+                "unhelpful_votes": result["unhelpful_votes"]
+            }), status
         except Exception as e:
             print(f"Error voting: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
@@ -240,27 +409,26 @@ def create_note_routes(auth, supabase):
     @bp.route("/<int:note_id>/comments", methods=["GET"])
     def get_note_comments(note_id):
         try:
-            # Fetch all comments for the note
-            comments = supabase.table("note_comment").select("*").eq("note_id", note_id).order("created_at", desc=False).execute().data
+            # Fetch the comments for the note, oldest first
+            page = get_page_args()
+            comments, next_cursor = split_page(storage.note_comments(note_id, page), page)
 
             # if not comments:
             #     return jsonify({"error": "No comments found"}), 404
 
-            # Fetch user details for each comment
             comments_data = []
             for comment in comments:
-                user = supabase.table("user").select("name").eq("propel_user_id", comment["user_id"]).execute().data
-                author_name = user[0]["name"] if user else "Unknown"
-
                 comments_data.append({
                     "id": comment["id"],
                     "user_id": comment["user_id"],
-                    "author": author_name,
+                    "author": author_of(comment),
                     "content": comment["content"],
                     "created_at": comment["created_at"]
                 })
 
-            return jsonify(comments_data), 200
+            return jsonify(page_body(comments_data, page, next_cursor)), 200
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
         except Exception as e:
             print(f"Error fetching comments: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
@@ -276,10 +444,9 @@ def create_note_routes(auth, supabase):
             comment = comment[0]
 
             # Ensure the user is the author of the comment or an admin
-            user = supabase.table("user").select("*").eq("propel_user_id", current_user.user_id).execute().data
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
             if not user:
                 return jsonify({"error": "User not found"}), 404
-            user = user[0]
             if str(comment["user_id"]) != str(user["propel_user_id"]) and user["role"] != "Admin":
                 return jsonify({"error": "Unauthorized to delete this comment"}), 403
 
@@ -322,22 +489,25 @@ def create_note_routes(auth, supabase):
     def review_notes():
         try:
             # Ensure the user is an admin
-            user = supabase.table("user").select("*").eq("propel_user_id", current_user.user_id).execute().data
-            if not user or user[0]["role"] != "Admin":
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
+            if not user or user["role"] != "Admin":
                 return jsonify({"error": "Unauthorized"}), 403
 
-            # Fetch all pending notes
-            notes = supabase.table("note").select("*").eq("status", "pending").execute().data
+            # Fetch all pending notes, with the status of the notes that pending
+            # duplicates copy, so reviewers can decide at a glance
+            notes = storage.pending_notes()
 
             note_list = [
                 {
                     "id": note["id"],
                     "title": note["title"],
                     "content": note["content"],
-                    "author": supabase.table("user").select("name").eq("id", note["user_id"]).execute().data[0]["name"],
+                    "author": author_of(note),
                     "tags": json.loads(note["category_tags"] or "[]"),
                     "created_at": note["created_at"],
-                    "course_id": note["course_id"]
+                    "course_id": note["course_id"],
+                    "duplicate_of": note.get("duplicate_of"),
+                    "duplicate_of_status": note.get("duplicate_of_status")
                 }
                 for note in notes
             ]
@@ -351,15 +521,14 @@ def create_note_routes(auth, supabase):
     def update_note_status(note_id):
         try:
             # Ensure the user is an admin
-            user = supabase.table("user").select("*").eq("propel_user_id", current_user.user_id).execute().data
-            if not user or user[0]["role"] != "Admin":
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
+            if not user or user["role"] != "Admin":
                 return jsonify({"error": "Unauthorized"}), 403
 
             # Fetch the note
-            note = supabase.table("note").select("*").eq("id", note_id).execute().data
+            note = storage.note(note_id)
             if not note:
                 return jsonify({"error": "Note not found"}), 404
-            note = note[0]
 
             # Get the new status from the request
             data = request.get_json()
@@ -368,51 +537,55 @@ def create_note_routes(auth, supabase):
                 return jsonify({"error": "Invalid status"}), 400
 
             if status == "rejected":
-                # Delete the note file from Cloudinary
-                public_id = note["content"].split("/")[-1].split(".")[0]  # Extract public_id from the URL
-                cloudinary.uploader.destroy(f"courses/{note['course_id']}/{public_id}", resource_type="raw")
-
-                # Delete the note from Supabase
-                supabase.table("note").delete().eq("id", note_id).execute()
+                # Delete the note with its tag rows, then its file
+                storage.delete_note(note_id)
+                search_index.remove("note", note_id)
+                fulltext_index.remove(note_id)
+                release_blob(note)
             else:
                 # Update the note's status to approved
-                supabase.table("note").update({"status": status}).eq("id", note_id).execute()
+                storage.approve_note(note_id)
+                fulltext_index.add_note(note)
 
             return jsonify({"message": f"Note {status} successfully"}), 200
         except Exception as e:
             print(f"Error updating note status: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
 
+    def release_blob(note):
+        """Delete a deleted note's file from Cloudinary unless a duplicate still uses it.
+
+        Runs after the rows are gone, so a failure leaves an orphaned blob rather
+        than a note pointing at a missing file; errors are logged, not raised.
+        """
+        try:
+            if not storage.blob_in_use(note["content"], note["id"]):
+                with traced("cloudinary", "destroy"):
+                    get_cloudinary().uploader.destroy(blob_public_id(note["content"]), resource_type="raw")
+        except Exception as e:
+            print(f"Error deleting note file: {e}")
+
     @bp.route("/<int:note_id>", methods=["DELETE"])
     @auth.require_user
     def delete_note(note_id):
         try:
             # Fetch the note
-            note = supabase.table("note").select("*").eq("id", note_id).execute().data
+            note = storage.note(note_id)
             if not note:
                 return jsonify({"error": "Note not found"}), 404
-            note = note[0]
 
             # Ensure the user is the owner of the note or an admin
-            user = supabase.table("user").select("*").eq("propel_user_id", current_user.user_id).execute().data
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
             if not user:
                 return jsonify({"error": "User not found"}), 404
-            user = user[0]
             if str(note["user_id"]) != str(user["id"]) and user["role"] != "Admin":
                 return jsonify({"error": "Unauthorized to delete this note"}), 403
 
-            # Delete associated comments
-            supabase.table("note_comment").delete().eq("note_id", note_id).execute()
-
-            # Delete associated votes
-            supabase.table("note_vote").delete().eq("note_id", note_id).execute()
-
-            # Delete the note file from Cloudinary
-            public_id = note["content"].split("/")[-1].split(".")[0]  # Extract public_id from the URL
-            cloudinary.uploader.destroy(f"courses/{note['course_id']}/{public_id}", resource_type="raw")
-
-            # Delete the note itself
-            supabase.table("note").delete().eq("id", note_id).execute()
+            # Delete the note with its comments, votes and tag rows, then its file
+            storage.delete_note(note_id)
+            search_index.remove("note", note_id)
+            fulltext_index.remove(note_id)
+            release_blob(note)
 
             return jsonify({"message": "Note and all associated data deleted successfully"}), 200
         except Exception as e:
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify
-from propelauth_flask import current_org
+from utils.sdk import current_org
 
 def create_org_routes(auth):
     bp = Blueprint("org_routes", __name__)
@@ -1,5 +1,8 @@
 from flask import Blueprint, request, jsonify
-from sqlalchemy import or_
+from utils.concurrency import fan_out, server_timing
+from utils.metrics import authorized
+from utils.search_index import search_index, start_search_index, user_result, course_result, note_result
+from utils.fulltext import fulltext_index, start_fulltext_index
 # from models import User, Course, Note, db
 
 # Optionally import an Organization model if available.
@@ -11,53 +14,59 @@ from sqlalchemy import or_
 def create_search_routes(auth, supabase):
     bp = Blueprint('search', __name__)
 
+    # Build the in-memory indexes in the background, starting with the first
+    # request rather than at import, which must not touch the database. Until
+    # they are ready we fall back to ilike scans.
+    @bp.before_app_request
+    def start_indexes():
+        start_search_index(supabase)
+        start_fulltext_index(supabase)
+
+    def with_fulltext(results, query, limit):
+        # Name matches first, then notes whose contents match, without repeats
+        seen = {(result["type"], result["id"]) for result in results}
+        for hit in fulltext_index.search(query, limit=limit):
+            if len(results) >= limit:
+                break
+            if ("note", hit["id"]) not in seen:
+                results.append(hit)
+        return results
+
     @bp.route('', methods=['GET'])
     def search():
         try:
             query = request.args.get("query", "").strip()
             if not query:
                 return jsonify([]), 200
+            limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+
+            if search_index.ready:
+                return jsonify(with_fulltext(search_index.search(query, limit=limit), query, limit)), 200
 
-            # Supabase wildcard for partial matching
+            # Supabase wildcard for partial matching; the three scans are independent
             wildcard = f"%{query}%"
-            users = courses = notes = []
-
-            # --- Search Users ---
-            user_results = supabase.table("user").select("*").ilike("name", wildcard).execute().data
-            users = [{
-                "id": u["propel_user_id"],
-                "type": "user",
-                "title": u["name"],
-                "subtitle": u["email"],
-                "url": f"/profile/{u['propel_user_id']}"
-            } for u in user_results]
-
-            # --- Search Courses ---
-            course_results = supabase.table("course").select("*").ilike("name", wildcard).execute().data
-            courses = [{
-                "id": c["id"],
-                "type": "course",
-                "title": c["name"],
-                "subtitle": "",
-                "url": f"/courses/{c['id']}/notes"
-            } for c in course_results]
-
-
-            # --- Search Notes ---
-            note_results = supabase.table("note").select("*").ilike("title", wildcard).execute().data
-            notes = [{
-                "id": n["id"],
-                "type": "note",
-                "title": n["title"],
-                "subtitle": "",
-                "url": f"/notes/{n['id']}"
-            } for n in note_results]
+            found, timings = fan_out(
+                users=lambda: supabase.table("user").select("*").ilike("name", wildcard).limit(limit).execute().data,
+                courses=lambda: supabase.table("course").select("*").ilike("name", wildcard).limit(limit).execute().data,
+                notes=lambda: supabase.table("note").select("*").ilike("title", wildcard).limit(limit).execute().data,
+            )
+
+            users = [user_result(u) for u in found["users"]]
+            courses = [course_result(c) for c in found["courses"]]
+            notes = [note_result(n) for n in found["notes"]]
 
             # Combine all results
             results = users + courses + notes
-            return jsonify(results), 200
+            return jsonify(with_fulltext(results[:limit], query, limit)), 200, server_timing(timings)
         except Exception as e:
             print(f"Error in search: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
 
+    @bp.route('/index_stats', methods=['GET'])
+    def index_stats():
+        # Same token as /metrics
+        if not authorized():
+            return jsonify({"error": "Unauthorized"}), 401
+        return jsonify(dict(search_index.stats(), fulltext=fulltext_index.stats())), 200
+
     return bp
@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify
-from propelauth_flask import current_user
+from utils.sdk import current_user
+from utils.authors import resolve_authors, author_field
+from utils.user_cache import user_cache
+from utils.search_index import search_index
+from utils.pagination import InvalidCursor, get_page_args, paginate, split_page, page_body
 # from models import db, User, RoleRequest, UserReport
 
 def create_user_routes(auth, supabase):
@@ -21,12 +25,14 @@ def create_user_routes(auth, supabase):
 
             if not user:
                 print("User not found in Supabase. Creating new user...")
-                supabase.table("user").insert({
+                inserted = supabase.table("user").insert({
                     "propel_user_id": propel_user_id,
                     "email": email,
                     "name": name,
                     "role": "General"
-                }).execute()
+                }).execute().data
+                if inserted:
+                    search_index.add_user(inserted[0])
                 print("User created successfully.")
             else:
                 print("User already exists in Supabase.")
@@ -36,6 +42,8 @@ def create_user_routes(auth, supabase):
                 supabase.table("user").update({"role": "Admin"}).eq("propel_user_id", propel_user_id).execute()
                 print("User role updated to Admin.")
 
+            user_cache.invalidate(propel_user_id=propel_user_id)
+
             return jsonify({"message": "User synced successfully"}), 200
         except Exception as e:
             print(f"Error in /users/sync: {e}")
@@ -48,13 +56,11 @@ def create_user_routes(auth, supabase):
             propel_user_id = current_user.user_id
 
             # Fetch user info from Supabase
-            response = supabase.table("user").select("*").eq("propel_user_id", propel_user_id).execute()
-            user = response.data
+            user = user_cache.get_by_propel_id(supabase, propel_user_id)
 
             if not user:
                 return jsonify({"error": "User not found"}), 404
 
-            user = user[0]  # Supabase returns a list of results
             return jsonify({
                 "name": user["name"],
                 "email": user["email"],
@@ -99,13 +105,12 @@ def create_user_routes(auth, supabase):
     def get_role_requests():
         try:
             # Fetch the user's role from Supabase
-            response = supabase.table("user").select("role").eq("propel_user_id", current_user.user_id).execute()
-            user = response.data
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
 
             if not user:
                 return jsonify({"error": "User not found"}), 404
 
-            user_role = user[0]["role"]
+            user_role = user["role"]
 
             # Ensure the user is a Moderator or Admin
             if user_role not in ["Moderator", "Admin"]:
@@ -126,13 +131,12 @@ def create_user_routes(auth, supabase):
     def update_role_request(request_id):
         try:
             # Fetch the user's role from Supabase
-            response = supabase.table("user").select("role").eq("propel_user_id", current_user.user_id).execute()
-            user = response.data
+            user = user_cache.get_by_propel_id(supabase, current_user.user_id)
 
             if not user:
                 return jsonify({"error": "User not found"}), 404
 
-            user_role = user[0]["role"]
+            user_role = user["role"]
 
             # Ensure the user is a Moderator or Admin
             if user_role not in ["Moderator", "Admin"]:
@@ -158,6 +162,7 @@ def create_user_routes(auth, supabase):
                 # Fetch the user to update their role
                 user_id_to_update = role_request[0]["user_id"]
                 supabase.table("user").update({"role": role_request[0]["requested_role"]}).eq("propel_user_id", user_id_to_update).execute()
+                user_cache.invalidate(propel_user_id=user_id_to_update)
 
             return jsonify({"message": f"Role request {status} successfully"}), 200
         except Exception as e:
@@ -189,14 +194,17 @@ def create_user_routes(auth, supabase):
     @bp.route("/all_users", methods=["GET"])
     def get_all_users():
         try:
-            # Fetch all users from Supabase
-            response = supabase.table("user").select("propel_user_id, name, email").execute()
-            users = response.data
+            # Fetch users from Supabase, keyed on id since users have no created_at
+            page = get_page_args()
+            query = supabase.table("user").select("id, propel_user_id, name, email")
+            users, next_cursor = split_page(paginate(query, page, columns=("id",)).execute().data, page, columns=("id",))
 
-            if not users:
+            if not users and page is None:
                 return jsonify({"error": "No users found"}), 404
 
-            return jsonify(users), 200
+            return jsonify(page_body(users, page, next_cursor)), 200
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
         except Exception as e:
             print(f"Error fetching all users: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
@@ -231,8 +239,8 @@ def create_user_routes(auth, supabase):
                 return jsonify({"error": "Reported user ID and issue are required"}), 400
 
             # Check if the reported and reporter users exist in Supabase
-            reported_user = supabase.table("user").select("*").eq("propel_user_id", reported_user_id).execute().data
-            reporter_user = supabase.table("user").select("*").eq("propel_user_id", reporter_user_id).execute().data
+            reported_user = user_cache.get_by_propel_id(supabase, reported_user_id)
+            reporter_user = user_cache.get_by_propel_id(supabase, reporter_user_id)
 
             if not reported_user or not reporter_user:
                 return jsonify({"error": "Invalid user IDs"}), 404
@@ -262,18 +270,17 @@ def create_user_routes(auth, supabase):
             if not reports:
                 return jsonify({"error": "No reports found"}), 404
 
-            # Fetch user details for each report
+            # Fetch user details for every pending report in one query
+            reports = [report for report in reports if report["status"] == "pending"]
+            user_ids = [report["reported_user_id"] for report in reports] + [report["reporter_user_id"] for report in reports]
+            authors = resolve_authors(supabase, user_ids, key="propel_user_id")
+
             report_list = []
             for report in reports:
-                reported_user = supabase.table("user").select("name").eq("propel_user_id", report["reported_user_id"]).execute().data
-                reporter_user = supabase.table("user").select("name").eq("propel_user_id", report["reporter_user_id"]).execute().data
-
-                if report["status"] != "pending":
-                    continue
                 report_list.append({
                     "id": report["id"],
-                    "reported_user": reported_user[0]["name"] if reported_user else "Unknown",
-                    "reporter_user": reporter_user[0]["name"] if reporter_user else "Unknown",
+                    "reported_user": author_field(authors, report["reported_user_id"]),
+                    "reporter_user": author_field(authors, report["reporter_user_id"]),
                     "issue": report["issue"],
                     "status": report["status"],
                     "created_at": report["created_at"]
@@ -304,6 +311,7 @@ def create_user_routes(auth, supabase):
             if action == "ban":
                 # Ban the reported user
                 supabase.table("user").update({"is_banned": True}).eq("propel_user_id", report["reported_user_id"]).execute()
+                user_cache.invalidate(propel_user_id=report["reported_user_id"])
                 supabase.table("user_report").update({"status": "resolved"}).eq("id", report_id).execute()
             elif action == "reject":
                 # Reject the report
@@ -324,15 +332,20 @@ def create_user_routes(auth, supabase):
             propel_user_id = current_user.user_id
 
             # Fetch user role from Supabase
-            response = supabase.table("user").select("role").eq("propel_user_id", propel_user_id).execute()
-            user = response.data
+            user = user_cache.get_by_propel_id(supabase, propel_user_id)
 
             if not user:
                 return jsonify({"error": "User not found"}), 404
 
-            return jsonify({"role": user[0]["role"]}), 200
+            return jsonify({"role": user["role"]}), 200
         except Exception as e:
             print(f"Error in /users/get_role: {e}")
             return jsonify({"error": "Internal Server Error"}), 500
 
+    @bp.route("/cache_stats", methods=["GET"])
+    @auth.require_user
+    def get_cache_stats():
+        """Hit/miss counters of the process-local user cache"""
+        return jsonify(user_cache.stats()), 200
+
     return bp
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Shared fixtures.
+
+Tests run against the SQLite stand-in for Supabase used by the load tests
+(benchmarks/supabase_shim.py), on databases built by the Alembic migrations.
+The app itself is imported once per session, bound to a seeded database;
+tests that write use the ``supabase`` fixture, a fresh database each.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.load import _PLACEHOLDER_ENV, BenchAuth
+from benchmarks.schema import apply_migrations
+from benchmarks.supabase_shim import SQLiteSupabase
+
+SEED_ROWS = 2000
+
+
+def migrated_database(path, rows=0):
+    """Create the schema at ``path``, seeded with about ``rows`` rows of the benchmark dataset."""
+    from benchmarks.dataset import generate
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        apply_migrations(connection)
+        if rows:
+            generate(connection, rows, seed=1)
+    engine.dispose()
+    return str(path)
+
+
+@pytest.fixture
+def supabase(tmp_path):
+    """A Supabase client over an empty, migrated database."""
+    client = SQLiteSupabase(migrated_database(tmp_path / "test.db"))
+    yield client
+    client.engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def seeded_supabase(tmp_path_factory):
+    client = SQLiteSupabase(migrated_database(tmp_path_factory.mktemp("app") / "app.db", SEED_ROWS))
+    yield client
+    client.engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def app(seeded_supabase):
+    """The Flask app, served from the seeded database; bearer tokens are propel user ids."""
+    for name, value in _PLACEHOLDER_ENV.items():
+        os.environ.setdefault(name, value)
+    import utils.db
+    # Before the app is imported: the blueprints bind the shared client
+    utils.db._client = seeded_supabase
+
+    import app as app_module
+    app_module.auth._auth = BenchAuth
+    app_module.app.config["TESTING"] = True
+    return app_module.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
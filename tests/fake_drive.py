@@ -0,0 +1,132 @@
+"""A local stand-in for the parts of the Drive v3 API that google_drive.py uses.
+
+Folders (files.list / files.create), resumable media uploads and
+permissions.create, kept in memory. ``fail_at`` maps a chunk's start offset
+to how many times that chunk should be answered with a 503, to exercise the
+client's retries.
+"""
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+
+class FakeDrive(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.files = {}      # id -> metadata, with "content" for uploaded files
+        self.sessions = {}   # upload session id -> {"metadata": ..., "content": bytearray}
+        self.permissions = []
+        self.requests = []   # (method, path) of every request
+        self.fail_at = {}
+        self.failed_chunks = 0
+        self.lock = threading.Lock()
+        self._ids = 0
+
+    @property
+    def api_root(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-drive", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def new_id(self, prefix):
+        with self.lock:
+            self._ids += 1
+            return f"{prefix}{self._ids}"
+
+    def folders(self):
+        return {file_id: file for file_id, file in self.files.items() if file.get("mimeType") == FOLDER_MIME_TYPE}
+
+    def uploads(self):
+        return {file_id: file for file_id, file in self.files.items() if "content" in file}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_GET(self):
+        drive = self.server
+        url = urlparse(self.path)
+        drive.requests.append(("GET", url.path))
+        if url.path.endswith("/files"):
+            query = parse_qs(url.query).get("q", [""])[0]
+            name = re.search(r"name='([^']*)'", query).group(1)
+            matches = [{"id": file_id} for file_id, file in drive.folders().items() if file["name"] == name]
+            return self._send(200, {"files": matches})
+        self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        drive = self.server
+        url = urlparse(self.path)
+        drive.requests.append(("POST", url.path))
+        body = self._body()
+        if url.path.startswith("/upload/") and parse_qs(url.query).get("uploadType") == ["resumable"]:
+            metadata = json.loads(body or b"{}")
+            missing = [parent for parent in metadata.get("parents", []) if parent not in drive.files]
+            if missing:
+                return self._send(404, {"error": {"code": 404, "message": f"File not found: {missing[0]}"}})
+            session = drive.new_id("session")
+            drive.sessions[session] = {"metadata": metadata, "content": bytearray()}
+            return self._send(200, headers={"Location": f"{drive.api_root}upload/sessions/{session}"})
+        match = re.search(r"/files/([^/]+)/permissions$", url.path)
+        if match:
+            drive.permissions.append((match.group(1), json.loads(body)))
+            return self._send(200, {"id": drive.new_id("permission")})
+        if url.path.endswith("/files"):
+            metadata = json.loads(body)
+            file_id = drive.new_id("folder" if metadata.get("mimeType") == FOLDER_MIME_TYPE else "file")
+            drive.files[file_id] = metadata
+            return self._send(200, {"id": file_id})
+        self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_PUT(self):
+        drive = self.server
+        url = urlparse(self.path)
+        drive.requests.append(("PUT", url.path))
+        chunk = self._body()
+        session = drive.sessions.get(url.path.rsplit("/", 1)[-1])
+        if session is None:
+            return self._send(404, {"error": {"code": 404, "message": "Upload session not found"}})
+        content = session["content"]
+        if re.fullmatch(r"bytes \*/(\d+|\*)", self.headers["Content-Range"]):
+            # After a failed chunk the client asks how much arrived
+            return self._send(308, headers={"Range": f"bytes=0-{len(content) - 1}"} if content else None)
+
+        start, end, total = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", self.headers["Content-Range"]).groups()
+        if drive.fail_at.get(int(start)):
+            drive.fail_at[int(start)] -= 1
+            drive.failed_chunks += 1
+            return self._send(503, {"error": {"code": 503, "message": "Backend error"}})
+        del content[int(start):]
+        content += chunk
+        if total == "*" or len(content) < int(total):
+            return self._send(308, headers={"Range": f"bytes=0-{len(content) - 1}"})
+
+        file_id = drive.new_id("file")
+        drive.files[file_id] = {**session["metadata"], "content": bytes(content)}
+        self._send(200, {"id": file_id, "webViewLink": f"https://drive.example/{file_id}/view"})
@@ -0,0 +1,62 @@
+"""Backend call budgets of the hot read routes (see utils/tracing.py)."""
+import pytest
+
+from utils.authors import resolve_authors
+from utils.tracing import assert_call_budget, call_budget
+
+
+def bearer(user_id):
+    return {"Authorization": f"Bearer {user_id}"}
+
+
+@pytest.fixture(scope="module")
+def approved_note(seeded_supabase):
+    return seeded_supabase.table("note").select("id, course_id").eq("status", "approved").limit(1).execute().data[0]
+
+
+@pytest.mark.parametrize("limit", [5, 50])
+def test_notes_list_budget_does_not_grow_with_the_page(client, approved_note, limit):
+    # Notes, then every author in one query
+    response = client.get(f"/notes/{approved_note['course_id']}?limit={limit}")
+    assert response.status_code == 200
+    assert_call_budget(response, 2)
+
+
+def test_notes_by_tag_budget(client, approved_note):
+    # The tag procedure returns the page and facets; authors in one more query
+    response = client.get(f"/notes/{approved_note['course_id']}?limit=20&tags=midterm")
+    assert response.status_code == 200
+    assert_call_budget(response, 2)
+
+
+def test_note_detail_budget(client, approved_note):
+    response = client.get(f"/notes/{approved_note['course_id']}/{approved_note['id']}")
+    assert response.status_code == 200
+    assert_call_budget(response, 2)
+
+
+def test_conversations_budget(client):
+    # Summaries and partner names; a repeat is served from the summary cache
+    for _ in range(2):
+        response = client.get("/messages/conversations", headers=bearer("user_1"))
+        assert response.status_code == 200
+        assert_call_budget(response, 2)
+
+
+def test_message_history_budget(client):
+    response = client.get("/messages/history/user_2?limit=20", headers=bearer("user_1"))
+    assert response.status_code == 200
+    assert_call_budget(response, 1)
+
+
+def test_resolve_authors_is_one_query(seeded_supabase):
+    notes = seeded_supabase.table("note").select("user_id").limit(50).execute().data
+    with call_budget(1):
+        authors = resolve_authors(seeded_supabase, [note["user_id"] for note in notes])
+    assert authors
+
+
+def test_budget_overrun_fails(client, approved_note):
+    response = client.get(f"/notes/{approved_note['course_id']}?limit=5")
+    with pytest.raises(AssertionError, match="budget is 1"):
+        assert_call_budget(response, 1)
@@ -0,0 +1,23 @@
+import gc
+
+from utils.db import PooledPostgrestClient, pool_stats
+
+
+def session():
+    return PooledPostgrestClient("http://127.0.0.1:1/rest/v1").session
+
+
+def test_pool_stats_forget_dropped_and_closed_sessions():
+    before = len(PooledPostgrestClient.transports)
+
+    kept = session()
+    dropped = session()
+    closed = session()
+    assert len(PooledPostgrestClient.transports) == before + 3
+
+    del dropped
+    closed.close()
+    gc.collect()
+    assert len(PooledPostgrestClient.transports) == before + 1
+    assert pool_stats()["max_connections"] == PooledPostgrestClient.limits.max_connections
+    kept.close()
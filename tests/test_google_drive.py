@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+import google_drive
+from fake_drive import FakeDrive
+
+CHUNK = 256 * 1024  # the smallest chunk size Drive accepts
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    monkeypatch.setattr(google_drive, "CHUNK_SIZE", CHUNK)
+    server = FakeDrive().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(drive):
+    return google_drive.DriveClient(api_root=drive.api_root)
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"%PDF-" + os.urandom(2 * CHUNK + 1000))
+    return str(path)
+
+
+def read(path):
+    with open(path, "rb") as source:
+        return source.read()
+
+
+def test_upload_sends_chunks_and_shares_the_file(drive, client, pdf):
+    link = client.upload(pdf, 7)
+
+    (file_id, file), = drive.uploads().items()
+    assert link == f"https://drive.example/{file_id}/view"
+    assert file["content"] == read(pdf)
+    assert file["name"] == "notes.pdf"
+    assert [folder["name"] for folder in drive.folders().values()] == ["Course_7"]
+    assert file["parents"] == list(drive.folders())
+    assert drive.permissions == [(file_id, {"type": "anyone", "role": "reader"})]
+    assert sum(1 for method, _ in drive.requests if method == "PUT") == 3
+
+
+def test_failed_chunk_resumes_from_last_acknowledged_byte(drive, client, pdf):
+    drive.fail_at = {CHUNK: 1}
+
+    client.upload(pdf, 7)
+
+    (file,) = drive.uploads().values()
+    assert file["content"] == read(pdf)
+    assert drive.failed_chunks == 1
+    # Chunks 1 and 2 go once; chunk 2 fails, the client asks for the status and sends it again
+    assert sum(1 for method, _ in drive.requests if method == "PUT") == 5
+
+
+def test_persistent_failure_gives_up(monkeypatch, drive, pdf):
+    monkeypatch.setattr(google_drive, "CHUNK_RETRIES", 1)
+    monkeypatch.setattr(google_drive, "drive_client", google_drive.DriveClient(api_root=drive.api_root))
+    drive.fail_at = {CHUNK: 5}
+
+    assert google_drive.upload_to_drive(pdf, 7) is None
+    assert drive.uploads() == {}
+    assert drive.failed_chunks == 2
+
+
+def test_folder_is_cached_and_recreated_when_deleted(drive, client, pdf):
+    client.upload(pdf, 7)
+    client.upload(pdf, 7)
+    assert len(drive.folders()) == 1
+    assert sum(1 for request in drive.requests if request == ("GET", "/files")) == 1
+
+    # Someone deleted the course folder on Drive
+    drive.files = {file_id: file for file_id, file in drive.files.items() if file_id not in drive.folders()}
+    client.upload(pdf, 7)
+
+    (folder_id,) = drive.folders()
+    assert len(drive.uploads()) == 3
+    assert [file["parents"] for file in drive.uploads().values()][-1] == [folder_id]
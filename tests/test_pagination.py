@@ -0,0 +1,35 @@
+from utils.pagination import DEFAULT_LIMIT
+
+
+def user_count(seeded_supabase):
+    return len(seeded_supabase.table("user").select("id").execute().data)
+
+
+def test_listings_are_paged_by_default(client, seeded_supabase):
+    total = user_count(seeded_supabase)
+    assert total > DEFAULT_LIMIT
+
+    seen = []
+    body = client.get("/users/all_users").get_json()
+    assert len(body["items"]) == DEFAULT_LIMIT
+    while True:
+        seen += [user["id"] for user in body["items"]]
+        if body["next_cursor"] is None:
+            break
+        body = client.get(f"/users/all_users?after={body['next_cursor']}").get_json()
+
+    assert len(seen) == len(set(seen)) == total
+
+
+def test_all_opts_out_of_paging(client, seeded_supabase):
+    users = client.get("/users/all_users?all=true").get_json()
+
+    assert isinstance(users, list)
+    assert len(users) == user_count(seeded_supabase)
+
+
+def test_history_is_always_paged(client):
+    response = client.get("/messages/history/user_2?all=true", headers={"Authorization": "Bearer user_1"})
+
+    assert response.status_code == 200
+    assert set(response.get_json()) == {"items", "next_cursor"}
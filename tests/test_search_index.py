@@ -0,0 +1,38 @@
+import utils.search_index
+from utils.search_index import TrigramIndex, rebuild_search_index
+
+
+def titles(index, query):
+    return [result["title"] for result in index.search(query)]
+
+
+def test_rebuild_keeps_changes_made_while_loading(monkeypatch, supabase):
+    supabase.table("user").insert([
+        {"id": 1, "propel_user_id": "u1", "name": "Ada Lovelace", "email": "ada@example.com"},
+        {"id": 2, "propel_user_id": "u2", "name": "Grace Hopper", "email": "grace@example.com"},
+    ]).execute()
+    supabase.table("note").insert({"id": 1, "course_id": 1, "user_id": 1, "title": "Graph algorithms",
+                                   "content": "https://example.com/1.pdf"}).execute()
+    index = TrigramIndex()
+    rebuild_search_index(supabase, index)
+    load_all = utils.search_index.load_all
+
+    def load_while_others_write(supabase, table, columns):
+        rows = load_all(supabase, table, columns)
+        if table == "note":
+            # Another request approves a note and deletes a user after their rows were read
+            index.add_note({"id": 2, "title": "Graph coloring"})
+            index.remove("user", "u2")
+        return rows
+
+    monkeypatch.setattr(utils.search_index, "load_all", load_while_others_write)
+    rebuild_search_index(supabase, index)
+
+    assert sorted(titles(index, "graph")) == ["Graph algorithms", "Graph coloring"]
+    assert titles(index, "hopper") == []
+    assert titles(index, "ada") == ["Ada Lovelace"]
+
+    # Changes after the swap go straight to the index again
+    monkeypatch.setattr(utils.search_index, "load_all", load_all)
+    index.add_note({"id": 3, "title": "Graph theory"})
+    assert "Graph theory" in titles(index, "graph")
@@ -0,0 +1,92 @@
+"""The local Socket.IO hub: cross-manager delivery and slow subscribers."""
+import json
+import socket
+import threading
+import time
+
+import pytest
+import socketio
+
+from utils.socket_hub import SUBSCRIBE, LocalSocketManager, SocketHub
+
+CHANNEL = "test"
+
+
+class RecordingManager(LocalSocketManager):
+    def __init__(self, url):
+        super().__init__(url, channel=CHANNEL)
+        self.received = []
+        self.event = threading.Event()
+
+    def _handle_emit(self, message):
+        self.received.append(message)
+        self.event.set()
+
+
+def start_manager(manager):
+    server = socketio.Server(client_manager=manager, async_mode="threading")
+    # The listener normally starts with the first client connection
+    server.manager_initialized = True
+    server.manager.initialize()
+    return server
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def hub():
+    hub = SocketHub(port=0, backlog=50)
+    hub.start()
+    yield hub
+    hub.shutdown()
+    hub.server_close()
+
+
+def hub_url(hub):
+    return f"local://127.0.0.1:{hub.server_address[1]}"
+
+
+def test_emit_crosses_between_managers(hub):
+    first, second = RecordingManager(hub_url(hub)), RecordingManager(hub_url(hub))
+    sender = start_manager(first)
+    start_manager(second)
+    wait_for(lambda: len(hub.subscribers) == 2)
+
+    sender.emit("receive_message", {"content": "hi"}, room="conversation_a_b")
+
+    assert second.event.wait(10)
+    message = second.received[0]
+    assert message["event"] == "receive_message"
+    assert message["data"] == [{"content": "hi"}]
+    assert message["room"] == "conversation_a_b"
+
+
+def test_stuck_subscriber_does_not_block_the_others(hub):
+    # Subscribes and never reads, so its socket buffers and queue fill up
+    stuck = socket.create_connection(hub.server_address)
+    stuck.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stuck.sendall(SUBSCRIBE)
+    reader = RecordingManager(hub_url(hub))
+    start_manager(reader)
+    wait_for(lambda: len(hub.subscribers) == 2)
+
+    count = 400
+    payload = "x" * 65536
+    with socket.create_connection(hub.server_address) as publisher:
+        for seq in range(count):
+            line = {"channel": CHANNEL, "data": {"method": "emit", "event": "e", "data": [seq, payload]}}
+            publisher.sendall((json.dumps(line) + "\n").encode())
+            # Paced so the live reader keeps up; only the stuck one falls behind
+            time.sleep(0.002)
+
+    wait_for(lambda: len(reader.received) == count)
+    assert [message["data"][0] for message in reader.received] == list(range(count))
+    assert hub.dropped == 1
+    assert len(hub.subscribers) == 1
+    stuck.close()
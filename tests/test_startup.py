@@ -0,0 +1,8 @@
+from benchmarks.startup import LAZY_SDKS, measure_once
+
+
+def test_import_starts_no_threads_and_no_sdks():
+    _, modules, threads = measure_once()
+
+    assert threads == []
+    assert [name for name in LAZY_SDKS if name in modules] == []
@@ -0,0 +1,19 @@
+import pytest
+
+STATS_ROUTES = ["/metrics", "/pool_stats", "/search/index_stats"]
+
+
+@pytest.mark.parametrize("path", STATS_ROUTES)
+def test_stats_need_the_metrics_token(monkeypatch, client, path):
+    monkeypatch.setenv("METRICS_TOKEN", "secret")
+
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+@pytest.mark.parametrize("path", STATS_ROUTES)
+def test_stats_are_closed_without_a_token(monkeypatch, client, path):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+
+    assert client.get(path, headers={"Authorization": "Bearer "}).status_code == 401
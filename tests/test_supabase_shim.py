@@ -0,0 +1,118 @@
+import pytest
+
+
+@pytest.fixture
+def db(supabase):
+    supabase.table("user").insert([
+        {"id": 1, "propel_user_id": "u1", "email": "zoë@example.com", "name": "Zoë"},
+        {"id": 2, "propel_user_id": "u2", "email": "quote@example.com", "name": 'say "hi" \\o/'},
+        {"id": 3, "propel_user_id": "u3", "email": "plain@example.com", "name": "plain"},
+    ]).execute()
+    supabase.table("course").insert([{"id": 1, "name": "Algorithms"}, {"id": 2, "name": "Café culture"}]).execute()
+    supabase.table("post").insert([
+        {"id": 1, "course_id": 1, "user_id": "u1", "title": "Exam", "content": "When?", "upvotes": 3},
+        {"id": 2, "course_id": 1, "user_id": "u2", "title": "Homework", "content": "Due?", "upvotes": 1},
+        {"id": 3, "course_id": 2, "user_id": "u1", "title": "Reading", "content": "Which?", "upvotes": 2},
+    ]).execute()
+    return supabase
+
+
+def names_of(rows):
+    return sorted(row["name"] for row in rows)
+
+
+@pytest.mark.parametrize("name", ["Zoë", 'say "hi" \\o/', "plain"])
+def test_eq_and_neq_match_any_string(db, name):
+    found = db.table("user").select("*").eq("name", name).execute().data
+    assert names_of(found) == [name]
+
+    others = db.table("user").select("*").neq("name", name).execute().data
+    assert len(others) == 2 and name not in names_of(others)
+
+
+def test_eq_on_numbers(db):
+    assert [row["id"] for row in db.table("post").select("id").eq("upvotes", 3).execute().data] == [1]
+
+
+def test_or_logic_tree(db):
+    rows = (db.table("post").select("id")
+            .or_('and(course_id.eq.1,upvotes.gt.2),title.eq."Reading"').execute().data)
+    assert sorted(row["id"] for row in rows) == [1, 3]
+
+    rows = db.table("post").select("id").or_("not.course_id.eq.1,title.ilike.*work*").execute().data
+    assert sorted(row["id"] for row in rows) == [2, 3]
+
+
+def test_in_is_order_limit_and_count(db):
+    rows = db.table("post").select("id").in_("id", [1, 3]).order("upvotes", desc=True).execute().data
+    assert [row["id"] for row in rows] == [1, 3]
+    assert db.table("post").select("id").in_("id", []).execute().data == []
+
+    result = db.table("post").select("id", count="exact").order("id").limit(2).execute()
+    assert [row["id"] for row in result.data] == [1, 2]
+    assert result.count == 2
+
+    assert len(db.table("note").select("*").is_("content_hash", "null").execute().data) == 0
+
+
+def test_upsert_updates_or_ignores_duplicates(db):
+    db.table("course").upsert({"id": 1, "name": "Algorithms II"}).execute()
+    inserted = db.table("course").upsert({"id": 2, "name": "ignored"}, ignore_duplicates=True).execute().data
+
+    assert inserted == []
+    names = {row["id"]: row["name"] for row in db.table("course").select("*").execute().data}
+    assert names == {1: "Algorithms II", 2: "Café culture"}
+
+
+def test_update_and_delete_return_rows(db):
+    updated = db.table("post").update({"upvotes": 0}).eq("user_id", "u1").execute().data
+    assert sorted(row["id"] for row in updated) == [1, 3]
+
+    deleted = db.table("post").delete().eq("title", "Homework").execute().data
+    assert [row["id"] for row in deleted] == [2]
+    assert len(db.table("post").select("*").execute().data) == 2
+
+
+def test_embeds(db):
+    posts = db.table("post").select("id, user(name)").order("id").execute().data
+    assert posts == [{"id": 1, "user": {"name": "Zoë"}},
+                     {"id": 2, "user": {"name": 'say "hi" \\o/'}},
+                     {"id": 3, "user": {"name": "Zoë"}}]
+
+    courses = db.table("course").select("name, posts:post(title)").eq("id", 1).execute().data
+    assert courses == [{"name": "Algorithms", "posts": [{"title": "Exam"}, {"title": "Homework"}]}]
+
+
+def test_record_conversation_message(db):
+    for preview in ("hi", "again"):
+        db.rpc("record_conversation_message", {"p_sender_id": "u1", "p_receiver_id": "u2",
+                                               "p_preview": preview, "p_sent_at": "NOW()"}).execute()
+
+    rows = db.table("conversation_summary").select("*").order("user_id").execute().data
+    assert [(row["user_id"], row["partner_id"], row["last_message"], row["unread_count"]) for row in rows] == [
+        ("u1", "u2", "again", 0),
+        ("u2", "u1", "again", 2),
+    ]
+
+
+def test_course_notes_by_tags(db):
+    for note_id, tags in ((1, ["exam", "week1"]), (2, ["exam"]), (3, ["week1"])):
+        db.table("note").insert({"id": note_id, "course_id": 1, "user_id": 1, "title": f"Note {note_id}",
+                                 "content": f"https://example.com/{note_id}.pdf", "status": "approved",
+                                 "created_at": f"2026-01-0{note_id}T00:00:00"}).execute()
+        db.table("note_tag").insert([{"note_id": note_id, "tag": tag, "course_id": 1} for tag in tags]).execute()
+
+    def call(tags, match_all, **params):
+        return db.rpc("course_notes_by_tags", {"p_course_id": 1, "p_tags": tags, "p_match_all": match_all,
+                                               **params}).execute().data
+
+    both = call(["exam", "week1"], True)
+    assert [note["id"] for note in both["notes"]] == [1]
+    assert both["facets"] == {"exam": 1, "week1": 1}
+
+    either = call(["exam", "week1"], False, p_limit=2)
+    assert [note["id"] for note in either["notes"]] == [1, 2]
+    assert either["facets"] == {"exam": 2, "week1": 2}
+
+    rest = call(["exam", "week1"], False, p_after_id=2, p_after_created_at=either["notes"][-1]["created_at"])
+    assert [note["id"] for note in rest["notes"]] == [3]
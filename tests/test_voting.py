@@ -0,0 +1,81 @@
+import pytest
+
+from utils.voting import VOTE_ENTITIES, cast_vote, cast_vote_sql
+
+
+@pytest.fixture
+def entity_id(supabase):
+    """Create a user, a course, a note and a post; return their shared id."""
+    supabase.table("user").insert({"id": 1, "propel_user_id": "author", "email": "author@example.com"}).execute()
+    supabase.table("course").insert({"id": 1, "name": "Algorithms"}).execute()
+    supabase.table("note").insert({"id": 1, "course_id": 1, "user_id": 1, "title": "Week 1",
+                                   "content": "https://example.com/week1.pdf",
+                                   "helpful_votes": 0, "unhelpful_votes": 0}).execute()
+    supabase.table("post").insert({"id": 1, "course_id": 1, "user_id": "author", "title": "Exam",
+                                   "content": "When is it?", "upvotes": 0, "downvotes": 0}).execute()
+    return 1
+
+
+def via_sql(supabase, entity, entity_id, user_id, vote_type):
+    with supabase.engine.begin() as connection:
+        return cast_vote_sql(connection, entity, entity_id, user_id, vote_type)
+
+
+def via_rpc(supabase, entity, entity_id, user_id, vote_type):
+    # The shim's cast_<entity>_vote, as the routes call it
+    return cast_vote(supabase, entity, entity_id, user_id, vote_type)
+
+
+paths = pytest.mark.parametrize("vote", [via_sql, via_rpc], ids=["sql", "rpc"])
+entities = pytest.mark.parametrize("entity", sorted(VOTE_ENTITIES))
+
+
+def tallies(result, entity):
+    config = VOTE_ENTITIES[entity]
+    return result["action"], result[config["up_column"]], result[config["down_column"]]
+
+
+def stored_votes(supabase, entity):
+    rows = supabase.table(VOTE_ENTITIES[entity]["vote_table"]).select("user_id, vote_type").execute().data
+    return sorted((row["user_id"], row["vote_type"]) for row in rows)
+
+
+@paths
+@entities
+def test_repeating_a_vote_cancels_it(supabase, entity_id, vote, entity):
+    assert tallies(vote(supabase, entity, entity_id, "alice", "upvote"), entity) == ("added", 1, 0)
+    assert stored_votes(supabase, entity) == [("alice", "upvote")]
+
+    assert tallies(vote(supabase, entity, entity_id, "alice", "upvote"), entity) == ("canceled", 0, 0)
+    assert stored_votes(supabase, entity) == []
+
+
+@paths
+@entities
+def test_switching_direction_moves_the_vote(supabase, entity_id, vote, entity):
+    vote(supabase, entity, entity_id, "alice", "upvote")
+    vote(supabase, entity, entity_id, "bob", "upvote")
+
+    assert tallies(vote(supabase, entity, entity_id, "alice", "downvote"), entity) == ("changed", 1, 1)
+    assert stored_votes(supabase, entity) == [("alice", "downvote"), ("bob", "upvote")]
+
+    assert tallies(vote(supabase, entity, entity_id, "alice", "upvote"), entity) == ("changed", 2, 0)
+
+
+@paths
+@entities
+def test_counters_never_go_below_zero(supabase, entity_id, vote, entity):
+    vote(supabase, entity, entity_id, "alice", "downvote")
+    # Counters that drifted from the vote rows, e.g. reset by hand
+    config = VOTE_ENTITIES[entity]
+    supabase.table(entity).update({config["up_column"]: 0, config["down_column"]: 0}).eq("id", entity_id).execute()
+
+    assert tallies(vote(supabase, entity, entity_id, "alice", "upvote"), entity) == ("changed", 1, 0)
+    assert tallies(vote(supabase, entity, entity_id, "alice", "upvote"), entity) == ("canceled", 0, 0)
+
+
+@paths
+@entities
+def test_missing_entity(supabase, entity_id, vote, entity):
+    assert vote(supabase, entity, 999, "alice", "upvote") is None
+    assert stored_votes(supabase, entity) == []
@@ -0,0 +1,27 @@
+USER_COLUMNS = "id, propel_user_id, name"
+
+# PostgREST takes in_() filters on the query string; keep each lookup's URL
+# comfortably below proxy limits even for pages full of propel user ids.
+IN_CHUNK_SIZE = 150
+
+
+def resolve_authors(supabase, user_ids, key="id"):
+    """Fetch the user rows for a set of ids, keyed by str(<key>).
+
+    ``key`` is the column the ids refer to: ``"id"`` for notes (numeric user id)
+    or ``"propel_user_id"`` for posts, comments and messages.
+    """
+    ids = list({str(user_id) for user_id in user_ids if user_id is not None})
+    authors = {}
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        users = supabase.table("user").select(USER_COLUMNS).in_(key, chunk).execute().data
+        for user in users:
+            authors[str(user[key])] = user
+    return authors
+
+
+def author_field(authors, user_id, field="name", default="Unknown"):
+    """Look up a field of a resolved author, falling back to ``default``."""
+    user = authors.get(str(user_id))
+    return user[field] if user else default
@@ -0,0 +1,47 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by every request in the process; keeps concurrent backend reads bounded
+# no matter how many requests fan out at once.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FAN_OUT_WORKERS", "8")),
+    thread_name_prefix="fan-out",
+)
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def fan_out(**calls):
+    """Run independent zero-argument callables concurrently.
+
+    Returns ``(results, timings)`` where both are dicts keyed by the keyword
+    the callable was passed under and timings are in milliseconds. The first
+    exception raised by any call is re-raised once all of them have finished.
+    Calls run in a copy of the caller's context, so request-scoped state is
+    visible to them. Do not call fan_out from inside a fanned-out call: the
+    pool is bounded and nested waits can starve it.
+    """
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, _timed, fn)
+        for name, fn in calls.items()
+    }
+    results, timings, error = {}, {}, None
+    for name, future in futures.items():
+        try:
+            results[name], timings[name] = future.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return results, timings
+
+
+def server_timing(timings):
+    """Format fan_out timings as a Server-Timing response header."""
+    return {"Server-Timing": ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())}
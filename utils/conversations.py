@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.authors import resolve_authors, author_field
+
+PREVIEW_LENGTH = 200
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def conversation_key(user_a, user_b):
+    """Canonical id of the conversation between two users; also the Socket.IO room name."""
+    return f"conversation_{'_'.join(sorted([user_a, user_b]))}"
+
+
+class ConversationSummaryCache:
+    """Per-user list of conversation summaries, newest first.
+
+    Entries are patched in place when this process sends a message, and expire
+    after ``ttl`` seconds so summaries written by other workers show up.
+    """
+
+    def __init__(self, max_users=2048, ttl=30):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (expires_at, [summary, ...])
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return [dict(summary) for summary in entry[1]]
+
+    def put(self, user_id, summaries):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, [dict(summary) for summary in summaries])
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def record(self, user_id, partner_id, preview, sent_at, unread_increment):
+        """Move ``partner_id`` to the top of ``user_id``'s cached list, if cached."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            summaries = entry[1]
+            existing = next((s for s in summaries if s["partner_id"] == partner_id), None)
+            if existing is None:
+                # The partner's name is unknown here; let the next read rebuild the list
+                self._entries.pop(user_id, None)
+                return
+            summaries.remove(existing)
+            existing.update({
+                "last_message": preview,
+                "last_message_at": sent_at,
+                "unread_count": existing["unread_count"] + unread_increment,
+            })
+            summaries.insert(0, existing)
+
+    def mark_read(self, user_id, partner_id):
+        """Zero the cached unread count for one conversation."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            for summary in entry[1]:
+                if summary["partner_id"] == partner_id:
+                    summary["unread_count"] = 0
+                    return
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "users": len(self._entries),
+            }
+
+
+def record_message(supabase, message):
+    """Update both participants' summaries after a message has been stored."""
+    preview = (message["content"] or "")[:PREVIEW_LENGTH]
+    supabase.rpc("record_conversation_message", {
+        "p_sender_id": message["sender_id"],
+        "p_receiver_id": message["receiver_id"],
+        "p_preview": preview,
+        "p_sent_at": message["created_at"],
+    }).execute()
+    summary_cache.record(message["sender_id"], message["receiver_id"], preview, message["created_at"], 0)
+    summary_cache.record(message["receiver_id"], message["sender_id"], preview, message["created_at"], 1)
+
+
+def list_conversations(supabase, user_id, limit=DEFAULT_LIMIT):
+    """The user's most recent conversations, newest first, with partner names."""
+    summaries = summary_cache.get(user_id)
+    if summaries is None:
+        rows = supabase.table("conversation_summary").select(
+            "partner_id, last_message, last_message_at, unread_count"
+        ).eq("user_id", user_id).order("last_message_at", desc=True).limit(MAX_LIMIT).execute().data
+        names = resolve_authors(supabase, [row["partner_id"] for row in rows], key="propel_user_id")
+        summaries = [{
+            "partner_id": row["partner_id"],
+            "name": author_field(names, row["partner_id"], default="Unknown User"),
+            "last_message": row["last_message"],
+            "last_message_at": row["last_message_at"],
+            "unread_count": row["unread_count"] or 0,
+        } for row in rows]
+        summary_cache.put(user_id, summaries)
+    return summaries[:limit]
+
+
+def mark_conversation_read(supabase, user_id, partner_id):
+    summary_cache.mark_read(user_id, partner_id)
+    # The cache may be stale or belong to another worker, so always ask the database;
+    # the unread_count filter keeps already-read conversations from being rewritten
+    supabase.table("conversation_summary").update({"unread_count": 0}).eq("user_id", user_id).eq(
+        "partner_id", partner_id
+    ).gt("unread_count", 0).execute()
+
+
+summary_cache = ConversationSummaryCache(
+    max_users=int(os.getenv("CONVERSATION_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("CONVERSATION_CACHE_TTL", "30")),
+)
@@ -0,0 +1,220 @@
+"""The process-wide Supabase client.
+
+Every blueprint and Socket.IO handler receives this one client, so all
+PostgREST calls share a single keep-alive connection pool instead of each
+module opening its own HTTP stack (and paying its own TLS handshakes).
+
+Tuning, all optional:
+
+* SUPABASE_POOL_SIZE: maximum open connections (default 20)
+* SUPABASE_POOL_KEEPALIVE: idle connections kept open (default 10)
+* SUPABASE_KEEPALIVE_SECONDS: how long an idle connection is kept (default 30)
+* SUPABASE_CONNECT_TIMEOUT / SUPABASE_READ_TIMEOUT: per-call timeouts in seconds
+* SUPABASE_POOL_TIMEOUT: how long a call waits for a free connection
+* SUPABASE_RETRIES: retries after a failed attempt (default 2)
+"""
+import json
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient
+from supabase import Client, ClientOptions
+
+from utils.tracing import current_trace, record_call
+
+# Requests that are safe to send twice; writes and RPCs are only retried when
+# the connection failed before anything was sent
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Retries failed requests with capped, fully jittered exponential backoff,
+    and counts what goes through the pool."""
+
+    def __init__(self, transport, retries=2, backoff=0.1, max_backoff=2.0):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        response = error = None
+        try:
+            response = self._send(request)
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            _record_call(request, response, (time.perf_counter() - started) * 1000, error)
+
+    def _send(self, request):
+        idempotent = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = self.transport.handle_request(request)
+                if not (idempotent and response.status_code in RETRY_STATUSES and attempt < self.retries):
+                    return response
+                response.close()
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt >= self.retries:
+                    self._count_failure()
+                    raise
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError):
+                # The request may have reached the server
+                if not idempotent or attempt >= self.retries:
+                    self._count_failure()
+                    raise
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def _count_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def close(self):
+        self.transport.close()
+        PooledPostgrestClient.transports.discard(self)
+
+    def stats(self):
+        connections = getattr(getattr(self.transport, "_pool", None), "connections", [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retried": self.retried,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "connections": len(connections),
+                "idle_connections": idle,
+            }
+
+
+def _record_call(request, response, duration_ms, error):
+    # /rest/v1/<table> or /rest/v1/rpc/<function>
+    parts = request.url.path.rstrip("/").split("/")
+    if len(parts) >= 2 and parts[-2] == "rpc":
+        target, operation = parts[-1], "rpc"
+    else:
+        target = parts[-1]
+        operation = {"GET": "select", "HEAD": "count", "PATCH": "update", "DELETE": "delete"}.get(request.method, "insert")
+        if operation == "insert" and "merge-duplicates" in request.headers.get("prefer", ""):
+            operation = "upsert"
+    rows = None
+    if response is not None:
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        elif current_trace() is not None:
+            # Only traced requests pay for counting rows
+            rows = _row_count(response)
+    record_call("supabase", target, operation, duration_ms, rows, error)
+
+
+def _row_count(response):
+    # PostgREST reports the returned range as "0-24/*" on reads
+    first, _, rest = response.headers.get("content-range", "").partition("-")
+    if first.isdigit() and rest.split("/")[0].isdigit():
+        return int(rest.split("/")[0]) - int(first) + 1
+    body = response.read()
+    if body[:1] == b"[":
+        return len(json.loads(body))
+    if body[:1] == b"{":
+        return 1
+    return None if body else 0
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """PostgREST client whose session uses the shared pool settings and retries."""
+
+    limits = httpx.Limits()
+    retries = 2
+    # Sessions are dropped (and replaced) by the client, e.g. on token changes;
+    # a weak set forgets their transports with them
+    transports = weakref.WeakSet()
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        transport = RetryTransport(
+            httpx.HTTPTransport(http2=True, limits=self.limits, verify=verify, proxy=proxy),
+            retries=self.retries,
+        )
+        PooledPostgrestClient.transports.add(transport)
+        return SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=transport,
+        )
+
+
+class PooledClient(Client):
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None, verify=True, proxy=None):
+        return PooledPostgrestClient(rest_url, headers=headers, schema=schema, timeout=timeout, verify=verify, proxy=proxy)
+
+
+def create_supabase(url=None, key=None):
+    """Build a Supabase client with a tuned connection pool; see the module docstring."""
+    pool_size = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+    PooledPostgrestClient.limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "30")),
+    )
+    PooledPostgrestClient.retries = int(os.getenv("SUPABASE_RETRIES", "2"))
+    timeout = httpx.Timeout(
+        float(os.getenv("SUPABASE_READ_TIMEOUT", "10")),
+        connect=float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "3")),
+        # Waiting this long for a free pooled connection means the pool is too small
+        pool=float(os.getenv("SUPABASE_POOL_TIMEOUT", "5")),
+    )
+    options = ClientOptions(postgrest_client_timeout=timeout)
+    return PooledClient.create(url or os.getenv("SUPABASE_URL"), key or os.getenv("SUPABASE_KEY"), options)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase():
+    """The shared client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_supabase()
+    return _client
+
+
+def pool_stats():
+    """Connection pool counters, summed over the PostgREST sessions created so far."""
+    totals = {"max_connections": PooledPostgrestClient.limits.max_connections}
+    for transport in list(PooledPostgrestClient.transports):
+        for name, value in transport.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    in_use = totals.get("connections", 0) - totals.get("idle_connections", 0)
+    totals["utilization"] = in_use / totals["max_connections"] if totals["max_connections"] else 0.0
+    return totals
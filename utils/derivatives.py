@@ -0,0 +1,295 @@
+"""Derived data for note PDFs: page count, plain text and a first-page thumbnail.
+
+Parsing PDFs is CPU-bound, so extraction runs in a process pool rather than on
+request or upload threads. Results are cached on disk by the PDF's SHA-256
+under DERIVATIVES_DIR and shared by every note with the same content:
+
+    <content_hash>/meta.json      page_count, text_length, has_thumbnail
+    <content_hash>/text.txt       one page per form feed
+    <content_hash>/thumbnail.png  only when pypdfium2 and Pillow are installed
+
+Text and page counts need pypdf. Without it, extraction still succeeds but
+only records that the file was seen.
+
+Backfill notes that predate the pipeline with ``python -m utils.derivatives``.
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# The PDF libraries are only imported by the worker processes that use them
+HAVE_PYPDF = importlib.util.find_spec("pypdf") is not None
+HAVE_PDFIUM = importlib.util.find_spec("pypdfium2") is not None
+
+DERIVATIVES_DIR = os.getenv("DERIVATIVES_DIR", "uploads/derivatives")
+THUMBNAIL_WIDTH = 320
+EXCERPT_LENGTH = 500
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+# Every PDF starts with this header
+PDF_MAGIC = b"%PDF-"
+
+
+class NotAPdf(ValueError):
+    """Raised when a downloaded file does not start with the PDF header."""
+
+
+def extract(source_path, content_hash, directory=DERIVATIVES_DIR):
+    """Write the derivatives of one PDF and return its metadata. Runs in a worker process."""
+    target = os.path.join(directory, content_hash)
+    if os.path.isdir(target):
+        return _read_meta(target)
+
+    os.makedirs(directory, exist_ok=True)
+    # Build in a scratch directory and rename it into place, so readers never
+    # see a half-written entry
+    scratch = tempfile.mkdtemp(dir=directory, prefix=f".{content_hash}.")
+    meta = {"content_hash": content_hash, "page_count": None, "text_length": 0, "has_thumbnail": False}
+    try:
+        if HAVE_PYPDF:
+            from pypdf import PdfReader
+            reader = PdfReader(source_path)
+            meta["page_count"] = len(reader.pages)
+            with open(os.path.join(scratch, "text.txt"), "w", encoding="utf-8") as text:
+                for page in reader.pages:
+                    meta["text_length"] += text.write((page.extract_text() or "") + "\f")
+
+        if HAVE_PDFIUM:
+            import pypdfium2
+            document = pypdfium2.PdfDocument(source_path)
+            try:
+                if len(document):
+                    first = document[0]
+                    image = first.render(scale=THUMBNAIL_WIDTH / first.get_width()).to_pil()
+                    image.save(os.path.join(scratch, "thumbnail.png"), optimize=True)
+                    meta["has_thumbnail"] = True
+            finally:
+                document.close()
+
+        with open(os.path.join(scratch, "meta.json"), "w") as out:
+            json.dump(meta, out)
+        os.rename(scratch, target)
+    except OSError:
+        # Another worker finished the same file first
+        shutil.rmtree(scratch, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+        return _read_meta(target)
+    except Exception:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    return meta
+
+
+def extract_url(file_url, directory=DERIVATIVES_DIR):
+    """Download a PDF, hash it and extract it. Runs in a worker process.
+
+    Raises NotAPdf if the file is something else, e.g. a direct upload whose
+    bytes do not match its .pdf name.
+    """
+    import requests
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out, requests.get(file_url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            head = b""
+            for chunk in response.iter_content(1024 * 1024):
+                if len(head) < len(PDF_MAGIC):
+                    head += chunk[:len(PDF_MAGIC) - len(head)]
+                    if len(head) == len(PDF_MAGIC) and head != PDF_MAGIC:
+                        raise NotAPdf(f"{file_url} is not a PDF")
+                digest.update(chunk)
+                out.write(chunk)
+        if head != PDF_MAGIC:
+            raise NotAPdf(f"{file_url} is not a PDF")
+        return extract(path, digest.hexdigest(), directory)
+    finally:
+        os.remove(path)
+
+
+def _read_meta(target):
+    with open(os.path.join(target, "meta.json")) as meta:
+        return json.load(meta)
+
+
+class DerivativePipeline:
+    """Schedules extraction on a process pool and serves the cached results.
+
+    Each content hash is extracted at most once at a time. Metadata that has
+    been read is kept in a small in-memory LRU, so listings do not stat and
+    parse JSON files for every note.
+    """
+
+    def __init__(self, directory=DERIVATIVES_DIR, workers=2, max_cached=4096):
+        self.directory = directory
+        self.workers = workers
+        self.max_cached = max_cached
+        self.completed = 0
+        self.failed = 0
+        self._executor = None
+        self._pending = {}
+        self._meta = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, source_path, content_hash, remove_source=False):
+        """Extract a local PDF in the background; ``remove_source`` deletes it afterwards."""
+        with self._lock:
+            if content_hash in self._pending or self._exists(content_hash):
+                scheduled = False
+            else:
+                future = self._pool().submit(extract, source_path, content_hash, self.directory)
+                self._pending[content_hash] = future
+                scheduled = True
+        if not scheduled:
+            if remove_source:
+                os.remove(source_path)
+            return
+        future.add_done_callback(lambda done: self._finished(content_hash, done, source_path if remove_source else None))
+
+    def submit_url(self, file_url, callback=None, not_a_pdf=None):
+        """Download and extract a PDF in the background.
+
+        ``callback(meta)`` runs on success; ``not_a_pdf()`` runs if the file
+        turns out not to be a PDF.
+        """
+        future = self._pool().submit(extract_url, file_url, self.directory)
+
+        def finished(done):
+            self._finished(None, done, None)
+            error = done.exception()
+            if error is None:
+                handler, args = callback, (done.result(),)
+            elif isinstance(error, NotAPdf):
+                handler, args = not_a_pdf, ()
+            else:
+                return
+            if handler:
+                try:
+                    handler(*args)
+                except Exception as e:
+                    print(f"Error in derivative callback for {file_url}: {e}")
+        future.add_done_callback(finished)
+        return future
+
+    def get(self, content_hash):
+        """Metadata for a content hash, or None if it has not been extracted (yet)."""
+        if not content_hash or not CONTENT_HASH.fullmatch(content_hash):
+            return None
+        with self._lock:
+            meta = self._meta.get(content_hash)
+            if meta is not None:
+                self._meta.move_to_end(content_hash)
+                return meta
+        try:
+            meta = _read_meta(os.path.join(self.directory, content_hash))
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._meta[content_hash] = meta
+            while len(self._meta) > self.max_cached:
+                self._meta.popitem(last=False)
+        return meta
+
+    def text(self, content_hash, limit=-1):
+        """Extracted text, or its first ``limit`` characters."""
+        if not self.get(content_hash):
+            return None
+        try:
+            with open(os.path.join(self.directory, content_hash, "text.txt"), encoding="utf-8") as text:
+                return text.read(limit)
+        except FileNotFoundError:
+            return None
+
+    def thumbnail_path(self, content_hash):
+        meta = self.get(content_hash)
+        if not meta or not meta["has_thumbnail"]:
+            return None
+        return os.path.join(self.directory, content_hash, "thumbnail.png")
+
+    def preview(self, content_hash, excerpt=False):
+        """The preview block notes expose to clients, or None."""
+        meta = self.get(content_hash)
+        if not meta:
+            return None
+        preview = {
+            "page_count": meta["page_count"],
+            "thumbnail_url": f"/notes/previews/{content_hash}/thumbnail.png" if meta["has_thumbnail"] else None,
+        }
+        if excerpt:
+            text = self.text(content_hash, EXCERPT_LENGTH * 2) or ""
+            preview["text_excerpt"] = " ".join(text.split())[:EXCERPT_LENGTH]
+        return preview
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "completed": self.completed,
+                "failed": self.failed,
+                "cached": len(self._meta),
+                "text_extraction": HAVE_PYPDF,
+                "thumbnails": HAVE_PDFIUM,
+            }
+
+    def shutdown(self):
+        """Wait for running extractions (and their callbacks) and stop the pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _exists(self, content_hash):
+        return content_hash in self._meta or os.path.isdir(os.path.join(self.directory, content_hash))
+
+    def _pool(self):
+        # Started on first use; spawned rather than forked, since forking a process
+        # with eventlet, socket and database client threads running is unsafe
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _finished(self, content_hash, future, source_path):
+        error = future.exception()
+        with self._lock:
+            self._pending.pop(content_hash, None)
+            if error:
+                self.failed += 1
+            else:
+                self.completed += 1
+        if error:
+            print(f"Error extracting PDF derivatives: {error}")
+        if source_path:
+            try:
+                os.remove(source_path)
+            except FileNotFoundError:
+                pass
+
+
+derivatives = DerivativePipeline(workers=int(os.getenv("DERIVATIVE_WORKERS", "2")))
+
+
+if __name__ == "__main__":
+    from utils.db import get_supabase
+
+    parser = argparse.ArgumentParser(description="Extract derivatives for notes that have none yet")
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    supabase = get_supabase()
+    notes = supabase.table("note").select("id, content").is_("content_hash", "null").limit(args.limit).execute().data
+    for note in notes:
+        def store_hash(meta, note_id=note["id"]):
+            supabase.table("note").update({"content_hash": meta["content_hash"]}).eq("id", note_id).execute()
+        derivatives.submit_url(note["content"], store_hash)
+    derivatives.shutdown()
+    print(f"Processed {len(notes)} notes: {derivatives.stats()}")
@@ -0,0 +1,303 @@
+"""BM25 full-text search over approved notes: title, tags and extracted PDF text.
+
+The index is one immutable segment file plus a small in-memory delta:
+
+* The segment holds a JSON header (documents, term dictionary, average
+  length) followed by postings. Each term's postings are (doc number, term
+  frequency) pairs encoded as varints. They are stored in descending BM25
+  impact order, so a query reads only the first ``max_postings`` entries per
+  term, however large the corpus grows. The postings region is memory-mapped;
+  pages are read from disk only when a query touches them.
+* Approvals and deletions go to the delta at once. The segment is rewritten
+  from the database every FULLTEXT_REBUILD_SECONDS, or sooner once the delta
+  holds FULLTEXT_MAX_DELTA notes.
+"""
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import Counter
+
+from utils.derivatives import derivatives
+from utils.search_index import load_all, note_result
+
+FULLTEXT_PATH = os.getenv("FULLTEXT_PATH", "uploads/fulltext/notes.seg")
+MAGIC = b"NTFT"
+VERSION = 1
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 3
+TAG_WEIGHT = 2
+MAX_POSTINGS_PER_TERM = int(os.getenv("FULLTEXT_MAX_POSTINGS", "1000"))
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall((text or "").lower()) if len(token) > 1]
+
+
+def note_terms(note, text=None):
+    """Weighted term frequencies of a note; the title counts most, then tags."""
+    terms = Counter()
+    for token in tokenize(note.get("title")):
+        terms[token] += TITLE_WEIGHT
+    tags = note.get("category_tags") or "[]"
+    for tag in json.loads(tags) if isinstance(tags, str) else tags:
+        for token in tokenize(tag):
+            terms[token] += TAG_WEIGHT
+    terms.update(tokenize(text))
+    return terms
+
+
+def _term_weight(tf, length, avg_length):
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+
+def _put_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(buffer, position):
+    value = shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def write_segment(path, documents):
+    """Write ``documents`` ([(note_id, title, Counter), ...]) as a segment file, atomically."""
+    lengths = [sum(terms.values()) for _, _, terms in documents]
+    avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+
+    postings = {}
+    for number, (_, _, terms) in enumerate(documents):
+        for term, tf in terms.items():
+            postings.setdefault(term, []).append((number, tf))
+
+    blob = bytearray()
+    dictionary = {}
+    for term in sorted(postings):
+        entries = postings[term]
+        # idf is the same for every entry of a term, so this is BM25 order
+        entries.sort(key=lambda entry: -_term_weight(entry[1], lengths[entry[0]], avg_length))
+        offset = len(blob)
+        for number, tf in entries:
+            _put_varint(number, blob)
+            _put_varint(tf, blob)
+        dictionary[term] = [offset, len(blob) - offset, len(entries)]
+
+    header = json.dumps({
+        "avg_length": avg_length,
+        "docs": [[note_id, length, title] for (note_id, title, _), length in zip(documents, lengths)],
+        "terms": dictionary,
+    }, separators=(",", ":")).encode()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    scratch = f"{path}.{os.getpid()}.tmp"
+    with open(scratch, "wb") as out:
+        out.write(MAGIC + struct.pack("<II", VERSION, len(header)))
+        out.write(header)
+        out.write(blob)
+    os.replace(scratch, path)
+
+
+class Segment:
+    """Read-only view of a segment file; postings stay in the page cache, not the heap."""
+
+    def __init__(self, path):
+        with open(path, "rb") as source:
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:4] != MAGIC:
+            raise ValueError(f"{path} is not a full-text segment")
+        version, header_length = struct.unpack_from("<II", self._map, 4)
+        if version != VERSION:
+            raise ValueError(f"Unsupported segment version {version}")
+        header = json.loads(self._map[12:12 + header_length])
+        self._postings_start = 12 + header_length
+        self.avg_length = header["avg_length"]
+        self.docs = header["docs"]
+        self.terms = header["terms"]
+        self.size = len(self._map)
+
+    def document_frequency(self, term):
+        entry = self.terms.get(term)
+        return entry[2] if entry else 0
+
+    def postings(self, term, limit):
+        """Up to ``limit`` highest-impact (doc number, tf) pairs of ``term``."""
+        entry = self.terms.get(term)
+        if not entry:
+            return
+        position = self._postings_start + entry[0]
+        for _ in range(min(limit, entry[2])):
+            number, position = _get_varint(self._map, position)
+            tf, position = _get_varint(self._map, position)
+            yield number, tf
+
+
+class FullTextIndex:
+    def __init__(self, path=FULLTEXT_PATH, max_postings=MAX_POSTINGS_PER_TERM, max_delta=1000):
+        self.path = path
+        self.max_postings = max_postings
+        self.max_delta = max_delta
+        self.last_rebuild_ms = None
+        self.merge_requested = threading.Event()
+        self._segment = None
+        self._delta = {}    # note_id -> (title, terms, length, changed_at)
+        self._hidden = {}   # note_id -> changed_at; segment copies to skip
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._segment is not None
+
+    def open(self):
+        """Map the segment left by a previous run, if any; returns whether one was found."""
+        if not os.path.exists(self.path):
+            return False
+        segment = Segment(self.path)
+        with self._lock:
+            self._segment = segment
+        return True
+
+    def add_note(self, note):
+        """Index (or re-index) an approved note immediately."""
+        terms = note_terms(note, derivatives.text(note.get("content_hash")))
+        now = time.monotonic()
+        with self._lock:
+            self._delta[note["id"]] = (note["title"], terms, sum(terms.values()), now)
+            self._hidden[note["id"]] = now
+            if len(self._delta) >= self.max_delta:
+                self.merge_requested.set()
+
+    def remove(self, note_id):
+        with self._lock:
+            self._delta.pop(note_id, None)
+            self._hidden[note_id] = time.monotonic()
+
+    def rebuild(self, notes, started=None):
+        """Write a fresh segment from approved ``notes`` and fold the delta into it.
+
+        ``started`` is when ``notes`` were read; delta changes after it are kept.
+        """
+        started = started or time.monotonic()
+        documents = []
+        for note in notes:
+            terms = note_terms(note, derivatives.text(note.get("content_hash")))
+            if terms:
+                documents.append((note["id"], note["title"], terms))
+        write_segment(self.path, documents)
+        segment = Segment(self.path)
+
+        with self._lock:
+            # Changes made while the segment was being written are not in it yet
+            self._delta = {note_id: entry for note_id, entry in self._delta.items() if entry[3] >= started}
+            self._hidden = {note_id: at for note_id, at in self._hidden.items() if at >= started}
+            # The old map is released once in-flight searches drop their reference
+            self._segment = segment
+        self.last_rebuild_ms = round((time.monotonic() - started) * 1000, 1)
+
+    def search(self, query, limit=20):
+        terms = set(tokenize(query))
+        with self._lock:
+            segment = self._segment
+            delta = list(self._delta.items())
+            hidden = set(self._hidden)
+        if not terms or (segment is None and not delta):
+            return []
+
+        segment_docs = len(segment.docs) if segment else 0
+        total_docs = segment_docs + len(delta)
+        total_length = (segment.avg_length * segment_docs if segment else 0) + sum(entry[2] for _, entry in delta)
+        avg_length = total_length / total_docs if total_docs else 1.0
+
+        scores = {}
+        titles = {}
+        for term in terms:
+            delta_hits = [(note_id, entry) for note_id, entry in delta if term in entry[1]]
+            df = (segment.document_frequency(term) if segment else 0) + len(delta_hits)
+            if not df:
+                continue
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+
+            if segment:
+                for number, tf in segment.postings(term, self.max_postings):
+                    note_id, length, title = segment.docs[number]
+                    if note_id in hidden:
+                        continue
+                    scores[note_id] = scores.get(note_id, 0.0) + idf * _term_weight(tf, length, avg_length)
+                    titles[note_id] = title
+            for note_id, (title, doc_terms, length, _) in delta_hits:
+                scores[note_id] = scores.get(note_id, 0.0) + idf * _term_weight(doc_terms[term], length, avg_length)
+                titles[note_id] = title
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [dict(note_result({"id": note_id, "title": titles[note_id]}), score=round(score, 4)) for note_id, score in best]
+
+    def stats(self):
+        with self._lock:
+            segment = self._segment
+            return {
+                "ready": segment is not None,
+                "segment_docs": len(segment.docs) if segment else 0,
+                "segment_terms": len(segment.terms) if segment else 0,
+                "segment_bytes": segment.size if segment else 0,
+                "delta_docs": len(self._delta),
+                "hidden_docs": len(self._hidden),
+                "last_rebuild_ms": self.last_rebuild_ms,
+            }
+
+
+def rebuild_fulltext_index(supabase, index=None):
+    index = index or fulltext_index
+    started = time.monotonic()
+    notes = load_all(supabase, "note", "id, title, category_tags, content_hash, status")
+    index.rebuild([note for note in notes if note["status"] == "approved"], started)
+
+
+_rebuild_thread = None
+
+
+def start_fulltext_index(supabase, interval=None):
+    """Map the existing segment now, then rebuild it in the background every
+    ``interval`` seconds, or when the delta grows past its limit."""
+    global _rebuild_thread
+    if _rebuild_thread is not None:
+        return
+    interval = interval or float(os.getenv("FULLTEXT_REBUILD_SECONDS", "3600"))
+    try:
+        have_segment = fulltext_index.open()
+    except Exception as e:
+        print(f"Error opening full-text segment: {e}")
+        have_segment = False
+
+    def run():
+        # With a segment already mapped there is no rush to rebuild
+        if have_segment:
+            fulltext_index.merge_requested.wait(interval)
+        while True:
+            fulltext_index.merge_requested.clear()
+            try:
+                rebuild_fulltext_index(supabase)
+            except Exception as e:
+                print(f"Error rebuilding full-text index: {e}")
+            fulltext_index.merge_requested.wait(interval)
+
+    _rebuild_thread = threading.Thread(target=run, name="fulltext-index", daemon=True)
+    _rebuild_thread.start()
+
+
+fulltext_index = FullTextIndex(max_delta=int(os.getenv("FULLTEXT_MAX_DELTA", "1000")))
@@ -0,0 +1,170 @@
+import atexit
+import os
+import queue
+import random
+import threading
+import time
+
+from utils.conversations import record_message
+
+
+class MessagePersistQueue:
+    """Bounded write-behind queue for chat messages.
+
+    Socket.IO handlers emit first and submit() the row here; a single worker
+    thread drains the queue in multi-row inserts of up to ``batch_size``.
+    Failed batches are retried with jittered exponential backoff, then written
+    row by row so one bad row only loses itself. Writes skip rows whose
+    client_message_id is already stored, so retries are safe. When the queue
+    is full, submit() waits up to ``put_timeout`` seconds and then writes the row
+    itself, so a slow database slows senders down instead of dropping messages.
+    """
+
+    def __init__(self, supabase, max_size=10000, batch_size=100, max_retries=5, put_timeout=0.5):
+        self.supabase = supabase
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.put_timeout = put_timeout
+        self.enqueued = 0
+        self.persisted = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self.sync_fallbacks = 0
+        self.max_depth = 0
+        self.last_batch_ms = 0.0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="message-persist", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.backpressure_waits += 1
+            try:
+                self._queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.sync_fallbacks += 1
+                self._persist([row])
+                return
+        with self._lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def flush(self, timeout=None):
+        """Block until every submitted message has been written (or given up on)."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10):
+        """Drain the queue and stop the worker; registered to run at exit."""
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "capacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "persisted": self.persisted,
+                "batches": self.batches,
+                "retries": self.retries,
+                "failed": self.failed,
+                "backpressure_waits": self.backpressure_waits,
+                "sync_fallbacks": self.sync_fallbacks,
+                "last_batch_ms": self.last_batch_ms,
+            }
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._persist(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _persist(self, rows):
+        started = time.perf_counter()
+        if self._write(rows, self.max_retries):
+            stored = rows
+        else:
+            # One bad row should not sink the rest of the batch
+            stored = [row for row in rows if self._write([row], 0)]
+            if len(stored) < len(rows):
+                print(f"Error persisting messages: gave up on {len(rows) - len(stored)} of {len(rows)}")
+                with self._lock:
+                    self.failed += len(rows) - len(stored)
+
+        with self._lock:
+            self.persisted += len(stored)
+            self.batches += 1
+            self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+        # Every stored row, including ones an earlier ambiguous attempt already wrote:
+        # summaries are only recorded once a write is known to have landed
+        for message in stored:
+            try:
+                record_message(self.supabase, message)
+            except Exception as e:
+                print(f"Error updating conversation summary: {e}")
+
+    def _write(self, rows, retries):
+        """Insert ``rows``, retrying with backoff; returns whether they are stored."""
+        for attempt in range(retries + 1):
+            try:
+                # A retry after a write that landed but timed out skips the rows already stored
+                self.supabase.table("message").upsert(
+                    rows, on_conflict="client_message_id", ignore_duplicates=True
+                ).execute()
+                return True
+            except Exception as e:
+                if attempt == retries:
+                    print(f"Error persisting {len(rows)} messages: {e}")
+                    return False
+                with self._lock:
+                    self.retries += 1
+                time.sleep(min(5.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+_message_queue = None
+_message_queue_lock = threading.Lock()
+
+
+def get_message_queue(supabase):
+    """The process-wide queue when MESSAGE_WRITE_BEHIND is enabled, else None."""
+    global _message_queue
+    if os.getenv("MESSAGE_WRITE_BEHIND", "").lower() not in ("1", "true", "yes"):
+        return None
+    with _message_queue_lock:
+        if _message_queue is None:
+            _message_queue = MessagePersistQueue(
+                supabase,
+                max_size=int(os.getenv("MESSAGE_QUEUE_SIZE", "10000")),
+                batch_size=int(os.getenv("MESSAGE_BATCH_SIZE", "100")),
+            )
+    return _message_queue
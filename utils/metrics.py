@@ -0,0 +1,254 @@
+"""Prometheus metrics, served as text at /metrics.
+
+Recording has to be cheap enough to leave on. Every thread writes only to
+its own shard (a plain dict in a threading.local), so recording a request or
+a backend call takes no lock. A scrape copies the shards and adds them up.
+When a thread exits, its shard is folded into a shared "retired" shard, so
+counts survive short-lived request threads without the list of shards
+growing.
+
+Counters and histograms are declared at module level below. Component stats
+(caches, buffers, queues, pools) are read at scrape time through
+register_stats(). Numbers are per process; Prometheus adds up the workers.
+
+/metrics requires ``Authorization: Bearer <METRICS_TOKEN>``; with no
+METRICS_TOKEN set it refuses every scrape. Labels never carry user ids.
+"""
+import bisect
+import hmac
+import math
+import os
+import threading
+import time
+import weakref
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+_local = threading.local()
+_shards = {}    # id(shard) -> shard, one per live thread
+_retired = {}   # totals of threads that have exited
+
+
+class _ThreadGone:
+    """Kept in the thread's local storage; collected when the thread exits."""
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        _local.sentinel = _ThreadGone()
+        with _registry_lock:
+            _shards[id(shard)] = shard
+        weakref.finalize(_local.sentinel, _retire, shard)
+        return shard
+
+
+def _retire(shard):
+    with _registry_lock:
+        _shards.pop(id(shard), None)
+        _merge(_retired, shard)
+
+
+def _merge(into, shard):
+    for key, value in shard.items():
+        if isinstance(value, list):
+            total = into.get(key)
+            if total is None:
+                into[key] = list(value)
+            else:
+                for index, count in enumerate(value):
+                    total[index] += count
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        shard = _shard()
+        key = (self, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _render(self, values):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        _metrics.append(self)
+
+    def observe(self, value, *labels):
+        shard = _shard()
+        key = (self, labels)
+        cell = shard.get(key)
+        if cell is None:
+            # One count per bucket (not cumulative), then +Inf, then the sum
+            cell = shard[key] = [0] * (len(self.buckets) + 2)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def _render(self, values):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, cell in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), cell):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(cell[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else ("+Inf" if value > 0 else "-Inf" if value < 0 else "NaN")
+    return str(value)
+
+
+def register_stats(prefix, stats, help=None):
+    """Export the numeric values of ``stats()`` as gauges named ``<prefix>_<key>``.
+
+    ``stats`` is one of the components' stats() methods, or a function that
+    returns None when the component is not in use. Booleans become 0/1 and
+    other values are skipped.
+    """
+    with _registry_lock:
+        _collectors.append((prefix, stats, help or f"{prefix} stats"))
+
+
+def _render_stats():
+    lines = []
+    for prefix, stats, help in list(_collectors):
+        try:
+            values = stats()
+        except Exception as e:
+            print(f"Error collecting {prefix} metrics: {e}")
+            continue
+        for key, value in sorted((values or {}).items()):
+            if value is None or isinstance(value, (str, dict, list)):
+                continue
+            name = f"{prefix}_{key}"
+            lines += [f"# HELP {name} {help}: {key}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+    return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        totals = {}
+        _merge(totals, _retired)
+        shards = list(_shards.values())
+    for shard in shards:
+        # dict.copy() is atomic under the GIL; cells are copied by _merge
+        _merge(totals, shard.copy())
+
+    by_metric = {}
+    for (metric, labels), value in totals.items():
+        by_metric.setdefault(metric, {})[labels] = value
+    lines = []
+    for metric in _metrics:
+        lines += metric._render(by_metric.get(metric, {}))
+    lines += _render_stats()
+    return "\n".join(lines) + "\n"
+
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests handled",
+    ("blueprint", "endpoint", "method", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request",
+    ("blueprint", "endpoint", "method"))
+http_exceptions = Counter(
+    "http_request_exceptions_total", "Requests that ended in an unhandled exception",
+    ("blueprint", "endpoint"))
+backend_call_duration = Histogram(
+    "backend_call_duration_seconds", "Calls to external services (Supabase, Cloudinary, Stripe, Drive)",
+    ("service", "operation", "target"))
+backend_call_errors = Counter(
+    "backend_call_errors_total", "External calls that failed",
+    ("service", "operation", "target"))
+socketio_events = Counter(
+    "socketio_events_total", "Socket.IO events received", ("event",))
+# Rooms are named after the two users in them, so they are not a label
+socketio_emits = Counter(
+    "socketio_emits_total", "Socket.IO messages emitted", ("event",))
+
+
+def observe_backend_call(service, operation, target, duration_ms, error=None):
+    labels = (service, operation, target or "")
+    backend_call_duration.observe(duration_ms / 1000, *labels)
+    if error is not None:
+        backend_call_errors.inc(*labels)
+
+
+def authorized():
+    """Whether the current request carries the METRICS_TOKEN bearer token."""
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+def init_metrics(app):
+    """Time every request of ``app`` and serve /metrics."""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(error=None):
+        started = g.pop("metrics_started", None)
+        if started is None or request.endpoint == "metrics":
+            return
+        blueprint = request.blueprint or ""
+        endpoint = request.endpoint or "unmatched"
+        status = g.pop("metrics_status", 500)
+        http_requests.inc(blueprint, endpoint, request.method, str(status))
+        http_request_duration.observe(time.perf_counter() - started, blueprint, endpoint, request.method)
+        if error is not None:
+            http_exceptions.inc(blueprint, endpoint)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        if not authorized():
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render(), mimetype="text/plain; version=0.0.4")
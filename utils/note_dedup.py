@@ -0,0 +1,55 @@
+import threading
+
+
+def find_duplicate(supabase, content_hash):
+    """The earliest note with this content hash, or None."""
+    rows = supabase.table("note").select("id, content, status, course_id, duplicate_of").eq(
+        "content_hash", content_hash
+    ).order("id").limit(1).execute().data
+    return rows[0] if rows else None
+
+
+def blob_in_use(supabase, file_url, note_id):
+    """Whether a note other than ``note_id`` still points at ``file_url``."""
+    rows = supabase.table("note").select("id").eq("content", file_url).neq("id", note_id).limit(1).execute().data
+    return bool(rows)
+
+
+def blob_public_id(file_url):
+    """Cloudinary public id ("courses/<course_id>/<name>.pdf") of an uploaded note.
+
+    Taken from the URL rather than the note's course, since a duplicate can
+    point at a file uploaded under another course. Notes are raw resources,
+    whose public id keeps the file extension.
+    """
+    folder, course_id, filename = file_url.split("?")[0].split("/")[-3:]
+    return f"{folder}/{course_id}/{filename}"
+
+
+class DedupStats:
+    """Counts uploads and how many of them reused an existing file."""
+
+    def __init__(self):
+        self.uploads = 0
+        self.duplicates = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, duplicate, size=0):
+        with self._lock:
+            self.uploads += 1
+            if duplicate:
+                self.duplicates += 1
+                self.bytes_saved += size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "duplicates": self.duplicates,
+                "dedup_ratio": self.duplicates / self.uploads if self.uploads else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+dedup_stats = DedupStats()
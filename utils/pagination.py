@@ -0,0 +1,102 @@
+import base64
+import json
+from flask import request
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+KEYSET_COLUMNS = ("created_at", "id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(values, list):
+        raise InvalidCursor("Cursor must encode a list of key values")
+    return values
+
+
+def get_page_args(allow_all=True):
+    """Read ?limit= and ?after= from the current request.
+
+    Without either, the first DEFAULT_LIMIT rows are returned with a
+    next_cursor. ``?all=true`` opts out and returns None, for clients that
+    still need the full, unwrapped list; ``allow_all=False`` refuses that for
+    listings that are always paginated.
+    """
+    limit = request.args.get("limit", type=int)
+    after = request.args.get("after")
+    if allow_all and limit is None and after is None and request.args.get("all") == "true":
+        return None
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    return {"limit": limit, "after": decode_cursor(after) if after else None}
+
+
+def quote_value(value):
+    """Quote a value for use inside a PostgREST logic tree (or=/and= filters)."""
+    # , . : ( ) are reserved there, so values are always quoted
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _after_expression(columns, values, desc):
+    op = "lt" if desc else "gt"
+    branches = []
+    for i, column in enumerate(columns):
+        terms = [f"{columns[j]}.eq.{quote_value(values[j])}" for j in range(i)]
+        terms.append(f"{column}.{op}.{quote_value(values[i])}")
+        branches.append(terms[0] if len(terms) == 1 else f"and({','.join(terms)})")
+    return ",".join(branches)
+
+
+def paginate(query, page, columns=KEYSET_COLUMNS, desc=False, match=None):
+    """Order ``query`` by ``columns`` and, when a page was requested, restrict it
+    to the rows after the cursor.
+
+    ``match`` is an optional PostgREST ``or`` expression the rows must also
+    satisfy; it is merged with the cursor condition because a request can only
+    carry one ``or`` filter reliably. Fetches one row past the limit so
+    split_page can tell whether another page exists.
+    """
+    for column in columns:
+        query = query.order(column, desc=desc)
+
+    after = page["after"] if page else None
+    if after is not None:
+        if len(after) != len(columns):
+            raise InvalidCursor("Cursor does not match this listing")
+        expression = _after_expression(columns, after, desc)
+        if match:
+            query = query.or_(f"and(or({match}),or({expression}))")
+        else:
+            query = query.or_(expression)
+    elif match:
+        query = query.or_(match)
+
+    if page:
+        query = query.limit(page["limit"] + 1)
+    return query
+
+
+def split_page(rows, page, columns=KEYSET_COLUMNS):
+    """Trim the look-ahead row and return (rows, next_cursor)."""
+    if page is None or len(rows) <= page["limit"]:
+        return rows, None
+    rows = rows[:page["limit"]]
+    return rows, encode_cursor([rows[-1][column] for column in columns])
+
+
+def page_body(items, page, next_cursor):
+    """Requests that opted out of paging (?all=true) keep the plain list body."""
+    if page is None:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
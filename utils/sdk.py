@@ -0,0 +1,101 @@
+"""First-use initialization of the external SDKs.
+
+Importing and configuring stripe, cloudinary, supabase and propelauth_flask
+adds hundreds of milliseconds to a cold start. PropelAuth's init_auth also
+fetches token verification keys over the network. Nothing here imports an SDK
+until a request actually needs it, so a cold worker serves its first request
+sooner.
+"""
+import functools
+import os
+import threading
+
+from flask import g
+from werkzeug.local import LocalProxy
+
+
+def once(factory):
+    """Call ``factory`` on first use, from whichever thread gets there first, and cache the result."""
+    result = []
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get():
+        if not result:
+            with lock:
+                if not result:
+                    result.append(factory())
+        return result[0]
+    return get
+
+
+@once
+def get_stripe():
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    return stripe
+
+
+@once
+def get_cloudinary():
+    """The configured cloudinary package, with ``uploader`` and ``utils`` loaded."""
+    import cloudinary
+    import cloudinary.uploader
+    import cloudinary.utils
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET")
+    )
+    return cloudinary
+
+
+def _get_supabase():
+    from utils.db import get_supabase
+    return get_supabase()
+
+
+# Stands in for the shared client; it is created by the first call through it
+supabase = LocalProxy(_get_supabase)
+
+# Same as propelauth_flask's, without importing it
+current_user = LocalProxy(lambda: g.propelauth_current_user)
+current_org = LocalProxy(lambda: g.propelauth_current_org)
+
+
+class LazyAuth:
+    """Stands in for ``init_auth(auth_url, api_key)`` until the first request.
+
+    ``require_user``, ``optional_user`` and ``require_org_member()`` can decorate
+    routes at import time; the PropelAuth client is created the first time a
+    decorated route runs. Any other attribute creates it straight away.
+    """
+
+    def __init__(self, auth_url, api_key):
+        self.auth_url = auth_url
+        self.api_key = api_key
+        self._auth = once(self._init)
+
+    def _init(self):
+        from propelauth_flask import init_auth
+        return init_auth(self.auth_url, self.api_key)
+
+    def require_user(self, func):
+        return self._decorate(func, lambda auth: auth.require_user)
+
+    def optional_user(self, func):
+        return self._decorate(func, lambda auth: auth.optional_user)
+
+    def require_org_member(self, *args, **kwargs):
+        return lambda func: self._decorate(func, lambda auth: auth.require_org_member(*args, **kwargs))
+
+    def _decorate(self, func, decorator):
+        decorated = once(lambda: decorator(self._auth())(func))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return decorated()(*args, **kwargs)
+        return wrapper
+
+    def __getattr__(self, name):
+        return getattr(self._auth(), name)
@@ -0,0 +1,238 @@
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+LOAD_BATCH_SIZE = 1000
+
+
+def _words(text):
+    return _WORD_RE.findall((text or "").lower())
+
+
+def trigrams(text, prefix=False):
+    """pg_trgm style trigrams: each word is padded with two leading blanks and
+    one trailing blank.
+
+    With ``prefix`` the last word's trailing-blank trigram is dropped so a word
+    that is still being typed matches every word it is a prefix of.
+    """
+    words = _words(text)
+    grams = set()
+    for i, word in enumerate(words):
+        padded = f"  {word} "
+        if prefix and i == len(words) - 1:
+            padded = padded[:-1]
+        for j in range(len(padded) - 2):
+            grams.add(padded[j:j + 3])
+    return grams
+
+
+def user_result(user):
+    return {
+        "id": user["propel_user_id"],
+        "type": "user",
+        "title": user["name"],
+        "subtitle": user["email"],
+        "url": f"/profile/{user['propel_user_id']}"
+    }
+
+
+def course_result(course):
+    return {
+        "id": course["id"],
+        "type": "course",
+        "title": course["name"],
+        "subtitle": "",
+        "url": f"/courses/{course['id']}/notes"
+    }
+
+
+def note_result(note):
+    return {
+        "id": note["id"],
+        "type": "note",
+        "title": note["title"],
+        "subtitle": "",
+        "url": f"/notes/{note['id']}"
+    }
+
+
+class TrigramIndex:
+    """In-process trigram index over user names, course names and note titles.
+
+    Documents are keyed by (type, id) and carry the ready-made search result so
+    a query never touches the database.
+    """
+
+    def __init__(self, min_similarity=0.5):
+        self.min_similarity = min_similarity
+        self.ready = False
+        self.built_at = None
+        self._docs = {}  # (type, id) -> (text, trigrams, result)
+        self._postings = defaultdict(set)  # trigram -> {(type, id)}
+        self._journal = None  # (type, id) -> (text, result), or None if removed; kept during a rebuild
+        self._lock = threading.RLock()
+
+    def add(self, doc_type, doc_id, text, result):
+        key = (doc_type, str(doc_id))
+        grams = trigrams(text)
+        with self._lock:
+            self._remove(key)
+            self._docs[key] = (" ".join(_words(text)), grams, result)
+            for gram in grams:
+                self._postings[gram].add(key)
+            if self._journal is not None:
+                self._journal[key] = (text, result)
+
+    def remove(self, doc_type, doc_id):
+        key = (doc_type, str(doc_id))
+        with self._lock:
+            self._remove(key)
+            if self._journal is not None:
+                self._journal[key] = None
+
+    def add_user(self, user):
+        self.add("user", user["propel_user_id"], user.get("name"), user_result(user))
+
+    def add_course(self, course):
+        self.add("course", course["id"], course.get("name"), course_result(course))
+
+    def add_note(self, note):
+        self.add("note", note["id"], note.get("title"), note_result(note))
+
+    def begin_rebuild(self):
+        """Record changes from now on; call before reading the rows for replace_all."""
+        with self._lock:
+            self._journal = {}
+
+    def replace_all(self, users, courses, notes):
+        """Swap in a freshly built index in one step.
+
+        Changes recorded since begin_rebuild may be missing from the rows, so
+        they are replayed onto the new index before the swap.
+        """
+        fresh = TrigramIndex(self.min_similarity)
+        for user in users:
+            fresh.add_user(user)
+        for course in courses:
+            fresh.add_course(course)
+        for note in notes:
+            fresh.add_note(note)
+        with self._lock:
+            for (doc_type, doc_id), change in (self._journal or {}).items():
+                if change is None:
+                    fresh.remove(doc_type, doc_id)
+                else:
+                    fresh.add(doc_type, doc_id, *change)
+            self._journal = None
+            self._docs, self._postings = fresh._docs, fresh._postings
+            self.ready = True
+            self.built_at = time.time()
+
+    def search(self, query, limit=20):
+        """Return up to ``limit`` results ranked by trigram similarity, with
+        substring and prefix matches first."""
+        query_grams = trigrams(query, prefix=True)
+        if not query_grams:
+            return []
+        needle = " ".join(_words(query))
+
+        with self._lock:
+            # A document sharing at least `required` of the query's trigrams must
+            # contain one of the rarest len - required + 1 of them, so only those
+            # postings are scanned for candidates.
+            postings = sorted((self._postings.get(gram, set()) for gram in query_grams), key=len)
+            required = max(1, math.ceil(self.min_similarity * len(postings)))
+            candidates = set().union(*postings[:len(postings) - required + 1])
+
+            scored = []
+            for key in candidates:
+                shared = sum(1 for keys in postings if key in keys)
+                if shared < required:
+                    continue
+                text, grams, result = self._docs[key]
+                score = shared / (len(query_grams) + len(grams) - shared)
+                if needle in text:
+                    score += 1.0
+                    if text.startswith(needle):
+                        score += 0.5
+                scored.append((score, text, result))
+
+        best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+        return [result for _, _, result in best]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": len(self._docs),
+                "trigrams": len(self._postings),
+                "built_at": self.built_at,
+            }
+
+    def _remove(self, key):
+        # Caller holds the lock
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for gram in doc[1]:
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+
+def load_all(supabase, table, columns):
+    # PostgREST caps response size, so walk the table in id order
+    rows = []
+    last_id = None
+    while True:
+        query = supabase.table(table).select(columns).order("id").limit(LOAD_BATCH_SIZE)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        batch = query.execute().data
+        rows.extend(batch)
+        if len(batch) < LOAD_BATCH_SIZE:
+            return rows
+        last_id = batch[-1]["id"]
+
+
+def rebuild_search_index(supabase, index=None):
+    index = index or search_index
+    index.begin_rebuild()
+    users = load_all(supabase, "user", "id, propel_user_id, name, email")
+    courses = load_all(supabase, "course", "id, name")
+    notes = load_all(supabase, "note", "id, title")
+    index.replace_all(users, courses, notes)
+
+
+_rebuild_thread = None
+
+
+def start_search_index(supabase, interval=None):
+    """Build the index in the background and rebuild it every ``interval``
+    seconds to pick up changes made by other workers."""
+    global _rebuild_thread
+    if _rebuild_thread is not None:
+        return
+    interval = interval or float(os.getenv("SEARCH_INDEX_REBUILD_SECONDS", "600"))
+
+    def run():
+        while True:
+            try:
+                rebuild_search_index(supabase)
+            except Exception as e:
+                print(f"Error rebuilding search index: {e}")
+            time.sleep(interval)
+
+    _rebuild_thread = threading.Thread(target=run, name="search-index", daemon=True)
+    _rebuild_thread.start()
+
+
+search_index = TrigramIndex()
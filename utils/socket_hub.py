@@ -0,0 +1,220 @@
+"""Socket.IO fan-out across worker processes.
+
+SOCKETIO_MESSAGE_QUEUE selects the backend:
+
+* unset: single process, rooms only reach clients of this worker
+* ``redis://``, ``kafka://``, ``zmq+...``, ``amqp://``: handed to Flask-SocketIO
+* ``local://host:port``: the hub in this module, a small TCP relay that needs
+  no external service, for development, tests and benchmarks
+
+Run the hub with ``python -m utils.socket_hub --port 5680``. Like the Redis
+manager, the local manager uses blocking sockets and so needs monkey patching
+when the server runs under eventlet or gevent.
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from urllib.parse import urlparse
+
+from socketio import PubSubManager
+
+DEFAULT_PORT = 5680
+SUBSCRIBE = b"SUBSCRIBE\n"
+# Lines queued per subscriber before the hub gives up on it
+SUBSCRIBER_BACKLOG = int(os.getenv("SOCKET_HUB_BACKLOG", "10000"))
+
+
+class _Subscriber:
+    """One subscribed worker: a bounded outbound queue, written by its own thread."""
+
+    def __init__(self, connection, wfile, backlog):
+        self.connection = connection
+        self.wfile = wfile
+        self.queue = queue.Queue(maxsize=backlog)
+        self.closed = False
+
+    def offer(self, line):
+        """Queue ``line`` without blocking; False if the worker has fallen too far behind."""
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            # Unblocks the writer (mid-send) and the disconnect watcher (mid-read)
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def drain(self):
+        """Write queued lines until the subscriber is closed or the connection fails."""
+        try:
+            while not self.closed:
+                line = self.queue.get()
+                if line is None:
+                    return
+                self.wfile.write(line)
+                # Send whatever else is already waiting with one flush
+                while not self.queue.empty():
+                    line = self.queue.get_nowait()
+                    if line is None:
+                        return
+                    self.wfile.write(line)
+                self.wfile.flush()
+        except OSError:
+            pass
+
+
+class _HubHandler(socketserver.StreamRequestHandler):
+    # A connection either subscribes (its first line is SUBSCRIBE) and only
+    # receives, or publishes and only sends. Publishers never get messages back,
+    # so an unread publisher socket cannot stall the relay.
+    def handle(self):
+        hub = self.server
+        first = self.rfile.readline()
+        if first == SUBSCRIBE:
+            subscriber = _Subscriber(self.connection, self.wfile, hub.backlog)
+            with hub.lock:
+                hub.subscribers.append(subscriber)
+            watcher = threading.Thread(target=self._await_disconnect, args=(subscriber,),
+                                       name="socket-hub-watch", daemon=True)
+            watcher.start()
+            try:
+                subscriber.drain()
+            finally:
+                hub.drop(subscriber)
+            return
+
+        line = first
+        while line:
+            hub.relay(line)
+            line = self.rfile.readline()
+
+    def _await_disconnect(self, subscriber):
+        try:
+            self.rfile.read()  # Returns when the worker disconnects
+        except OSError:
+            pass
+        subscriber.close()
+
+
+class SocketHub(socketserver.ThreadingTCPServer):
+    """Relays every newline-delimited message it receives to all connected workers.
+
+    Each subscriber has its own queue of up to ``backlog`` lines, drained by
+    its own thread, so a slow worker never holds up the others. A worker that
+    lets its queue fill up is disconnected; its manager reconnects and
+    carries on from new messages.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, backlog=SUBSCRIBER_BACKLOG):
+        super().__init__((host, port), _HubHandler)
+        self.backlog = backlog
+        self.subscribers = []
+        self.relayed = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def relay(self, line):
+        with self.lock:
+            self.relayed += 1
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            if not subscriber.offer(line):
+                with self.lock:
+                    self.dropped += 1
+                self.drop(subscriber)
+
+    def drop(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.close()
+
+    def start(self):
+        """Serve from a daemon thread; returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, name="socket-hub", daemon=True)
+        thread.start()
+        return thread
+
+
+class LocalSocketManager(PubSubManager):
+    """Socket.IO client manager that publishes through a SocketHub."""
+
+    name = "localsocket"
+
+    def __init__(self, url=f"local://127.0.0.1:{DEFAULT_PORT}", channel="flask-socketio",
+                 write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or "127.0.0.1", parsed.port or DEFAULT_PORT)
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self):
+        return socket.create_connection(self.address)
+
+    def _publish(self, data):
+        line = (json.dumps({"channel": self.channel, "data": data}, default=str) + "\n").encode()
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    self._publisher.sendall(line)
+                    return
+                except OSError:
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        retry = 1
+        while True:
+            try:
+                with self._connect() as connection, connection.makefile("rb") as stream:
+                    connection.sendall(SUBSCRIBE)
+                    retry = 1
+                    for line in stream:
+                        message = json.loads(line)
+                        if message.get("channel") == self.channel:
+                            yield message["data"]
+            except OSError:
+                self._get_logger().error(f"Cannot reach socket hub at {self.address}, retrying in {retry}s")
+            time.sleep(retry)
+            retry = min(retry * 2, 30)
+
+
+def socketio_queue_options():
+    """SocketIO() keyword arguments for the configured message queue."""
+    url = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    channel = os.getenv("SOCKETIO_CHANNEL", "flask-socketio")
+    if not url:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalSocketManager(url, channel=channel)}
+    return {"message_queue": url, "channel": channel}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay Socket.IO messages between worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    print(f"Socket hub listening on {args.host}:{args.port}")
+    SocketHub(args.host, args.port).serve_forever()
@@ -0,0 +1,312 @@
+"""Storage backends for the note, post and comment routes.
+
+STORAGE_BACKEND picks how the routes below reach the database:
+
+* ``supabase`` (default): the shared Supabase client, over PostgREST
+* ``sql``: a pooled SQLAlchemy engine on DATABASE_URL. Use the Postgres
+  connection string of the Supabase project (or any database migrated with
+  ``flask db upgrade``), or ``sqlite:///local.db`` for local runs.
+
+Both backends return the same rows. Every listing row carries an ``author``
+dict (id, propel_user_id, name), or None for a deleted user. The SQL backend
+fetches it with a JOIN in the same query. The Supabase backend needs a second
+query (see utils/authors.py). Votes and note deletion each run in one
+transaction on the SQL backend. On Supabase they use the stored procedures
+and ordered deletes, as before.
+
+Listings follow the keyset protocol of utils/pagination.py: with a page, one
+row past the limit is returned for split_page.
+
+Only these routes go through the storage layer. Messages, uploads, users and
+the write-behind buffers still use the Supabase client, so with the ``sql``
+backend both should point at the same database.
+"""
+import os
+import threading
+from datetime import datetime
+
+from utils.authors import resolve_authors
+from utils.concurrency import fan_out
+from utils.note_dedup import blob_in_use
+from utils.pagination import KEYSET_COLUMNS, InvalidCursor, paginate
+from utils.tags import notes_by_tags
+from utils.tracing import traced
+from utils.user_cache import user_cache
+from utils.voting import VOTE_ENTITIES, cast_vote, cast_vote_sql
+
+
+def author_of(row, field="name", default="Unknown"):
+    """A field of the row's author, falling back to ``default``."""
+    author = row.get("author")
+    return author[field] if author else default
+
+
+class SupabaseStorage:
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def _with_authors(self, rows, key="id"):
+        authors = resolve_authors(self.supabase, [row["user_id"] for row in rows], key=key)
+        for row in rows:
+            row["author"] = authors.get(str(row["user_id"]))
+        return rows
+
+    def course_notes(self, course_id, page):
+        query = self.supabase.table("note").select("*").eq("course_id", course_id).eq("status", "approved")
+        return self._with_authors(paginate(query, page).execute().data)
+
+    def course_notes_by_tags(self, course_id, tags, match_all, page):
+        rows, facets = notes_by_tags(self.supabase, course_id, tags, match_all, page)
+        return self._with_authors(rows), facets
+
+    def note(self, note_id, course_id=None, approved_only=False):
+        query = self.supabase.table("note").select("*").eq("id", note_id)
+        if course_id is not None:
+            query = query.eq("course_id", course_id)
+        if approved_only:
+            query = query.eq("status", "approved")
+        rows = query.execute().data
+        if not rows:
+            return None
+        note = rows[0]
+        # One author: the process-wide user cache usually has it
+        note["author"] = user_cache.get_by_id(self.supabase, note["user_id"])
+        return note
+
+    def pending_notes(self):
+        notes = self._with_authors(self.supabase.table("note").select("*").eq("status", "pending").execute().data)
+        original_ids = list({note["duplicate_of"] for note in notes if note.get("duplicate_of")})
+        originals = {}
+        if original_ids:
+            rows = self.supabase.table("note").select("id, status").in_("id", original_ids).execute().data
+            originals = {row["id"]: row["status"] for row in rows}
+        for note in notes:
+            note["duplicate_of_status"] = originals.get(note.get("duplicate_of"))
+        return notes
+
+    def note_comments(self, note_id, page):
+        query = self.supabase.table("note_comment").select("*").eq("note_id", note_id)
+        return self._with_authors(paginate(query, page).execute().data, key="propel_user_id")
+
+    def course_posts(self, course_id, page):
+        """(course name or None, posts, fan_out timings)"""
+        query = paginate(self.supabase.table("post").select("*").eq("course_id", course_id), page)
+        found, timings = fan_out(
+            course=lambda: self.supabase.table("course").select("name").eq("id", course_id).execute().data,
+            posts=lambda: query.execute().data,
+        )
+        if not found["course"]:
+            return None, [], timings
+        return found["course"][0]["name"], self._with_authors(found["posts"], key="propel_user_id"), timings
+
+    def post_comments(self, post_id, page):
+        query = self.supabase.table("comment").select("*").eq("post_id", post_id)
+        return self._with_authors(paginate(query, page).execute().data, key="propel_user_id")
+
+    def exists(self, entity, entity_id):
+        return bool(self.supabase.table(entity).select("id").eq("id", entity_id).limit(1).execute().data)
+
+    def cast_vote(self, entity, entity_id, user_id, vote_type):
+        return cast_vote(self.supabase, entity, entity_id, user_id, vote_type)
+
+    def blob_in_use(self, file_url, note_id):
+        return blob_in_use(self.supabase, file_url, note_id)
+
+    def approve_note(self, note_id):
+        self.supabase.table("note").update({"status": "approved"}).eq("id", note_id).execute()
+
+    def delete_note(self, note_id):
+        # Children first; PostgREST has no transaction across requests
+        for table in ("note_comment", "note_vote", "note_tag"):
+            self.supabase.table(table).delete().eq("note_id", note_id).execute()
+        self.supabase.table("note").delete().eq("id", note_id).execute()
+
+    def stats(self):
+        return None
+
+
+# Author columns joined onto listings, unpacked into row["author"]
+_AUTHOR_SELECT = ", author.id AS author_id, author.propel_user_id AS author_propel_user_id, author.name AS author_name"
+_AUTHOR_COLUMNS = ("id", "propel_user_id", "name")
+
+
+class SqlStorage:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _rows(self, connection, target, sql, params=None):
+        from sqlalchemy import text
+        with traced("database", "select", target):
+            rows = [dict(row) for row in connection.execute(text(sql), params or {}).mappings()]
+        for row in rows:
+            for key, value in row.items():
+                # Same wire format as PostgREST, so cursors and JSON bodies match
+                if isinstance(value, datetime):
+                    row[key] = value.isoformat()
+            if "author_id" in row:
+                author = {column: row.pop(f"author_{column}") for column in _AUTHOR_COLUMNS}
+                row["author"] = author if author["id"] is not None else None
+        return rows
+
+    def _listing(self, connection, table, where, params, page, author_key):
+        """Keyset page of ``table`` rows matching ``where``, with their authors."""
+        params = dict(params)
+        after = page["after"] if page else None
+        if after is not None:
+            if len(after) != len(KEYSET_COLUMNS):
+                raise InvalidCursor("Cursor does not match this listing")
+            where += (f" AND ({table}.created_at > :after_created_at OR "
+                      f"({table}.created_at = :after_created_at AND {table}.id > :after_id))")
+            params.update(after_created_at=after[0], after_id=after[1])
+        sql = (f'SELECT {table}.*{_AUTHOR_SELECT} FROM {table} '
+               f'LEFT JOIN "user" AS author ON author.{author_key} = {table}.user_id '
+               f"WHERE {where} ORDER BY {table}.created_at, {table}.id")
+        if page:
+            sql += f" LIMIT {int(page['limit']) + 1}"
+        return self._rows(connection, table, sql, params)
+
+    def course_notes(self, course_id, page):
+        with self.engine.connect() as connection:
+            return self._listing(connection, "note", "note.course_id = :course_id AND note.status = 'approved'",
+                                 {"course_id": course_id}, page, "id")
+
+    def course_notes_by_tags(self, course_id, tags, match_all, page):
+        # Same query as the course_notes_by_tags procedure, for any SQL database
+        names = {f"tag_{index}": tag for index, tag in enumerate(tags)}
+        having = f" HAVING COUNT(*) = {len(names)}" if match_all else ""
+        matched = ("SELECT note_tag.note_id FROM note_tag JOIN note ON note.id = note_tag.note_id "
+                   f"WHERE note_tag.course_id = :course_id AND note_tag.tag IN ({', '.join(':' + name for name in names)}) "
+                   f"AND note.status = 'approved' GROUP BY note_tag.note_id{having}")
+        params = {"course_id": course_id, **names}
+        with self.engine.connect() as connection:
+            notes = self._listing(connection, "note", f"note.id IN ({matched})", params, page, "id")
+            facets = {row["tag"]: row["notes"] for row in self._rows(
+                connection, "note_tag",
+                f"SELECT tag, COUNT(*) AS notes FROM note_tag WHERE note_id IN ({matched}) GROUP BY tag", params)}
+            return notes, facets
+
+    def note(self, note_id, course_id=None, approved_only=False):
+        where = "note.id = :note_id"
+        if course_id is not None:
+            where += " AND note.course_id = :course_id"
+        if approved_only:
+            where += " AND note.status = 'approved'"
+        with self.engine.connect() as connection:
+            rows = self._rows(connection, "note", f'SELECT note.*{_AUTHOR_SELECT} FROM note '
+                                                  f'LEFT JOIN "user" AS author ON author.id = note.user_id WHERE {where}',
+                              {"note_id": note_id, "course_id": course_id})
+        return rows[0] if rows else None
+
+    def pending_notes(self):
+        with self.engine.connect() as connection:
+            return self._rows(connection, "note",
+                              f'SELECT note.*{_AUTHOR_SELECT}, original.status AS duplicate_of_status FROM note '
+                              f'LEFT JOIN "user" AS author ON author.id = note.user_id '
+                              f"LEFT JOIN note AS original ON original.id = note.duplicate_of "
+                              f"WHERE note.status = 'pending' ORDER BY note.id")
+
+    def note_comments(self, note_id, page):
+        with self.engine.connect() as connection:
+            return self._listing(connection, "note_comment", "note_comment.note_id = :note_id",
+                                 {"note_id": note_id}, page, "propel_user_id")
+
+    def course_posts(self, course_id, page):
+        with self.engine.connect() as connection:
+            course = self._rows(connection, "course", "SELECT name FROM course WHERE id = :id", {"id": course_id})
+            if not course:
+                return None, [], {}
+            posts = self._listing(connection, "post", "post.course_id = :course_id", {"course_id": course_id},
+                                  page, "propel_user_id")
+        return course[0]["name"], posts, {}
+
+    def post_comments(self, post_id, page):
+        with self.engine.connect() as connection:
+            return self._listing(connection, "comment", "comment.post_id = :post_id",
+                                 {"post_id": post_id}, page, "propel_user_id")
+
+    def exists(self, entity, entity_id):
+        # Entities (VOTE_ENTITIES keys) are named after their tables
+        if entity not in VOTE_ENTITIES:
+            raise ValueError(f"Unknown entity {entity}")
+        with self.engine.connect() as connection:
+            return bool(self._rows(connection, entity, f"SELECT id FROM {entity} WHERE id = :id LIMIT 1",
+                                   {"id": entity_id}))
+
+    def cast_vote(self, entity, entity_id, user_id, vote_type):
+        # The vote row and the counters change together or not at all
+        with traced("database", "vote", VOTE_ENTITIES[entity]["vote_table"]):
+            with self.engine.begin() as connection:
+                return cast_vote_sql(connection, entity, entity_id, user_id, vote_type)
+
+    def blob_in_use(self, file_url, note_id):
+        with self.engine.connect() as connection:
+            return bool(self._rows(connection, "note", "SELECT id FROM note WHERE content = :url AND id <> :id LIMIT 1",
+                                   {"url": file_url, "id": note_id}))
+
+    def approve_note(self, note_id):
+        from sqlalchemy import text
+        with traced("database", "update", "note"):
+            with self.engine.begin() as connection:
+                connection.execute(text("UPDATE note SET status = 'approved' WHERE id = :id"), {"id": note_id})
+
+    def delete_note(self, note_id):
+        from sqlalchemy import text
+        with traced("database", "delete", "note"):
+            with self.engine.begin() as connection:
+                for table in ("note_comment", "note_vote", "note_tag"):
+                    connection.execute(text(f"DELETE FROM {table} WHERE note_id = :id"), {"id": note_id})
+                connection.execute(text("DELETE FROM note WHERE id = :id"), {"id": note_id})
+
+    def stats(self):
+        pool = self.engine.pool
+        if not hasattr(pool, "checkedout"):
+            return {}
+        return {"size": pool.size(), "in_use": pool.checkedout(), "idle": pool.checkedin(), "overflow": pool.overflow()}
+
+
+def _enable_sqlite_wal(dbapi_connection, record):
+    cursor = dbapi_connection.cursor()
+    # Readers keep going while a vote commits
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def create_engine_from_env(url=None):
+    """A pooled engine for DATABASE_URL."""
+    # SQLAlchemy is slow to import; only the sql backend pays for it
+    from sqlalchemy import create_engine, event
+
+    url = url or os.getenv("DATABASE_URL", "sqlite:///local.db")
+    if url.startswith("postgres://"):
+        # Supabase and Heroku hand out postgres://, which SQLAlchemy no longer accepts
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+        event.listen(engine, "connect", _enable_sqlite_wal)
+        return engine
+    return create_engine(
+        url,
+        pool_size=int(os.getenv("DATABASE_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DATABASE_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True,
+        pool_recycle=int(os.getenv("DATABASE_POOL_RECYCLE", "1800")),
+    )
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage(supabase):
+    """The process-wide storage backend selected by STORAGE_BACKEND."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            backend = os.getenv("STORAGE_BACKEND", "supabase").lower()
+            if backend == "sql":
+                _storage = SqlStorage(create_engine_from_env())
+            elif backend == "supabase":
+                _storage = SupabaseStorage(supabase)
+            else:
+                raise RuntimeError(f"Unknown STORAGE_BACKEND {backend!r}; use 'supabase' or 'sql'")
+    return _storage
@@ -0,0 +1,71 @@
+import json
+import re
+
+from flask import request
+
+from utils.pagination import InvalidCursor, KEYSET_COLUMNS
+
+MAX_TAGS = 20
+MAX_TAG_LENGTH = 100
+_SPACES_RE = re.compile(r"\s+")
+
+
+class InvalidTagFilter(ValueError):
+    pass
+
+
+def normalize_tags(tags):
+    """Lower-cased, whitespace-collapsed, de-duplicated tags in their original order.
+
+    Accepts a list or the JSON string stored in ``note.category_tags``.
+    """
+    if isinstance(tags, str):
+        tags = json.loads(tags or "[]")
+    normalized = []
+    for tag in tags or []:
+        tag = _SPACES_RE.sub(" ", str(tag)).strip().lower()[:MAX_TAG_LENGTH]
+        if tag and tag not in normalized:
+            normalized.append(tag)
+    return normalized[:MAX_TAGS]
+
+
+def get_tag_filter():
+    """Read ?tags=a,b and ?mode=and|or; returns (tags, match_all) or (None, None)."""
+    raw = request.args.get("tags")
+    if not raw:
+        return None, None
+    mode = request.args.get("mode", "and").lower()
+    if mode not in ("and", "or"):
+        raise InvalidTagFilter("mode must be 'and' or 'or'")
+    return normalize_tags(raw.split(",")), mode == "and"
+
+
+def store_note_tags(supabase, note):
+    """Write a note's rows in the note_tag index."""
+    rows = [
+        {"note_id": note["id"], "course_id": note["course_id"], "tag": tag}
+        for tag in normalize_tags(note.get("category_tags"))
+    ]
+    if rows:
+        supabase.table("note_tag").upsert(rows, on_conflict="note_id,tag", ignore_duplicates=True).execute()
+
+
+def notes_by_tags(supabase, course_id, tags, match_all, page):
+    """Approved notes of a course carrying all (or any) of ``tags``, plus tag
+    facet counts over every match, in one database round trip.
+
+    Follows the keyset page protocol of utils.pagination: one row past the
+    limit is fetched so split_page can produce the next cursor.
+    """
+    after = page["after"] if page else None
+    if after is not None and len(after) != len(KEYSET_COLUMNS):
+        raise InvalidCursor("Cursor does not match this listing")
+    result = supabase.rpc("course_notes_by_tags", {
+        "p_course_id": course_id,
+        "p_tags": tags,
+        "p_match_all": match_all,
+        "p_limit": page["limit"] + 1 if page else None,
+        "p_after_created_at": after[0] if after else None,
+        "p_after_id": after[1] if after else None,
+    }).execute().data
+    return result["notes"], result["facets"]
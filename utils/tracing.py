@@ -0,0 +1,189 @@
+"""Per-request tracing of calls to external services.
+
+Every Supabase (PostgREST) call is recorded by the shared client's transport
+(see utils/db.py), and Cloudinary, Stripe and Drive calls are wrapped in
+``traced(...)``. For each call the trace keeps the service, table or
+function, operation, duration and row count.
+
+The trace lives in a context variable, so calls made through fan_out are
+counted for the request that started them. Each HTTP response gets:
+
+* X-Backend-Calls: number of external calls made
+* X-Backend-Time-Ms: total time spent in them; concurrent calls add up
+* a ``backend`` entry in Server-Timing
+
+and one JSON line is logged to the ``backend_trace`` logger. Its level comes
+from BACKEND_TRACE_LOG (default INFO); set it to WARNING to silence it.
+Targets hit REPEAT_THRESHOLD or more times in one request are listed under
+``repeated``; that is what an N+1 loop looks like.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+from utils.metrics import observe_backend_call
+
+MAX_LOGGED_CALLS = 50
+REPEAT_THRESHOLD = 3
+
+logger = logging.getLogger("backend_trace")
+
+_current = contextvars.ContextVar("backend_trace", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.calls = []
+        self.backend_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, service, target, operation, duration_ms, rows=None, error=None):
+        call = {"service": service, "target": target, "op": operation, "ms": round(duration_ms, 2)}
+        if rows is not None:
+            call["rows"] = rows
+        if error is not None:
+            call["error"] = error
+        with self._lock:
+            self.calls.append(call)
+            self.backend_ms += duration_ms
+
+    def summary(self):
+        with self._lock:
+            calls = list(self.calls)
+            backend_ms = self.backend_ms
+        by_service, counts = {}, {}
+        for call in calls:
+            service = by_service.setdefault(call["service"], {"calls": 0, "ms": 0.0})
+            service["calls"] += 1
+            service["ms"] = round(service["ms"] + call["ms"], 2)
+            key = f"{call['service']} {call['op']} {call['target']}"
+            counts[key] = counts.get(key, 0) + 1
+        return {
+            "calls": len(calls),
+            "backend_ms": round(backend_ms, 2),
+            "by_service": by_service,
+            "repeated": {key: count for key, count in counts.items() if count >= REPEAT_THRESHOLD},
+            "detail": calls[:MAX_LOGGED_CALLS],
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+def record_call(service, target, operation, duration_ms, rows=None, error=None):
+    """Count a finished call in the metrics and add it to the current trace, if there is one."""
+    observe_backend_call(service, operation, target, duration_ms, error)
+    trace = _current.get()
+    if trace is not None:
+        trace.record(service, target, operation, duration_ms, rows, error)
+
+
+@contextmanager
+def traced(service, operation, target=None):
+    """Record the enclosed block as one call to ``service``."""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record_call(service, target, operation, (time.perf_counter() - started) * 1000, error=error)
+
+
+@contextmanager
+def start_trace():
+    """Trace the enclosed block on its own, e.g. a background job or a test."""
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def init_tracing(app):
+    """Trace every request of ``app``; see the module docstring."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(os.getenv("BACKEND_TRACE_LOG", "INFO").upper())
+
+    @app.before_request
+    def begin_backend_trace():
+        g.backend_trace_token = _current.set(Trace())
+        g.backend_trace_started = time.perf_counter()
+
+    @app.after_request
+    def report_backend_trace(response):
+        trace = _current.get()
+        if trace is None or "backend_trace_started" not in g:
+            return response
+        summary = trace.summary()
+        response.headers["X-Backend-Calls"] = str(summary["calls"])
+        response.headers["X-Backend-Time-Ms"] = f"{summary['backend_ms']:.1f}"
+        timing = f'backend;desc="{summary["calls"]} calls";dur={summary["backend_ms"]:.1f}'
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "event": "request",
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "request_ms": round((time.perf_counter() - g.backend_trace_started) * 1000, 2),
+                **summary,
+            }, default=str))
+        return response
+
+    @app.teardown_request
+    def end_backend_trace(error=None):
+        token = g.pop("backend_trace_token", None)
+        if token is not None:
+            _current.reset(token)
+
+
+def assert_call_budget(response, max_calls, max_backend_ms=None):
+    """Test helper: fail unless the request behind ``response`` stayed within budget.
+
+        response = client.get("/notes/12")
+        assert_call_budget(response, 3)
+    """
+    calls = int(response.headers["X-Backend-Calls"])
+    if calls > max_calls:
+        raise AssertionError(f"{_request_label(response)} made {calls} backend calls, budget is {max_calls}")
+    spent = float(response.headers["X-Backend-Time-Ms"])
+    if max_backend_ms is not None and spent > max_backend_ms:
+        raise AssertionError(f"{_request_label(response)} spent {spent} ms in backend calls, budget is {max_backend_ms}")
+
+
+def _request_label(response):
+    environ = getattr(getattr(response, "request", None), "environ", None) or {}
+    return f"{environ.get('REQUEST_METHOD', '')} {environ.get('PATH_INFO', 'request')}".strip()
+
+
+@contextmanager
+def call_budget(max_calls):
+    """Test helper for code outside a request: fail if the block makes more than ``max_calls`` calls.
+
+        with call_budget(1):
+            resolve_authors(supabase, notes)
+    """
+    with start_trace() as trace:
+        yield trace
+    summary = trace.summary()
+    if summary["calls"] > max_calls:
+        raise AssertionError(f"{summary['calls']} backend calls, budget is {max_calls}; repeated: {summary['repeated']}")
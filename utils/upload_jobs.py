@@ -0,0 +1,128 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Cloudinary requires chunks of at least 5 MB; this is also the most a single
+# upload holds in memory at once
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024)))
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "uploads/spool")
+
+
+class UploadQueueFull(Exception):
+    """Raised when every upload worker is busy and the backlog is at capacity."""
+
+
+def spool_upload(file_storage, directory=SPOOL_DIR):
+    """Stream an incoming upload to a temporary file on disk.
+
+    Returns ``(path, sha256_hex)``; the hash is computed on the same pass, one
+    buffer at a time, so the file is never held in memory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".upload")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as spooled:
+            for chunk in iter(lambda: file_storage.stream.read(1024 * 1024), b""):
+                digest.update(chunk)
+                spooled.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+class UploadJobs:
+    """Bounded worker pool for upload jobs, with pollable per-job status.
+
+    At most ``max_workers`` uploads run at once and at most ``max_pending``
+    wait behind them; submit() raises UploadQueueFull beyond that. Finished jobs
+    are kept for ``ttl`` seconds. Job state lives in this process, so with
+    several workers the status endpoint must be routed to the same one (sticky
+    sessions), as Socket.IO already requires.
+    """
+
+    def __init__(self, max_workers=4, max_pending=32, ttl=3600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+
+    def submit(self, owner, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)``; its return value becomes the job result."""
+        with self._lock:
+            self._prune()
+            if self._active >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                raise UploadQueueFull()
+            self._active += 1
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "owner": owner,
+                "status": "queued",
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "finished_at": None,
+            }
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="uploading")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Error in upload job {job_id}: {e}")
+            with self._lock:
+                self.failed += 1
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        else:
+            with self._lock:
+                self.completed += 1
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+
+upload_jobs = UploadJobs(
+    max_workers=int(os.getenv("UPLOAD_WORKERS", "4")),
+    max_pending=int(os.getenv("UPLOAD_MAX_PENDING", "32")),
+)
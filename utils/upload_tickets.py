@@ -0,0 +1,76 @@
+import os
+import time
+import uuid
+
+from itsdangerous import BadData, URLSafeTimedSerializer
+
+from utils.sdk import get_cloudinary
+
+# Cloudinary accepts a signed upload for an hour; our ticket expires sooner
+TICKET_TTL = int(os.getenv("UPLOAD_TICKET_TTL", "900"))
+# Notes are PDFs, stored as raw files like the server-side uploads
+UPLOAD_FORMAT = "pdf"
+UPLOAD_RESOURCE_TYPE = "raw"
+
+
+class InvalidTicket(ValueError):
+    """Raised when a finalize request does not match a ticket we issued."""
+
+
+def _serializer():
+    secret = os.getenv("UPLOAD_TICKET_SECRET") or get_cloudinary().config().api_secret
+    return URLSafeTimedSerializer(secret, salt="note-upload-ticket")
+
+
+def issue_ticket(user_id, course_id):
+    """Signed parameters for uploading one PDF straight to Cloudinary.
+
+    The upload is pinned to ``courses/<course_id>`` under a public id we pick,
+    so the client cannot choose where the file lands. ``allowed_formats`` only
+    looks at the file name; the bytes are checked once the note is finalized
+    (see finalize_upload). ``ticket`` carries the same facts, signed, for the
+    finalize step.
+    """
+    cloudinary = get_cloudinary()
+    config = cloudinary.config()
+    # The folder goes in the public id itself, which means the same thing
+    # whether or not the account uses dynamic folders
+    params = {
+        "public_id": f"courses/{course_id}/{uuid.uuid4().hex}.{UPLOAD_FORMAT}",
+        "allowed_formats": UPLOAD_FORMAT,
+        "timestamp": int(time.time()),
+    }
+    signature = cloudinary.utils.api_sign_request(params, config.api_secret)
+    claims = {"user": user_id, "course_id": str(course_id), "public_id": params["public_id"]}
+    return {
+        "upload_url": cloudinary.utils.cloudinary_api_url("upload", resource_type=UPLOAD_RESOURCE_TYPE),
+        "fields": {**params, "api_key": config.api_key, "signature": signature},
+        "ticket": _serializer().dumps(claims),
+        "expires_in": TICKET_TTL,
+    }
+
+
+def verify_upload(ticket, user_id, result):
+    """Check a finished direct upload against its ticket.
+
+    ``result`` is Cloudinary's upload response as relayed by the client; its
+    signature proves Cloudinary produced it. Returns ``(course_id, file_url)``
+    with the URL rebuilt from the verified public id, or raises InvalidTicket.
+    """
+    cloudinary = get_cloudinary()
+    try:
+        claims = _serializer().loads(ticket, max_age=TICKET_TTL)
+    except BadData:
+        raise InvalidTicket("Invalid or expired upload ticket")
+    if claims["user"] != user_id:
+        raise InvalidTicket("Upload ticket belongs to another user")
+
+    public_id = result.get("public_id")
+    version = result.get("version")
+    if public_id != claims["public_id"]:
+        raise InvalidTicket("Upload does not match the ticket")
+    if not version or not cloudinary.utils.verify_api_response_signature(public_id, version, result.get("signature")):
+        raise InvalidTicket("Upload signature is invalid")
+
+    file_url, _ = cloudinary.utils.cloudinary_url(public_id, resource_type=UPLOAD_RESOURCE_TYPE, version=version, secure=True)
+    return claims["course_id"], file_url
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """Process-local LRU cache of `user` rows with a TTL.
+
+    Rows are stored once, keyed by propel_user_id, with a secondary index on the
+    numeric id. Each worker process has its own cache, so the TTL bounds how long
+    a change made through another worker can go unnoticed. Counters such as
+    contributions are updated in the database and the returned row is put
+    back; never write a value computed from a cached row.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # propel_user_id -> (expires_at, row)
+        self._ids = {}  # str(id) -> propel_user_id
+        self._lock = threading.Lock()
+
+    def get_by_propel_id(self, supabase, propel_user_id):
+        """Return the user row for a PropelAuth id, or None if there is no such user."""
+        with self._lock:
+            row = self._lookup(propel_user_id)
+        if row is not None:
+            return row
+        users = supabase.table("user").select("*").eq("propel_user_id", propel_user_id).execute().data
+        if not users:
+            return None
+        self.put(users[0])
+        return dict(users[0])
+
+    def get_by_id(self, supabase, user_id):
+        """Return the user row for a numeric user id, or None if there is no such user."""
+        with self._lock:
+            row = self._lookup(self._ids.get(str(user_id)))
+        if row is not None:
+            return row
+        users = supabase.table("user").select("*").eq("id", user_id).execute().data
+        if not users:
+            return None
+        self.put(users[0])
+        return dict(users[0])
+
+    def put(self, row):
+        """Store (or refresh) a full user row."""
+        with self._lock:
+            propel_user_id = row["propel_user_id"]
+            self._entries[propel_user_id] = (time.monotonic() + self.ttl, dict(row))
+            self._entries.move_to_end(propel_user_id)
+            self._ids[str(row["id"])] = propel_user_id
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._ids.pop(str(evicted["id"]), None)
+
+    def invalidate(self, propel_user_id=None, user_id=None):
+        """Drop a user from the cache by either of its keys."""
+        with self._lock:
+            if propel_user_id is None and user_id is not None:
+                propel_user_id = self._ids.get(str(user_id))
+            entry = self._entries.pop(propel_user_id, None)
+            if entry:
+                self._ids.pop(str(entry[1]["id"]), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+    def _lookup(self, propel_user_id):
+        # Caller holds the lock
+        entry = self._entries.get(propel_user_id) if propel_user_id is not None else None
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._entries.pop(propel_user_id, None)
+                self._ids.pop(str(entry[1]["id"]), None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(propel_user_id)
+        self.hits += 1
+        return dict(entry[1])
+
+
+user_cache = UserCache(
+    max_entries=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
@@ -0,0 +1,184 @@
+import atexit
+import os
+import threading
+
+from utils.voting import VOTE_ENTITIES
+
+
+def _toggle(state, vote_type):
+    # Same rule as the cast_<entity>_vote procedures: repeating a vote cancels it
+    return None if state == vote_type else vote_type
+
+
+def _contribution(state):
+    return (1 if state == "upvote" else 0, 1 if state == "downvote" else 0)
+
+
+class VoteBuffer:
+    """Write-behind buffer for note and post votes.
+
+    Each (entity, entity_id, user_id) key remembers the vote the user had when
+    it was first buffered ("base") and the vote they want now ("final"), so any
+    number of toggles collapse into one set-vote write. The buffer flushes every
+    ``interval`` seconds, or sooner once ``max_pending`` keys are waiting, with
+    one apply_<entity>_votes call per entity type.
+    """
+
+    def __init__(self, supabase, interval=2.0, max_pending=500):
+        self.supabase = supabase
+        self.interval = interval
+        self.max_pending = max_pending
+        self.flushed = 0
+        self.coalesced = 0
+        self.failed_flushes = 0
+        self._pending = {}  # (entity, entity_id, user_id) -> {"base": ..., "final": ...}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vote-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def record(self, entity, entity_id, user_id, vote_type):
+        """Buffer one vote click and return (action, final_vote).
+
+        Only the first click for a key reads the user's stored vote; after that
+        toggles are resolved in memory.
+        """
+        key = (entity, str(entity_id), str(user_id))
+        with self._lock:
+            entry = self._pending.get(key) or self._inflight.get(key)
+            base = entry["final"] if entry else None
+            known = entry is not None
+        if not known:
+            base = self._stored_vote(entity, entity_id, user_id)
+
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {"base": base, "final": base}
+            else:
+                self.coalesced += 1
+            previous = entry["final"]
+            final = entry["final"] = _toggle(previous, vote_type)
+            pending = len(self._pending)
+
+        if pending >= self.max_pending:
+            self._wakeup.set()
+        if previous is None:
+            return "added", final
+        if final is None:
+            return "canceled", None
+        return "changed", final
+
+    def pending_deltas(self, entity, entity_ids=None):
+        """Net (up, down) counter deltas not yet written, keyed by str(entity_id)."""
+        wanted = {str(entity_id) for entity_id in entity_ids} if entity_ids is not None else None
+        deltas = {}
+        with self._lock:
+            # In-flight entries are still overlaid until their flush lands
+            entries = list(self._inflight.items()) + list(self._pending.items())
+            for (kind, entity_id, _), entry in entries:
+                if kind != entity or (wanted is not None and entity_id not in wanted):
+                    continue
+                base_up, base_down = _contribution(entry["base"])
+                final_up, final_down = _contribution(entry["final"])
+                up, down = deltas.get(entity_id, (0, 0))
+                deltas[entity_id] = (up + final_up - base_up, down + final_down - base_down)
+        return deltas
+
+    def overlay(self, entity, rows):
+        """Add pending deltas to the counters of note/post rows, in place."""
+        config = VOTE_ENTITIES[entity]
+        deltas = self.pending_deltas(entity, [row["id"] for row in rows])
+        for row in rows:
+            up, down = deltas.get(str(row["id"]), (0, 0))
+            row[config["up_column"]] = max(0, (row.get(config["up_column"]) or 0) + up)
+            row[config["down_column"]] = max(0, (row.get(config["down_column"]) or 0) + down)
+        return rows
+
+    def flush(self):
+        """Write every buffered vote; votes of a batch that fails go back into the buffer."""
+        with self._flush_lock:
+            with self._lock:
+                # Keys whose vote ended where it started need no write
+                self._inflight = {key: entry for key, entry in self._pending.items() if entry["final"] != entry["base"]}
+                self._pending = {}
+            if not self._inflight:
+                return
+
+            batches = {}
+            for (entity, entity_id, user_id), entry in self._inflight.items():
+                batches.setdefault(entity, {})[(entity, entity_id, user_id)] = {
+                    "entity_id": int(entity_id),
+                    "user_id": user_id,
+                    "vote_type": entry["final"],
+                }
+            failed = False
+            for entity, votes in batches.items():
+                try:
+                    self.supabase.rpc(f"apply_{entity}_votes", {"p_votes": list(votes.values())}).execute()
+                except Exception as e:
+                    print(f"Error flushing {entity} votes: {e}")
+                    failed = True
+                    continue
+                # Committed: stop overlaying these, the stored counters include them now
+                with self._lock:
+                    self.flushed += len(votes)
+                    for key in votes:
+                        self._inflight.pop(key, None)
+
+            with self._lock:
+                if failed:
+                    self.failed_flushes += 1
+                # Whatever is still in flight belongs to a batch that did not commit
+                for key, entry in self._inflight.items():
+                    newer = self._pending.get(key)
+                    # A click that arrived during the flush already holds the
+                    # latest intent; keep the original base under it.
+                    self._pending[key] = {"base": entry["base"], "final": newer["final"] if newer else entry["final"]}
+                self._inflight = {}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "inflight": len(self._inflight),
+                "flushed": self.flushed,
+                "coalesced": self.coalesced,
+                "failed_flushes": self.failed_flushes,
+            }
+
+    def _stored_vote(self, entity, entity_id, user_id):
+        vote_table = VOTE_ENTITIES[entity]["vote_table"]
+        votes = self.supabase.table(vote_table).select("vote_type").eq(f"{entity}_id", entity_id).eq("user_id", user_id).execute().data
+        return votes[0]["vote_type"] if votes else None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in vote buffer thread: {e}")
+
+
+_vote_buffer = None
+_vote_buffer_lock = threading.Lock()
+
+
+def get_vote_buffer(supabase):
+    """The process-wide buffer when VOTE_WRITE_BEHIND is enabled, else None."""
+    global _vote_buffer
+    if os.getenv("VOTE_WRITE_BEHIND", "").lower() not in ("1", "true", "yes"):
+        return None
+    with _vote_buffer_lock:
+        if _vote_buffer is None:
+            _vote_buffer = VoteBuffer(
+                supabase,
+                interval=float(os.getenv("VOTE_FLUSH_INTERVAL", "2")),
+                max_pending=int(os.getenv("VOTE_FLUSH_THRESHOLD", "500")),
+            )
+    return _vote_buffer
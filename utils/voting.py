@@ -0,0 +1,118 @@
+VOTE_ENTITIES = {
+    "note": {"vote_table": "note_vote", "up_column": "helpful_votes", "down_column": "unhelpful_votes"},
+    "post": {"vote_table": "vote", "up_column": "upvotes", "down_column": "downvotes"},
+}
+
+
+def cast_vote(supabase, entity, entity_id, user_id, vote_type):
+    """Toggle a user's vote and apply the counter delta in one round trip.
+
+    Calls the cast_<entity>_vote stored procedure (see the atomic vote
+    functions migration). Returns a dict with the action taken ("added",
+    "canceled" or "changed") and the new tallies, or None if the note/post does
+    not exist.
+    """
+    rows = supabase.rpc(f"cast_{entity}_vote", {
+        "p_entity_id": entity_id,
+        "p_user_id": str(user_id),
+        "p_vote_type": vote_type,
+    }).execute().data
+    return rows[0] if rows else None
+
+
+def cast_vote_sql(connection, entity, entity_id, user_id, vote_type):
+    """SQLAlchemy counterpart of the cast_<entity>_vote procedure.
+
+    Used for SQLite and other databases without the stored procedure. Runs
+    inside the caller's transaction and returns the same dict as cast_vote.
+    """
+    # Imported here: the routes only use the RPC path, and SQLAlchemy is slow to import
+    from sqlalchemy import text
+    config = VOTE_ENTITIES[entity]
+    vote_table, up, down = config["vote_table"], config["up_column"], config["down_column"]
+    lock = " FOR UPDATE" if connection.dialect.name == "postgresql" else ""
+
+    found = connection.execute(text(f"SELECT id FROM {entity} WHERE id = :id{lock}"), {"id": entity_id}).first()
+    if found is None:
+        return None
+
+    existing = connection.execute(
+        text(f"SELECT id, vote_type FROM {vote_table} WHERE {entity}_id = :entity_id AND user_id = :user_id{lock}"),
+        {"entity_id": entity_id, "user_id": str(user_id)},
+    ).first()
+
+    sign = 1 if vote_type == "upvote" else -1
+    if existing is None:
+        connection.execute(
+            text(f"INSERT INTO {vote_table} ({entity}_id, user_id, vote_type, created_at) "
+                 f"VALUES (:entity_id, :user_id, :vote_type, CURRENT_TIMESTAMP)"),
+            {"entity_id": entity_id, "user_id": str(user_id), "vote_type": vote_type},
+        )
+        action, delta_up, delta_down = "added", int(sign > 0), int(sign < 0)
+    elif existing.vote_type == vote_type:
+        connection.execute(text(f"DELETE FROM {vote_table} WHERE id = :id"), {"id": existing.id})
+        action, delta_up, delta_down = "canceled", -int(sign > 0), -int(sign < 0)
+    else:
+        connection.execute(text(f"UPDATE {vote_table} SET vote_type = :vote_type WHERE id = :id"),
+                           {"vote_type": vote_type, "id": existing.id})
+        action, delta_up, delta_down = "changed", sign, -sign
+
+    greatest = "MAX" if connection.dialect.name == "sqlite" else "GREATEST"
+    connection.execute(
+        text(f"UPDATE {entity} SET {up} = {greatest}(0, COALESCE({up}, 0) + :delta_up), "
+             f"{down} = {greatest}(0, COALESCE({down}, 0) + :delta_down) WHERE id = :id"),
+        {"delta_up": delta_up, "delta_down": delta_down, "id": entity_id},
+    )
+    tallies = connection.execute(text(f"SELECT {up}, {down} FROM {entity} WHERE id = :id"), {"id": entity_id}).first()
+    return {"action": action, up: tallies[0], down: tallies[1]}
+
+
+def set_vote_sql(connection, entity, entity_id, user_id, vote_type):
+    """SQLAlchemy counterpart of one element of apply_<entity>_votes: move a
+    user's vote to ``vote_type`` (None removes it) and adjust the counters.
+    Returns False if the note/post does not exist."""
+    from sqlalchemy import text
+    config = VOTE_ENTITIES[entity]
+    vote_table, up, down = config["vote_table"], config["up_column"], config["down_column"]
+    lock = " FOR UPDATE" if connection.dialect.name == "postgresql" else ""
+
+    if connection.execute(text(f"SELECT id FROM {entity} WHERE id = :id{lock}"), {"id": entity_id}).first() is None:
+        return False
+    existing = connection.execute(
+        text(f"SELECT id, vote_type FROM {vote_table} WHERE {entity}_id = :entity_id AND user_id = :user_id{lock}"),
+        {"entity_id": entity_id, "user_id": str(user_id)},
+    ).first()
+    current = existing.vote_type if existing else None
+    if current == vote_type:
+        return True
+
+    if vote_type is None:
+        connection.execute(text(f"DELETE FROM {vote_table} WHERE id = :id"), {"id": existing.id})
+    elif existing is None:
+        connection.execute(
+            text(f"INSERT INTO {vote_table} ({entity}_id, user_id, vote_type, created_at) "
+                 f"VALUES (:entity_id, :user_id, :vote_type, CURRENT_TIMESTAMP)"),
+            {"entity_id": entity_id, "user_id": str(user_id), "vote_type": vote_type},
+        )
+    else:
+        connection.execute(text(f"UPDATE {vote_table} SET vote_type = :vote_type WHERE id = :id"),
+                           {"vote_type": vote_type, "id": existing.id})
+
+    delta_up = (vote_type == "upvote") - (current == "upvote")
+    delta_down = (vote_type == "downvote") - (current == "downvote")
+    greatest = "MAX" if connection.dialect.name == "sqlite" else "GREATEST"
+    connection.execute(
+        text(f"UPDATE {entity} SET {up} = {greatest}(0, COALESCE({up}, 0) + :delta_up), "
+             f"{down} = {greatest}(0, COALESCE({down}, 0) + :delta_down) WHERE id = :id"),
+        {"delta_up": delta_up, "delta_down": delta_down, "id": entity_id},
+    )
+    return True
+
+
+def vote_message(label, vote_type, result):
+    """The (message, status code) the vote routes have always returned."""
+    if result["action"] == "canceled":
+        return f"{vote_type.capitalize()} canceled", 200
+    if result["action"] == "changed":
+        return f"Vote changed to {vote_type}", 200
+    return f"{label} {vote_type}d successfully", 201